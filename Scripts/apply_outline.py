@@ -1,83 +1,512 @@
 """
 This script adds a white outline to transparent images.
-It scans a source directory for PNG files, applies an outline effect,
-and saves the results to a target directory.
+It scans a source directory for frames (PNG, WebP, .npy or a frame store),
+applies an outline effect, and saves the results to a target directory (along
+with the timing.json of frames extracted from an animation and the trim.json of
+trimmed frames) in the format chosen with --format. A build manifest (see
+build_manifest.py) records each frame's input and the settings used, so reruns
+only outline the frames that changed.
+
+Several outline variants (--variant WIDTH:COLOR[:NAME], repeated) are made in
+the same pass: each frame is decoded once, its dilation or distance field is
+computed once for the widest outline, and every variant is written to its own
+folder, output/outlined_frames_<NAME>.
 
 Functions:
-- add_outline: Applies an outline to an RGBA image using a max filter.
-- main: Handles directory configuration and iterates through image files.
+- add_outlines: Applies one outline per (width, color) variant to an RGBA image
+  using the selected engine, sharing the work between the variants.
+  The "filter" engine dilates alpha with repeated 3x3 max filters (square corners,
+  cost grows with the width); the "distance" engine thresholds a Euclidean
+  distance field of the alpha mask (round corners, cost independent of the width).
+- add_outline: Applies a single outline to an RGBA image.
+- parse_variant: Parses a --variant value.
+- outline_file: Outlines a single frame file in every variant and reports
+  errors per frame.
+- main: Handles directory configuration and iterates through image files,
+  optionally across a pool of worker processes (--workers N).
 """
 
+import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from PIL import Image, ImageFilter, ImageChops
+import numpy as np
+from PIL import Image, ImageChops, ImageColor, ImageFilter
 from tqdm import tqdm
 
+from build_manifest import BUILD_NAME, BuildManifest, file_record
+from frame_encoder import (
+    FrameEncoder,
+    WriteBehind,
+    add_encoder_arguments,
+    encoder_from_args,
+    first_frame_size,
+    list_frames,
+    load_frame,
+    prepare_output,
+)
+from frame_source import copy_timing
+from frame_trim import copy_trim
+from profiling import merge, span, traced
+
+try:
+    # Optional: scipy's C implementation of the distance transform is much faster
+    from scipy.ndimage import distance_transform_edt
+except ImportError:
+    distance_transform_edt = None
+
+ENGINES = ("filter", "distance")
+
+DEFAULT_OUTLINE_WIDTH = 10
+# DEFAULT_OUTLINE_COLOR = (255, 255, 255, 255)
+DEFAULT_OUTLINE_COLOR = (220, 20, 60, 255)
+
+# Pixels at least this opaque are treated as the sprite when building the distance field
+DISTANCE_ALPHA_THRESHOLD = 128
+
+
+def _squared_distance_rows(f):
+    """
+    Exact 1D squared distance transform (Felzenszwalb & Huttenlocher),
+    evaluated for every row of `f` at once.
+    """
+    rows, n = f.shape
+    idx = np.arange(rows)
+    fq = f + np.arange(n, dtype=np.float64) ** 2
+
+    # Lower envelope of the parabolas rooted at each column
+    v = np.zeros((rows, n), dtype=np.intp)
+    z = np.empty((rows, n + 1))
+    z[:, 0] = -np.inf
+    z[:, 1] = np.inf
+    k = np.zeros(rows, dtype=np.intp)
+    for q in range(1, n):
+        while True:
+            vk = v[idx, k]
+            s = (fq[:, q] - fq[idx, vk]) / (2.0 * (q - vk))
+            pop = s <= z[idx, k]
+            if not pop.any():
+                break
+            k[pop] -= 1
+        k += 1
+        v[idx, k] = q
+        z[idx, k] = s
+        z[idx, k + 1] = np.inf
+
+    # Sample the envelope
+    out = np.empty_like(f)
+    k[:] = 0
+    for q in range(n):
+        while True:
+            step = z[idx, k + 1] < q
+            if not step.any():
+                break
+            k[step] += 1
+        vk = v[idx, k]
+        out[:, q] = (q - vk) ** 2 + f[idx, vk]
+    return out
+
+
+def _distance_to_sprite(mask):
+    """
+    Euclidean distance from every pixel to the nearest True pixel of `mask`.
+    """
+    if distance_transform_edt is not None:
+        return distance_transform_edt(~mask)
+
+    # The envelope pass loops over the second axis in Python, so make it the
+    # shorter one
+    transposed = mask.shape[1] > mask.shape[0]
+    if transposed:
+        mask = mask.T
+
+    h, w = mask.shape
+    # Column pass: distance to the nearest sprite pixel in the same column
+    rows = np.arange(h)[:, None]
+    above = np.where(mask, rows, -1)
+    above = np.maximum.accumulate(above, axis=0)
+    below = np.where(mask, rows, 2 * h)
+    below = np.minimum.accumulate(below[::-1], axis=0)[::-1]
+    column = np.minimum(
+        np.where(above >= 0, rows - above, h + w),
+        np.where(below < 2 * h, below - rows, h + w),
+    ).astype(np.float64)
+
+    # Row pass: combine the column distances along each row
+    squared = _squared_distance_rows(column**2)
+    if transposed:
+        squared = squared.T
+    return np.sqrt(squared)
+
+
+def _distance_outlines(alpha, widths):
+    """
+    Dilates an alpha channel by each of widths by thresholding its Euclidean
+    distance field, which is computed once for all of them. Gives round corners
+    and an anti-aliased outer edge in a single pass.
+
+    Returns:
+        dict: The dilated alpha channel for each width.
+    """
+    alpha_array = np.asarray(alpha)
+    mask = alpha_array >= DISTANCE_ALPHA_THRESHOLD
+    if not mask.any():
+        return {width: alpha for width in widths}
+
+    distance = _distance_to_sprite(mask)
+    outlines = {}
+    for width in widths:
+        coverage = np.clip(width + 0.5 - distance, 0.0, 1.0)
+        outline = np.maximum((coverage * 255.0 + 0.5).astype(np.uint8), alpha_array)
+        outlines[width] = Image.fromarray(outline, mode="L")
+    return outlines
+
+
+def _filter_outlines(alpha, widths):
+    """
+    Dilates an alpha channel by each of widths with repeated 3x3 max filters,
+    in one run up to the widest: each narrower outline is taken on the way.
+
+    Returns:
+        dict: The dilated alpha channel for each width.
+    """
+    outlines = {}
+    outline = alpha
+    dilated = 0
+    for width in sorted(widths):
+        for _ in range(width - dilated):
+            outline = outline.filter(ImageFilter.MaxFilter(3))
+        dilated = width
+        outlines[width] = outline
+    return outlines
+
+
+def add_outlines(image, variants, engine="filter"):
+    """
+    Outlines an image once per (outline_width, outline_color) variant, sharing
+    the work between them: the sprite's bounding box is found once, and the
+    dilation (filter engine) or distance field (distance engine) is computed
+    once, for the widest outline.
+
+    Returns:
+        list[Image]: The outlined image of each variant, in order.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown outline engine: {engine}")
 
-def add_outline(image, outline_width=10, outline_color=(255, 255, 255, 255)):
     if image.mode != "RGBA":
         image = image.convert("RGBA")
 
-    alpha = image.split()[3]
+    # Only the sprite's bounding box (padded by the outline width) can change,
+    # so do all the work on that region and paste it onto an empty canvas.
+    bbox = image.getchannel("A").getbbox()
+    if bbox is None:
+        return [Image.new("RGBA", image.size, (0, 0, 0, 0)) for _ in variants]
+
+    def padded(width):
+        left, top, right, bottom = bbox
+        return (
+            max(left - width, 0),
+            max(top - width, 0),
+            min(right + width, image.width),
+            min(bottom + width, image.height),
+        )
+
+    widths = {outline_width for outline_width, _ in variants}
+    box = padded(max(widths))
+    region = image.crop(box)
+    alpha = region.getchannel("A")
 
     # Expand the alpha channel to create the outline area
-    outline = alpha
-    for _ in range(outline_width):
-        outline = outline.filter(ImageFilter.MaxFilter(3))
+    if engine == "distance":
+        with span("outline-distance", width=max(widths), variants=len(variants)):
+            outlines = _distance_outlines(alpha, widths)
+    else:
+        with span("outline-filter", width=max(widths), variants=len(variants)):
+            outlines = _filter_outlines(alpha, widths)
+
+    results = []
+    for outline_width, outline_color in variants:
+        # Create the outline image, keeping only the outline part
+        # (without the original image area)
+        outline_img = Image.new("RGBA", region.size, outline_color)
+        outline_img.putalpha(ImageChops.subtract(outlines[outline_width], alpha))
+
+        # Composite the original image over the outline
+        region_result = Image.new("RGBA", region.size, (0, 0, 0, 0))
+        region_result = Image.alpha_composite(region_result, outline_img)
+        region_result = Image.alpha_composite(region_result, region)
+
+        # Narrower outlines only keep their own padded box of the shared region
+        variant_box = padded(outline_width)
+        if variant_box != box:
+            region_result = region_result.crop(
+                (
+                    variant_box[0] - box[0],
+                    variant_box[1] - box[1],
+                    variant_box[2] - box[0],
+                    variant_box[3] - box[1],
+                )
+            )
+
+        if variant_box == (0, 0, image.width, image.height):
+            results.append(region_result)
+            continue
+        result = Image.new("RGBA", image.size, (0, 0, 0, 0))
+        result.paste(region_result, variant_box[:2])
+        results.append(result)
+    return results
+
+
+def add_outline(
+    image, outline_width=10, outline_color=(255, 255, 255, 255), engine="filter"
+):
+    return add_outlines(image, [(outline_width, outline_color)], engine)[0]
 
-    # Create the outline image
-    outline_img = Image.new("RGBA", image.size, outline_color)
-    outline_img.putalpha(outline)
 
-    # Extract only the outline part (without the original image area)
-    outline_alpha = ImageChops.subtract(outline, alpha)
-    outline_img.putalpha(outline_alpha)
+def _write(img, output_file, encoder):
+    with span("encode", frame=output_file.name):
+        encoder.save(img, output_file)
 
-    # Composite the original image over the outline
-    result = Image.new("RGBA", image.size, (0, 0, 0, 0))
-    result = Image.alpha_composite(result, outline_img)
-    result = Image.alpha_composite(result, image)
 
-    return result
+def parse_variant(value):
+    """
+    Parses an outline variant given as "WIDTH:COLOR[:NAME]" (COLOR is a color
+    name or #rrggbb[aa]) into (width, RGBA color, name). NAME defaults to
+    "<WIDTH>px_<rrggbb>".
+    """
+    width, _, rest = value.partition(":")
+    color, _, name = rest.partition(":")
+    try:
+        width = int(width)
+        rgba = ImageColor.getrgb(color)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"expected WIDTH:COLOR[:NAME] (e.g. 10:white), got {value!r}"
+        ) from None
+    if width < 1:
+        raise argparse.ArgumentTypeError(f"outline width must be at least 1: {value!r}")
+    if len(rgba) == 3:
+        rgba += (255,)
+    if not name:
+        name = f"{width}px_{'%02x%02x%02x' % rgba[:3]}"
+    return width, rgba, name
+
+
+def outline_file(
+    img_path,
+    variants,
+    engine="filter",
+    encoder=None,
+    writer=None,
+):
+    """
+    Decodes a single frame, outlines it in every (output_path, outline_width,
+    outline_color) variant and encodes the results.
+    Runs inside worker processes, so errors are returned instead of raised.
+    With a WriteBehind writer, the frame is encoded on the writer's threads,
+    and a failed write shows up in writer.failed under its output file.
+
+    Returns:
+        str | None: An error message for this frame, or None on success.
+    """
+    try:
+        with span("decode", frame=img_path.name):
+            img = load_frame(img_path)
+            img.load()
+        with span("outline", frame=img_path.name):
+            results = add_outlines(
+                img, [(width, color) for _, width, color in variants], engine
+            )
+
+        encoder = encoder or FrameEncoder()
+        for (output_path, _, _), result in zip(variants, results):
+            output_file = encoder.path(output_path, img_path.stem)
+            if writer is not None:
+                writer.submit(str(output_file), _write, result, output_file, encoder)
+            else:
+                _write(result, output_file, encoder)
+
+    except Exception as e:
+        return f"Error processing {img_path.name}: {e}"
+
+    return None
 
 
 def main():
+    parser = argparse.ArgumentParser(
+        description="Apply an outline to transparent images in output/no_bg_frames."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes (0 = one per CPU core, default: 1)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="filter",
+        help="Outline engine: 'filter' (square corners) or 'distance' (round corners, "
+        "constant cost for any width). Default: filter",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Outline every frame, even those that are up to date",
+    )
+    parser.add_argument(
+        "--variant",
+        action="append",
+        type=parse_variant,
+        metavar="WIDTH:COLOR[:NAME]",
+        help="Outline width and color (e.g. 10:white, 6:#dc143c:crimson). Repeat "
+        "to make several variants in one pass, each in output/outlined_frames_NAME",
+    )
+    add_encoder_arguments(parser)
+    args = parser.parse_args()
+
     # Configuration
     input_folder = "output/no_bg_frames"
     output_folder = "output/outlined_frames"
-    outline_width = 10
-    # outline_color = (255, 255, 255, 255)
-
-    outline_color = (220, 20, 60, 255)
+    variants = args.variant or [(DEFAULT_OUTLINE_WIDTH, DEFAULT_OUTLINE_COLOR, None)]
+    if len({name for _, _, name in variants}) < len(variants):
+        parser.error("outline variants need different names")
+    # A single variant goes to the usual folder, where pack looks for frames
+    outputs = [
+        (
+            Path(output_folder if len(variants) == 1 else f"{output_folder}_{name}"),
+            width,
+            color,
+        )
+        for width, color, name in variants
+    ]
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
     input_path = Path(input_folder)
-    output_path = Path(output_folder)
-    output_path.mkdir(parents=True, exist_ok=True)
+    for output_path, _, _ in outputs:
+        output_path.mkdir(parents=True, exist_ok=True)
 
     if not input_path.exists():
         print(f"Error: '{input_folder}' folder not found!")
         return
 
-    image_files = sorted(input_path.glob("*.png"))
+    image_files = list_frames(input_path)
 
     if not image_files:
-        print(f"No PNG files found in '{input_folder}'!")
+        print(f"No frames found in '{input_folder}'!")
         return
 
     print(f"Found {len(image_files)} images in {input_folder}")
-    print(f"Applying {outline_width}px outline...")
+    encoder = encoder_from_args(args)
+    for output_path, width, _ in outputs:
+        # Outlines are drawn inside the frame, so the size does not change
+        prepare_output(
+            encoder,
+            output_path,
+            [f.stem for f in image_files],
+            lambda: first_frame_size(image_files),
+        )
+        print(f"Applying {width}px outline ({args.engine} engine) -> {output_path}")
+
+    # Frames whose input and settings match the last run are skipped, per
+    # variant; a frame store output is rebuilt every run
+    builds = [None] * len(outputs)
+    if encoder.format != "store":
+        builds = [
+            BuildManifest(
+                output_path / BUILD_NAME,
+                {
+                    "outline_width": width,
+                    "outline_color": list(color),
+                    "engine": args.engine,
+                    "format": encoder.format,
+                    "png_level": encoder.compress_level,
+                    "png_optimize": encoder.optimize,
+                },
+            )
+            for output_path, width, color in outputs
+        ]
+
+    # (frame, indices of the variants it needs)
+    todo = []
+    digests = {}
+    for f in image_files:
+        stale = list(range(len(outputs)))
+        if builds[0] is not None:
+            digests[f.name] = digest = builds[0].digest(f)
+            stale = []
+            for i, build in enumerate(builds):
+                if not args.force and build.is_current(f.name, digest, outputs[i][0]):
+                    build.record(f.name, digest, build.output(f.name, digest))
+                else:
+                    stale.append(i)
+        if stale:
+            todo.append((f, stale))
+    if len(todo) < len(image_files):
+        print(f"{len(image_files) - len(todo)} frames are up to date")
+
+    job = partial(outline_file, engine=args.engine, encoder=encoder)
+    # With --profile, workers send their spans back with each result
+    job = traced(job)
+    frames = [f for f, _ in todo]
+    frame_variants = [[outputs[i] for i in stale] for _, stale in todo]
 
-    for img_path in tqdm(image_files, desc="Adding outlines"):
-        try:
-            img = Image.open(img_path)
-            result = add_outline(img, outline_width, outline_color)
+    writer = None
+    if workers == 1:
+        # Encoding overlaps with outlining the next frame
+        writer = WriteBehind()
+        results = map(partial(job, writer=writer), frames, frame_variants)
+        executor = None
+    else:
+        print(f"Using {workers} worker processes")
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # map() yields in submission order, so progress and errors stay ordered
+        chunksize = max(1, len(todo) // (workers * 8))
+        results = executor.map(job, frames, frame_variants, chunksize=chunksize)
 
-            output_file = output_path / img_path.name
-            result.save(output_file, "PNG")
+    done = []
+    failed = {}
+    try:
+        for item, result in zip(
+            todo, tqdm(results, total=len(todo), desc="Adding outlines")
+        ):
+            error = merge(result)
+            if error:
+                print(f"\n{error}")
+            else:
+                done.append(item)
+    finally:
+        if writer is not None:
+            failed = writer.close()
+        if executor is not None:
+            executor.shutdown()
 
-        except Exception as e:
-            print(f"\nError processing {img_path.name}: {e}")
+    if builds[0] is not None:
+        # Recorded once the write-behind pool has finished writing, and only for
+        # the variants that were written; failed ones keep their last good output
+        outlined = {f.name for f, _ in done}
+        for f, stale in todo:
+            for i in stale:
+                output_file = encoder.path(outputs[i][0], f.stem)
+                if (
+                    f.name in outlined
+                    and str(output_file) not in failed
+                    and output_file.exists()
+                ):
+                    builds[i].record(f.name, digests[f.name], file_record(output_file))
+                else:
+                    builds[i].keep(f.name)
+        for build, (output_path, _, _) in zip(builds, outputs):
+            for output in build.stale_outputs():
+                (output_path / output["file"]).unlink(missing_ok=True)
+            build.save()
 
-    print(f"\nSuccess! Outlined images saved to '{output_folder}/'")
+    for output_path, _, _ in outputs:
+        # Keep the animation timing (if any) with the frames for pack
+        copy_timing(input_path, output_path)
+        copy_trim(input_path, output_path)
+        print(f"\nSuccess! Outlined images saved to '{output_path}/'")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+"""
+This module builds sprite atlases for pack.py's atlas mode.
+
+Each frame is trimmed to its alpha bounding box, identical trimmed sprites are
+stored once, and the sprites are packed into as few pages as possible with a
+shelf packer: sprites are placed tallest first, left to right on horizontal
+shelves, and a new shelf (or page) is opened when none has room. This is fast
+(no search over free rectangles) and wastes little space on animation frames,
+whose sprites have similar heights.
+
+Pages are cropped to the area actually used. A sprite larger than the page size
+gets a page of its own.
+
+Classes:
+- ShelfPacker: Places rectangles on pages of a maximum size.
+
+Functions:
+- trim: Crops a frame to its alpha bounding box.
+- build_atlas: Trims and packs frames, returning the page images and frame table.
+"""
+
+from PIL import Image
+
+from bfk_reader import pixel_hash
+
+DEFAULT_PAGE_SIZE = 2048
+# Transparent pixels between sprites, so texture filtering does not bleed
+DEFAULT_PADDING = 1
+
+
+def trim(img):
+    """
+    Returns (sprite, (x, y)): the RGBA frame cropped to its alpha bounding box
+    and the sprite's offset in the frame. Fully transparent frames give (None, None).
+    """
+    img = img.convert("RGBA")
+    bbox = img.getchannel("A").getbbox()
+    if bbox is None:
+        return None, None
+    return img.crop(bbox), bbox[:2]
+
+
+class ShelfPacker:
+    """
+    Places rectangles on pages of at most page_size x page_size pixels.
+    Rectangles should be added tallest first.
+    """
+
+    def __init__(self, page_size=DEFAULT_PAGE_SIZE, padding=DEFAULT_PADDING):
+        self.page_size = page_size
+        self.padding = padding
+        # Per page: used width and height, and shelves as [y, height, used width]
+        self.pages = []
+
+    def _fit(self, page, width, height):
+        # Best fit: the lowest existing shelf the rectangle fits on
+        best = None
+        for shelf in page["shelves"]:
+            y, shelf_height, used = shelf
+            if height <= shelf_height and used + width <= self.page_size:
+                if best is None or shelf_height < best[1]:
+                    best = shelf
+        if (
+            best is None
+            and width <= self.page_size
+            and page["height"] + height <= self.page_size
+        ):
+            best = [page["height"], height, 0]
+            page["shelves"].append(best)
+            page["height"] += height
+        return best
+
+    def add(self, width, height):
+        """
+        Reserves a width x height rectangle and returns (page index, x, y).
+        """
+        padded_w = width + self.padding
+        padded_h = height + self.padding
+        for index, page in enumerate(self.pages):
+            shelf = self._fit(page, padded_w, padded_h)
+            if shelf is not None:
+                break
+        else:
+            index = len(self.pages)
+            page = {"width": 0, "height": 0, "shelves": []}
+            self.pages.append(page)
+            shelf = self._fit(page, padded_w, padded_h)
+            if shelf is None:
+                # Larger than a page: it gets a page of its own
+                shelf = [0, padded_h, 0]
+                page["shelves"].append(shelf)
+                page["height"] = padded_h
+
+        x, y = shelf[2], shelf[0]
+        shelf[2] += padded_w
+        page["width"] = max(page["width"], shelf[2])
+        return index, x, y
+
+    def page_sizes(self):
+        """
+        Returns the (width, height) of every page, cropped to the used area.
+        """
+        return [
+            (
+                max(1, page["width"] - self.padding),
+                max(1, page["height"] - self.padding),
+            )
+            for page in self.pages
+        ]
+
+
+def build_atlas(frames, page_size=DEFAULT_PAGE_SIZE, padding=DEFAULT_PADDING):
+    """
+    Trims and packs frames given as (name, image) pairs.
+
+    Returns:
+        tuple: (pages, table), where pages is a list of RGBA page images and
+        table has one entry per frame, in order: its name, original width and
+        height, alpha bbox, pixel hash (of the frame as rebuilt from the atlas),
+        and its page, rect [x, y, width, height] on the page and trim offset
+        [x, y] in the frame. Fully transparent frames have page, rect and trim None.
+    """
+    table = []
+    sprites = {}
+    for name, img in frames:
+        sprite, trim_offset = trim(img)
+        entry = {"name": name, "width": img.width, "height": img.height}
+        if sprite is None:
+            entry.update(bbox=None, page=None, rect=None, trim=None)
+            entry["hash"] = pixel_hash(Image.new("RGBA", img.size, 0))
+            table.append(entry)
+            continue
+
+        key = pixel_hash(sprite)
+        sprites.setdefault(key, sprite)
+        x, y = trim_offset
+        entry["bbox"] = [x, y, x + sprite.width, y + sprite.height]
+        entry["trim"] = [x, y]
+        # The frame as a reader rebuilds it (transparent pixels outside the bbox
+        # come back as (0, 0, 0, 0))
+        canvas = Image.new("RGBA", img.size, 0)
+        canvas.paste(sprite, trim_offset)
+        entry["hash"] = pixel_hash(canvas)
+        entry["sprite"] = key
+        table.append(entry)
+
+    packer = ShelfPacker(page_size, padding)
+    placed = {}
+    order = sorted(sprites, key=lambda k: (-sprites[k].height, -sprites[k].width))
+    for key in order:
+        placed[key] = packer.add(*sprites[key].size)
+
+    pages = [Image.new("RGBA", size, 0) for size in packer.page_sizes()]
+    for key, (index, x, y) in placed.items():
+        pages[index].paste(sprites[key], (x, y))
+
+    for entry in table:
+        key = entry.pop("sprite", None)
+        if key is not None:
+            index, x, y = placed[key]
+            sprite = sprites[key]
+            entry["page"] = index
+            entry["rect"] = [x, y, sprite.width, sprite.height]
+    return pages, table
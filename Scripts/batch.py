@@ -0,0 +1,473 @@
+"""
+This script processes many characters in one run from a TOML list of jobs
+(main.py batch jobs.toml). Each job has its own input (a folder of frames or an
+animated GIF/APNG/WebP file), stages, outline settings and output .bfk, and runs
+the in-memory pipeline of run_all.py.
+
+Jobs run at the same time in a pool of worker processes, so their CPU-bound
+work (decoding, outlining, PNG encoding, compression) spreads over every core.
+Inference goes through one shared background-removal daemon (see
+mask_server.py): the model is loaded once for the whole batch, and frames from
+all running jobs are gathered into the same inference batches. A daemon already
+serving the model is used as it is; otherwise one is started for the batch and
+stopped at the end. Jobs asking for another model (or a local ONNX file) load
+their own session, as does every job where Unix sockets are not available.
+
+The longest jobs (by input size) are started first, so a large character
+queued last does not hold up the end of the batch. Every job writes its
+console output to output/batch/<name>.log, and a summary of per-job timing is
+printed and saved to output/batch/report.json.
+
+Jobs file:
+    # Top-level keys are defaults for every job
+    model = "u2netp"
+    compression = "auto"
+
+    [[job]]
+    name = "alice"                  # default: the output's stem
+    input = "characters/alice"
+    output = "alice.bfk"            # written to output/package/
+    stages = ["remove-bg", "outline", "pack"]
+    outline_width = 12
+    outline_color = "#ffffff"
+
+Functions:
+- load_jobs: Reads and validates a jobs file.
+- run_job: Runs one job's pipeline; called in the worker processes.
+- run_batch: Schedules the jobs and reports their timing.
+- main: Handles command-line arguments and script execution flow.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+try:
+    import tomllib
+except ImportError:
+    # Python < 3.11
+    import tomli as tomllib
+
+from PIL import ImageColor
+
+from apply_outline import DEFAULT_OUTLINE_COLOR, DEFAULT_OUTLINE_WIDTH, ENGINES
+from atlas import DEFAULT_PADDING, DEFAULT_PAGE_SIZE
+from bfk_reader import BfkReader
+from frame_encoder import FrameEncoder
+from frame_trim import DEFAULT_TOLERANCE
+from light_remove_bg import DEFAULT_MODEL, MODELS, select_model
+from mask_cache import DEFAULT_CACHE_DIR, MaskCache
+from mask_server import DEFAULT_SOCKET, connect, stop
+from pack import DEFAULT_POLICY, POLICIES
+from run_all import run_all
+
+LOG_DIR = Path("output/batch")
+STAGES = ("remove-bg", "outline", "pack")
+# Settings of a job and their defaults
+JOB_DEFAULTS = {
+    "name": None,
+    "input": None,
+    "output": None,
+    "stages": list(STAGES),
+    "outline_width": DEFAULT_OUTLINE_WIDTH,
+    "outline_color": list(DEFAULT_OUTLINE_COLOR),
+    "engine": "filter",
+    "model": DEFAULT_MODEL,
+    "model_path": None,
+    "int8": True,
+    "max_size": 0,
+    "cache": True,
+    "compression": DEFAULT_POLICY,
+    "dedup": False,
+    "atlas": False,
+    "atlas_size": DEFAULT_PAGE_SIZE,
+    "atlas_padding": DEFAULT_PADDING,
+    "trim": False,
+    # None: the job's outline width
+    "trim_padding": None,
+    "trim_tolerance": DEFAULT_TOLERANCE,
+    "png_level": None,
+    "png_optimize": False,
+}
+# Seconds to wait for a daemon started by the batch to load its model
+DAEMON_TIMEOUT = 300
+
+
+def _outline_color(value):
+    """
+    Returns an RGBA tuple for a color given as a name or "#rrggbb" string, or
+    as a list of 3 or 4 channel values.
+    """
+    if isinstance(value, str):
+        color = ImageColor.getrgb(value)
+    else:
+        color = tuple(int(channel) for channel in value)
+    if len(color) == 3:
+        color += (255,)
+    if len(color) != 4 or not all(0 <= channel <= 255 for channel in color):
+        raise ValueError(f"invalid outline_color {value!r}")
+    return color
+
+
+def load_jobs(path):
+    """
+    Reads a jobs file and returns its jobs as dicts with every setting filled in.
+    Raises ValueError if a job is invalid.
+    """
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+
+    tables = config.pop("job", [])
+    unknown = set(config) - set(JOB_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+    if not tables:
+        raise ValueError(f"No [[job]] entries in {path}")
+
+    jobs = []
+    for number, table in enumerate(tables, 1):
+        job = {**JOB_DEFAULTS, **config, **table}
+        where = f"job {table.get('name', number)}"
+        unknown = set(job) - set(JOB_DEFAULTS)
+        if unknown:
+            raise ValueError(f"{where}: unknown settings {', '.join(sorted(unknown))}")
+        for key in ("input", "output"):
+            if not job[key]:
+                raise ValueError(f"{where}: '{key}' is required")
+        if Path(job["output"]).name != job["output"]:
+            raise ValueError(f"{where}: 'output' must be a file name, not a path")
+        if not job["name"]:
+            job["name"] = Path(job["output"]).stem
+        elif Path(job["name"]).name != job["name"]:
+            raise ValueError(f"{where}: 'name' is used for its log file, not a path")
+        if "pack" not in job["stages"] or set(job["stages"]) - set(STAGES):
+            raise ValueError(
+                f"{where}: stages must include 'pack' and be among {', '.join(STAGES)}"
+            )
+        if job["engine"] not in ENGINES:
+            raise ValueError(f"{where}: unknown engine {job['engine']!r}")
+        if job["model"] not in MODELS:
+            raise ValueError(f"{where}: unknown model {job['model']!r}")
+        if job["compression"] not in POLICIES:
+            raise ValueError(f"{where}: unknown compression {job['compression']!r}")
+        try:
+            job["outline_color"] = _outline_color(job["outline_color"])
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{where}: {e}") from None
+        if not Path(job["input"]).exists():
+            raise ValueError(f"{where}: input not found: {job['input']}")
+        jobs.append(job)
+
+    for key in ("name", "output"):
+        repeated = [v for v, n in Counter(job[key] for job in jobs).items() if n > 1]
+        if repeated:
+            raise ValueError(f"Several jobs share the {key} {repeated[0]!r}")
+    return jobs
+
+
+def _input_size(path):
+    """
+    Returns the size in bytes of a job's input, to start the longest jobs first.
+    """
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size
+    return sum(f.stat().st_size for f in path.iterdir() if f.is_file())
+
+
+def run_job(job, socket_path, workers, log_path):
+    """
+    Runs a job's pipeline with its output going to log_path. Runs inside a
+    worker process, so errors are returned instead of raised.
+
+    Returns:
+        dict: The job's name, status, start time, seconds and frame count.
+    """
+    started = time.time()
+    start = time.perf_counter()
+    output_path = None
+    error = None
+    with (
+        open(log_path, "w", encoding="utf-8") as log,
+        redirect_stdout(log),
+        redirect_stderr(log),
+    ):
+        try:
+            remove_bg = "remove-bg" in job["stages"]
+            encoder_options = {"optimize": job["png_optimize"]}
+            if job["png_level"] is not None:
+                encoder_options["compress_level"] = job["png_level"]
+            output_path = run_all(
+                job["output"],
+                input_path=Path(job["input"]),
+                outline_width=(
+                    job["outline_width"] if "outline" in job["stages"] else 0
+                ),
+                outline_color=job["outline_color"],
+                engine=job["engine"],
+                workers=workers,
+                cache=MaskCache(DEFAULT_CACHE_DIR) if job["cache"] else None,
+                compression=job["compression"],
+                dedup=job["dedup"],
+                socket_path=socket_path,
+                encoder=FrameEncoder(**encoder_options),
+                atlas=job["atlas"],
+                atlas_size=max(1, job["atlas_size"]),
+                atlas_padding=max(0, job["atlas_padding"]),
+                model_name=job["model"],
+                model_path=(
+                    select_model(job["model"], job["model_path"], job["int8"])
+                    if remove_bg
+                    else None
+                ),
+                max_size=max(0, job["max_size"]) or None,
+                trim=job["trim"],
+                trim_padding=job["trim_padding"],
+                trim_tolerance=job["trim_tolerance"],
+                remove_bg=remove_bg,
+            )
+        except Exception as e:
+            traceback.print_exc()
+            error = str(e)
+
+    seconds = time.perf_counter() - start
+    frames = 0
+    if output_path is not None:
+        with BfkReader(output_path) as reader:
+            frames = len(reader)
+    elif error is None:
+        error = f"no package written, see {log_path}"
+    return {
+        "name": job["name"],
+        "status": "ok" if error is None else "failed",
+        "error": error,
+        "output": str(output_path) if output_path is not None else None,
+        "started": started,
+        "seconds": seconds,
+        "frames": frames,
+        "log": str(log_path),
+    }
+
+
+def _daemon_model(jobs):
+    """
+    Returns the model most jobs infer through the daemon, or None if no job does.
+    """
+    models = Counter(
+        job["model"]
+        for job in jobs
+        if "remove-bg" in job["stages"]
+        and select_model(job["model"], job["model_path"], job["int8"]) is None
+    )
+    return models.most_common(1)[0][0] if models else None
+
+
+def _start_daemon(model_name, socket_path, log_path):
+    """
+    Starts mask_server.py for model_name on socket_path and waits until it
+    answers. Returns the daemon's process, or None if it did not start.
+    """
+    script = Path(__file__).with_name("mask_server.py")
+    with open(log_path, "w", encoding="utf-8") as log:
+        process = subprocess.Popen(
+            [sys.executable, str(script), "--socket", str(socket_path)]
+            + ["--model", model_name],
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+    deadline = time.monotonic() + DAEMON_TIMEOUT
+    while time.monotonic() < deadline and process.poll() is None:
+        client = connect(socket_path, model_name)
+        if client is not None:
+            client.close()
+            return process
+        time.sleep(0.2)
+    process.terminate()
+    process.wait()
+    return None
+
+
+def _stop_daemon(process, socket_path):
+    stop(socket_path)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.terminate()
+        process.wait()
+
+
+def _report(results, wall):
+    print(f"\n{'job':<24} {'status':<7} {'frames':>6} {'seconds':>8} {'fps':>7}")
+    for result in results:
+        fps = result["frames"] / result["seconds"] if result["seconds"] else 0
+        print(
+            f"{result['name']:<24} {result['status']:<7} {result['frames']:>6} "
+            f"{result['seconds']:>8.2f} {fps:>7.1f}"
+        )
+        if result["error"]:
+            print(f"    {result['error']}")
+    busy = sum(result["seconds"] for result in results)
+    speedup = busy / wall if wall else 0
+    print(
+        f"\n{len(results)} jobs in {wall:.2f}s "
+        f"({busy:.2f}s of job time, {speedup:.1f}x parallel)"
+    )
+
+
+def run_batch(jobs, parallel=0, workers=0, socket_path=DEFAULT_SOCKET, daemon=True):
+    """
+    Runs jobs with up to `parallel` at a time (0 = one per 4 CPU cores), each
+    outlining and encoding on `workers` threads (0 = the cores divided among
+    the running jobs), and prints and saves their timing.
+
+    Returns:
+        list[dict]: The result of every job (see run_job), in jobs file order.
+    """
+    cpus = os.cpu_count() or 1
+    parallel = min(len(jobs), parallel if parallel > 0 else max(1, cpus // 4))
+    workers = workers if workers > 0 else max(1, cpus // parallel)
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+    daemon_process = None
+    model_name = _daemon_model(jobs) if daemon else None
+    if model_name is not None:
+        client = connect(socket_path, model_name)
+        if client is not None:
+            client.close()
+            print(f"Using the running daemon on {socket_path} for {model_name}")
+        else:
+            # A batch's own daemon, so a daemon serving another model is left alone
+            socket_path = Path("cache") / f"batch-{os.getpid()}.sock"
+            print(f"Starting a daemon for {model_name}...")
+            daemon_process = _start_daemon(
+                model_name, socket_path, LOG_DIR / "daemon.log"
+            )
+            if daemon_process is None:
+                print("The daemon did not start; jobs will load their own model.")
+
+    # Longest jobs first, so the batch does not end waiting on one of them
+    order = sorted(jobs, key=lambda job: _input_size(job["input"]), reverse=True)
+    print(
+        f"Running {len(jobs)} jobs, {parallel} at a time, "
+        f"{workers} thread(s) per job (logs in {LOG_DIR}/)"
+    )
+
+    start = time.perf_counter()
+    batch_started = time.time()
+    results = {}
+    try:
+        with ProcessPoolExecutor(max_workers=parallel) as pool:
+            futures = {
+                pool.submit(
+                    run_job,
+                    job,
+                    socket_path if daemon else None,
+                    workers,
+                    LOG_DIR / f"{job['name']}.log",
+                ): job
+                for job in order
+            }
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died
+                    result = {
+                        "name": job["name"],
+                        "status": "failed",
+                        "error": str(e),
+                        "output": None,
+                        "started": batch_started,
+                        "seconds": 0.0,
+                        "frames": 0,
+                        "log": str(LOG_DIR / f"{job['name']}.log"),
+                    }
+                results[job["name"]] = result
+                print(
+                    f"[{len(results)}/{len(jobs)}] {result['name']}: "
+                    f"{result['status']} in {result['seconds']:.2f}s"
+                )
+    finally:
+        if daemon_process is not None:
+            _stop_daemon(daemon_process, socket_path)
+    wall = time.perf_counter() - start
+
+    results = [results[job["name"]] for job in jobs]
+    for result in results:
+        result["started"] = round(result["started"] - batch_started, 3)
+    _report(results, wall)
+    with open(LOG_DIR / "report.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "parallel": parallel,
+                "workers": workers,
+                "seconds": wall,
+                "jobs": results,
+            },
+            f,
+            indent=2,
+        )
+        f.write("\n")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Process several characters from a TOML list of jobs."
+    )
+    parser.add_argument(
+        "jobs_file", help="TOML file with a [[job]] table per character"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Jobs running at the same time (0 = one per 4 CPU cores, default: 0)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Threads per job for outlining and encoding "
+        "(0 = the CPU cores divided among the running jobs, default: 0)",
+    )
+    parser.add_argument(
+        "--socket",
+        default=str(DEFAULT_SOCKET),
+        help=f"Socket of a running `main.py serve` daemon (default: {DEFAULT_SOCKET})",
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Let every job load its own model instead of sharing a daemon",
+    )
+    args = parser.parse_args()
+
+    try:
+        jobs = load_jobs(args.jobs_file)
+    except (OSError, ValueError) as e:
+        print(f"Error reading {args.jobs_file}: {e}")
+        raise SystemExit(1)
+
+    results = run_batch(
+        jobs,
+        parallel=args.jobs,
+        workers=args.workers,
+        socket_path=Path(args.socket),
+        daemon=not args.no_daemon,
+    )
+    if any(result["status"] != "ok" for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+This script benchmarks every pipeline stage on synthetic frames, so throughput
+regressions can be caught without real input. Frames are generated locally at
+several resolutions and sprite-to-canvas ratios (sprite height as a fraction of
+the canvas height), and each stage is timed in isolation:
+- outline: add_outline for every engine and outline width
+- chroma: the chroma-key (remove-bg-simple) keying of a green-screen frame
+- rembg: U²-Net inference, skipped when rembg or the model file is missing
+- pack: writing PNG frames into a .bfk archive
+
+Each case runs in a fresh process so its peak RSS is its own. Results (frames/sec,
+p50/p95 latency per frame, peak RSS) are printed and written as JSON, which can
+be compared against a stored baseline with --baseline.
+
+Functions:
+- make_frame: Builds a synthetic RGBA (transparent) or RGB (green-screen) frame.
+- build_cases: Expands the command-line options into benchmark cases.
+- run_case: Times one case (runs in a child process).
+- summarize: Turns per-frame latencies into the reported metrics.
+- compare: Prints the change of every case against a baseline result file.
+- main: Parses arguments, runs the cases and writes the results.
+"""
+
+import argparse
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from PIL import Image
+
+from bench_outline import make_sprite
+
+try:
+    # Unix only; peak RSS is reported as None elsewhere
+    import resource
+except ImportError:
+    resource = None
+
+STAGES = ("outline", "chroma", "rembg", "pack")
+DEFAULT_OUTPUT = Path("output/bench/latest.json")
+RESULT_VERSION = 1
+# Case parameters copied into the results
+CASE_FIELDS = ("stage", "size", "ratio", "engine", "width", "frames")
+GREEN_SCREEN = (0, 255, 0)
+# rembg looks for its models here (see rembg.sessions.base)
+U2NET_HOME = Path(os.getenv("U2NET_HOME", Path.home() / ".u2net"))
+
+
+def make_frame(size, ratio, background=None):
+    """
+    Returns a canvas of the given size with a sprite ratio * height tall in the middle.
+    Without a background color the canvas is transparent (RGBA), otherwise RGB.
+    """
+    width, height = size
+    sprite_h = max(2, int(height * ratio))
+    sprite = make_sprite(max(2, int(sprite_h * 0.6)), sprite_h)
+    canvas = Image.new("RGBA", size, (0, 0, 0, 0) if background is None else background)
+    offset = ((width - sprite.width) // 2, (height - sprite.height) // 2)
+    canvas.alpha_composite(sprite, offset)
+    return canvas if background is None else canvas.convert("RGB")
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def rembg_available(model_name="u2net"):
+    """
+    Returns True if rembg is installed and the model is already downloaded,
+    so benchmarking never triggers a download.
+    """
+    if importlib.util.find_spec("rembg") is None:
+        return False
+    return (U2NET_HOME / f"{model_name}.onnx").exists()
+
+
+def build_cases(stages, sizes, ratios, widths, engines, frames, repeats):
+    cases = []
+    for size in sizes:
+        for ratio in ratios:
+            base = {"size": list(size), "ratio": ratio, "frames": frames}
+            label = f"{size[0]}x{size[1]}/r{ratio:.2f}"
+            if "outline" in stages:
+                for engine in engines:
+                    for width in widths:
+                        cases.append(
+                            {
+                                **base,
+                                "name": f"outline/{engine}/w{width}/{label}",
+                                "stage": "outline",
+                                "engine": engine,
+                                "width": width,
+                            }
+                        )
+            if "chroma" in stages:
+                cases.append({**base, "name": f"chroma/{label}", "stage": "chroma"})
+            if "rembg" in stages:
+                cases.append({**base, "name": f"rembg/{label}", "stage": "rembg"})
+            if "pack" in stages:
+                cases.append(
+                    {
+                        **base,
+                        "name": f"pack/{label}",
+                        "stage": "pack",
+                        "repeats": repeats,
+                    }
+                )
+    return cases
+
+
+def _time_frames(fn, frame, count):
+    fn(frame)  # warm-up (imports, buffers, session)
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn(frame)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_case(case):
+    """
+    Times one benchmark case.
+
+    Returns:
+        dict: {"latencies": seconds per frame, "peak_rss_mb": ...}
+    """
+    size = tuple(case["size"])
+    stage = case["stage"]
+
+    if stage == "outline":
+        from apply_outline import DEFAULT_OUTLINE_COLOR, add_outline
+
+        frame = make_frame(size, case["ratio"])
+        latencies = _time_frames(
+            lambda img: add_outline(
+                img, case["width"], DEFAULT_OUTLINE_COLOR, case["engine"]
+            ),
+            frame,
+            case["frames"],
+        )
+
+    elif stage == "chroma":
+        from chroma_key import DEFAULT_PRESET, ChromaKeyKernel, key_image
+
+        frame = make_frame(size, case["ratio"], GREEN_SCREEN)
+        preset = {**DEFAULT_PRESET, "target_color": list(GREEN_SCREEN)}
+        kernel = ChromaKeyKernel()
+        latencies = _time_frames(
+            lambda img: key_image(img, preset, kernel), frame, case["frames"]
+        )
+
+    elif stage == "rembg":
+        from light_remove_bg import create_session, predict_masks
+
+        frame = make_frame(size, case["ratio"], GREEN_SCREEN)
+        session = create_session()
+        latencies = _time_frames(
+            lambda img: predict_masks(session, [img]), frame, case["frames"]
+        )
+
+    elif stage == "pack":
+        from pack import write_package
+
+        buffer = io.BytesIO()
+        make_frame(size, case["ratio"]).save(buffer, "PNG")
+        data = buffer.getvalue()
+        frames = [(f"{i:05d}.png", data) for i in range(case["frames"])]
+        latencies = []
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = Path(tmp) / "bench.bfk"
+            for run in range(case["repeats"] + 1):
+                start = time.perf_counter()
+                write_package(output_path, "bench", frames)
+                elapsed = time.perf_counter() - start
+                if run:  # the first run is a warm-up
+                    latencies.append(elapsed / len(frames))
+
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    return {"latencies": latencies, "peak_rss_mb": _peak_rss_mb()}
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    # Linear interpolation between the closest ranks
+    position = (len(ordered) - 1) * fraction
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(latencies):
+    mean = sum(latencies) / len(latencies)
+    return {
+        "fps": 1 / mean if mean else None,
+        "p50_ms": _percentile(latencies, 0.5) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+    }
+
+
+def _format_row(name, result):
+    rss = result["peak_rss_mb"]
+    return (
+        f"{name:<42}{result['fps']:>10.1f}{result['p50_ms']:>10.1f}"
+        f"{result['p95_ms']:>10.1f}{'n/a' if rss is None else f'{rss:.0f}':>10}"
+    )
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    Prints the throughput change of every case present in both runs.
+
+    Returns:
+        int: Number of cases whose fps dropped by more than tolerance.
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    regressions = 0
+    print(f"\nCompared with {baseline_path}:")
+    print(f"{'case':<42}{'fps':>10}{'base':>10}{'change':>10}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or not base.get("fps") or not result.get("fps"):
+            continue
+        change = result["fps"] / base["fps"] - 1
+        flag = ""
+        if change < -tolerance:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(
+            f"{name:<42}{result['fps']:>10.1f}{base['fps']:>10.1f}"
+            f"{change * 100:>+9.1f}%{flag}"
+        )
+    missing = len(set(baseline) - set(results))
+    if missing:
+        print(f"({missing} baseline case(s) not run)")
+    return regressions
+
+
+def _parse_list(text, cast):
+    return [cast(v) for v in text.split(",") if v.strip()]
+
+
+def _parse_size(text):
+    width, height = (int(v) for v in text.lower().split("x"))
+    return width, height
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark every pipeline stage on synthetic frames."
+    )
+    parser.add_argument(
+        "--stages",
+        default=",".join(STAGES),
+        help=f"Comma-separated stages to run (default: {','.join(STAGES)})",
+    )
+    parser.add_argument(
+        "--sizes",
+        default="512x512,1920x1080",
+        help="Comma-separated frame sizes (default: 512x512,1920x1080)",
+    )
+    parser.add_argument(
+        "--ratios",
+        default="0.5,0.9",
+        help="Comma-separated sprite-to-canvas height ratios (default: 0.5,0.9)",
+    )
+    parser.add_argument(
+        "--widths",
+        default="5,20",
+        help="Comma-separated outline widths (default: 5,20)",
+    )
+    parser.add_argument(
+        "--engines",
+        default="filter,distance",
+        help="Comma-separated outline engines (default: filter,distance)",
+    )
+    parser.add_argument(
+        "--frames", type=int, default=8, help="Frames timed per case (default: 8)"
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=3,
+        help="Archives written per pack case (default: 3)",
+    )
+    parser.add_argument(
+        "--skip-rembg", action="store_true", help="Do not benchmark rembg inference"
+    )
+    parser.add_argument(
+        "--output",
+        default=str(DEFAULT_OUTPUT),
+        help=f"Where to write the JSON results (default: {DEFAULT_OUTPUT})",
+    )
+    parser.add_argument("--baseline", help="Results file to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.10,
+        help="Allowed fps drop against the baseline before failing (default: 0.10)",
+    )
+    args = parser.parse_args()
+
+    stages = _parse_list(args.stages, str)
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        print(f"Unknown stages: {', '.join(sorted(unknown))}")
+        return
+    if "rembg" in stages and (args.skip_rembg or not rembg_available()):
+        if not args.skip_rembg:
+            print(f"Skipping rembg: rembg or {U2NET_HOME / 'u2net.onnx'} not found")
+        stages.remove("rembg")
+
+    cases = build_cases(
+        stages,
+        _parse_list(args.sizes, _parse_size),
+        _parse_list(args.ratios, float),
+        _parse_list(args.widths, int),
+        _parse_list(args.engines, str),
+        max(1, args.frames),
+        max(1, args.repeats),
+    )
+
+    print(f"{'case':<42}{'fps':>10}{'p50 ms':>10}{'p95 ms':>10}{'RSS MB':>10}")
+    results = {}
+    # A fresh interpreter per case keeps peak RSS and warm caches independent
+    context = multiprocessing.get_context("spawn")
+    for case in cases:
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                measured = executor.submit(run_case, case).result()
+        except Exception as e:
+            print(f"{case['name']:<42}failed: {e}")
+            continue
+        result = {key: case[key] for key in CASE_FIELDS if key in case}
+        result.update(summarize(measured["latencies"]))
+        result["peak_rss_mb"] = measured["peak_rss_mb"]
+        results[case["name"]] = result
+        print(_format_row(case["name"], result))
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": RESULT_VERSION,
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "platform": {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "system": platform.system(),
+                    "cpu_count": os.cpu_count(),
+                },
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+        f.write("\n")
+    print(f"\nResults written to {output_path}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"\n{regressions} case(s) slower than the baseline")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+This script benchmarks the outline engines of apply_outline.py.
+It renders a synthetic sprite on a transparent canvas and times add_outline
+with every engine across a range of outline widths.
+
+Functions:
+- make_sprite: Builds a synthetic RGBA test frame.
+- time_engine: Returns the median runtime of add_outline for one configuration.
+- main: Parses arguments and prints the comparison table.
+"""
+
+import argparse
+import statistics
+import time
+from PIL import Image, ImageDraw
+
+from apply_outline import ENGINES, add_outline
+
+
+def make_sprite(width, height):
+    """
+    Draws an anti-aliased blob roughly the size of a character on a transparent canvas.
+    """
+    scale = 4
+    canvas = Image.new("RGBA", (width * scale, height * scale), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(canvas)
+    w, h = canvas.size
+    draw.ellipse((w * 0.3, h * 0.1, w * 0.7, h * 0.45), fill=(240, 200, 170, 255))
+    draw.rounded_rectangle(
+        (w * 0.25, h * 0.4, w * 0.75, h * 0.9), radius=w // 20, fill=(40, 60, 160, 255)
+    )
+    return canvas.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def time_engine(image, engine, outline_width, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        add_outline(image, outline_width, (255, 255, 255, 255), engine)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare add_outline engines across outline widths."
+    )
+    parser.add_argument(
+        "--size",
+        default="1000x1000",
+        help="Synthetic frame size as WIDTHxHEIGHT (default: 1000x1000)",
+    )
+    parser.add_argument(
+        "--widths",
+        default="2,5,10,20,40",
+        help="Comma-separated outline widths (default: 2,5,10,20,40)",
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=3, help="Runs per measurement (default: 3)"
+    )
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    widths = [int(w) for w in args.widths.split(",")]
+    image = make_sprite(width, height)
+
+    print(f"Frame: {width}x{height}, median of {args.repeats} runs (ms)")
+    print(f"{'width':>6}" + "".join(f"{engine:>12}" for engine in ENGINES))
+    for outline_width in widths:
+        row = f"{outline_width:>6}"
+        for engine in ENGINES:
+            seconds = time_engine(image, engine, outline_width, args.repeats)
+            row += f"{seconds * 1000:>12.1f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
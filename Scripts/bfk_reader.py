@@ -0,0 +1,417 @@
+"""
+This module reads .bfk archives produced by pack.py.
+A .bfk is a zip file with the frames stored under '<name>/', plus a
+'<name>/manifest.json' index that lists the full frame sequence and, per frame,
+its dimensions, alpha bounding box, pixel hash, and the local-header offset and
+compressed size of the member holding its pixels (shared by deduplicated frames).
+
+Atlas packages (pack.py --atlas) store a few atlas pages instead of one PNG per
+frame. Their manifest lists the pages, and per frame its page, the rect of its
+trimmed sprite on the page, the trim offset and the original size; frames are
+rebuilt by pasting the sprite onto a transparent canvas.
+
+Packages of frames cropped with --trim (see frame_trim.py) carry the crop in
+the manifest's "trim" entry; BfkReader.frame(index, full_canvas=True) puts a
+frame back at its place on the original canvas.
+
+Classes:
+- BfkReader: Memory-maps a package and returns any frame by index without
+  scanning or extracting the others.
+
+Functions:
+- pixel_hash: Hashes an image's decoded pixels (the content hash used in the index).
+- read_manifest: Returns the parsed manifest of an open archive, or None.
+- frame_members: Returns (frame name, member name) pairs in playback order.
+- iter_frames: Yields (frame name, PNG bytes) in playback order.
+- iter_images: Yields (frame name, decoded image), decoding each stored member once.
+- atlas_frame: Rebuilds a frame of an atlas package from its page.
+- main: Validates packages from the command line.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import mmap
+import struct
+import zipfile
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from PIL import Image
+
+MANIFEST_NAME = "manifest.json"
+# 1: frame sequence only (deduplicated packages); 2: full frame index;
+# 3: atlas packages (frames are regions of atlas pages)
+MANIFEST_VERSION = 2
+ATLAS_MANIFEST_VERSION = 3
+# Decoded atlas pages kept by BfkReader
+PAGE_CACHE_SIZE = 4
+
+# Zip local file header: fixed 30 bytes, then the name and extra field
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+LOCAL_HEADER_SIZE = 30
+
+
+def pixel_hash(img):
+    """
+    Returns a hash of an image's decoded pixels, so frames that only differ
+    in how they were encoded hash equal.
+    """
+    digest = hashlib.sha256(f"{img.mode}:{img.size}".encode("utf-8"))
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+
+def read_manifest(zf: zipfile.ZipFile):
+    """
+    Returns the parsed manifest of an open archive, or None for plain packages.
+    """
+    for name in zf.namelist():
+        parts = name.split("/")
+        if len(parts) == 2 and parts[1] == MANIFEST_NAME:
+            manifest = json.loads(zf.read(name))
+            if manifest.get("version", 0) > ATLAS_MANIFEST_VERSION:
+                raise ValueError(
+                    f"Unsupported manifest version {manifest['version']} in {name}"
+                )
+            return manifest
+    return None
+
+
+def atlas_frame(entry, page):
+    """
+    Rebuilds an atlas package frame from its manifest entry and decoded page
+    (None for fully transparent frames, which have no page).
+    """
+    img = Image.new("RGBA", (entry["width"], entry["height"]), 0)
+    if entry["rect"] is not None:
+        x, y, width, height = entry["rect"]
+        img.paste(page.crop((x, y, x + width, y + height)), tuple(entry["trim"]))
+    return img
+
+
+def frame_members(zf: zipfile.ZipFile):
+    """
+    Returns (frame name, member name) pairs in playback order.
+    Plain packages (no manifest) play their PNG members in name order. In atlas
+    packages the member is the frame's page (None for fully transparent frames).
+    """
+    manifest = read_manifest(zf)
+    if manifest is not None and "atlas" in manifest:
+        pages = manifest["atlas"]["pages"]
+        return [
+            (
+                frame["name"],
+                None if frame["page"] is None else pages[frame["page"]]["member"],
+            )
+            for frame in manifest["frames"]
+        ]
+    if manifest is not None:
+        return [(frame["name"], frame["member"]) for frame in manifest["frames"]]
+
+    members = sorted(
+        name
+        for name in zf.namelist()
+        if name.lower().endswith(".png") and not name.endswith("/")
+    )
+    return [(name.rsplit("/", 1)[-1], name) for name in members]
+
+
+def iter_frames(path):
+    """
+    Yields (frame name, PNG bytes) for every frame of a package in playback order.
+    """
+    with zipfile.ZipFile(path) as zf:
+        manifest = read_manifest(zf)
+        if manifest is not None and "atlas" in manifest:
+            # Atlas frames have no member of their own; encode the rebuilt frames
+            for name, img in _atlas_images(zf, manifest):
+                buffer = io.BytesIO()
+                img.save(buffer, "PNG")
+                yield name, buffer.getvalue()
+            return
+        for name, member in frame_members(zf):
+            yield name, zf.read(member)
+
+
+def _atlas_images(zf, manifest):
+    pages = {}
+    for entry in manifest["frames"]:
+        page = None
+        if entry["page"] is not None:
+            page = pages.get(entry["page"])
+            if page is None:
+                member = manifest["atlas"]["pages"][entry["page"]]["member"]
+                page = Image.open(io.BytesIO(zf.read(member))).convert("RGBA")
+                pages[entry["page"]] = page
+        yield entry["name"], atlas_frame(entry, page)
+
+
+def iter_images(path):
+    """
+    Yields (frame name, RGBA image) for every frame in playback order.
+    Each stored member is decoded once; repeated frames share the same image
+    object, so callers must copy it before modifying it.
+    """
+    with zipfile.ZipFile(path) as zf:
+        manifest = read_manifest(zf)
+        if manifest is not None and "atlas" in manifest:
+            yield from _atlas_images(zf, manifest)
+            return
+        members = frame_members(zf)
+        remaining = {}
+        for _, member in members:
+            remaining[member] = remaining.get(member, 0) + 1
+
+        decoded = {}
+        for name, member in members:
+            img = decoded.get(member)
+            if img is None:
+                img = Image.open(io.BytesIO(zf.read(member))).convert("RGBA")
+                decoded[member] = img
+            # Drop decoded images once their last repeat has been yielded
+            remaining[member] -= 1
+            if remaining[member] == 0:
+                del decoded[member]
+            yield name, img
+
+
+class BfkReader:
+    """
+    Random-access frame reader over a memory-mapped .bfk package.
+
+    Frames are located through the manifest index, so reading frame N only
+    touches that member's bytes. Packages without an index fall back to the
+    zip central directory (dimensions and hashes are then unknown). In atlas
+    packages, the last few decoded pages are kept in memory.
+
+    Usage:
+        with BfkReader("output/package/character.bfk") as reader:
+            image = reader.frame(42)
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self.pages = None
+        self.trim = None
+        self._decoded_pages = OrderedDict()
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            with zipfile.ZipFile(self._file) as zf:
+                self.manifest = read_manifest(zf)
+                if self.manifest is not None and self.manifest["version"] >= 2:
+                    self.frames = self.manifest["frames"]
+                    self.trim = self.manifest.get("trim")
+                    if "atlas" in self.manifest:
+                        self.pages = self.manifest["atlas"]["pages"]
+                else:
+                    self.frames = [
+                        self._entry_from_zip(zf, name, member)
+                        for name, member in frame_members(zf)
+                    ]
+        except Exception:
+            self._file.close()
+            raise
+
+    @staticmethod
+    def _entry_from_zip(zf, name, member):
+        zinfo = zf.getinfo(member)
+        return {
+            "name": name,
+            "member": member,
+            "width": None,
+            "height": None,
+            "bbox": None,
+            "hash": None,
+            "offset": zinfo.header_offset,
+            "compressed_size": zinfo.compress_size,
+            "file_size": zinfo.file_size,
+            "compress_type": zinfo.compress_type,
+            "crc": zinfo.CRC,
+        }
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _payload(self, entry):
+        """
+        Returns a zero-copy view of a member's compressed bytes.
+        """
+        offset = entry["offset"]
+        header = self._map[offset : offset + LOCAL_HEADER_SIZE]
+        if header[:4] != LOCAL_HEADER_SIGNATURE:
+            raise ValueError(f"Bad local header for {entry['member']} at {offset}")
+        name_len, extra_len = struct.unpack("<HH", header[26:30])
+        start = offset + LOCAL_HEADER_SIZE + name_len + extra_len
+        return memoryview(self._map)[start : start + entry["compressed_size"]]
+
+    @property
+    def is_atlas(self):
+        return self.pages is not None
+
+    def frame_bytes(self, index, verify=False):
+        """
+        Returns the encoded (PNG) bytes of a frame. With verify=True the CRC is checked.
+        """
+        if self.is_atlas:
+            raise ValueError("Atlas frames are regions of a page; use frame()")
+        return self._member_bytes(self.frames[index], verify)
+
+    def member_payload(self, index):
+        """
+        Returns a copy of the compressed bytes of a frame's member, as stored in
+        the archive (e.g. to copy an unchanged member into a new package).
+        """
+        if self.is_atlas:
+            raise ValueError("Atlas frames are regions of a page; use frame()")
+        payload = self._payload(self.frames[index])
+        try:
+            return bytes(payload)
+        finally:
+            payload.release()
+
+    def page_bytes(self, index, verify=False):
+        """
+        Returns the encoded (PNG) bytes of an atlas page.
+        """
+        return self._member_bytes(self.pages[index], verify)
+
+    def page(self, index):
+        """
+        Decodes an atlas page into an RGBA image (cached).
+        """
+        page = self._decoded_pages.get(index)
+        if page is None:
+            page = Image.open(io.BytesIO(self.page_bytes(index))).convert("RGBA")
+            self._decoded_pages[index] = page
+            if len(self._decoded_pages) > PAGE_CACHE_SIZE:
+                self._decoded_pages.popitem(last=False)
+        else:
+            self._decoded_pages.move_to_end(index)
+        return page
+
+    def _member_bytes(self, entry, verify):
+        payload = self._payload(entry)
+        try:
+            compress_type = entry["compress_type"]
+            if compress_type == zipfile.ZIP_STORED:
+                data = bytes(payload)
+            elif compress_type == zipfile.ZIP_DEFLATED:
+                data = zlib.decompress(payload, -15)
+            elif compress_type == zipfile.ZIP_LZMA:
+                data = zipfile.LZMADecompressor().decompress(payload)
+            else:
+                raise ValueError(f"Unsupported compression type {compress_type}")
+        finally:
+            payload.release()
+
+        if verify and zlib.crc32(data) != entry["crc"]:
+            raise ValueError(f"CRC mismatch in {entry['member']}")
+        return data
+
+    def frame(self, index, full_canvas=False):
+        """
+        Decodes a frame into an RGBA image. With full_canvas, a trimmed frame is
+        placed at its offset on a transparent canvas of the original size.
+        """
+        if self.is_atlas:
+            entry = self.frames[index]
+            page = None if entry["page"] is None else self.page(entry["page"])
+            img = atlas_frame(entry, page)
+        else:
+            img = Image.open(io.BytesIO(self.frame_bytes(index))).convert("RGBA")
+        if full_canvas and self.trim is not None:
+            canvas = Image.new("RGBA", tuple(self.trim["canvas"]), 0)
+            canvas.paste(img, tuple(self.trim["offset"]))
+            return canvas
+        return img
+
+    def validate(self, deep=False):
+        """
+        Checks every stored member's header and CRC. With deep=True, also decodes
+        each frame and compares its pixel hash with the index.
+
+        Returns:
+            list[str]: Problems found (empty if the package is valid).
+        """
+        if self.is_atlas:
+            return self._validate_atlas(deep)
+
+        problems = []
+        checked = set()
+        for index, entry in enumerate(self.frames):
+            if not deep and entry["offset"] in checked:
+                continue
+            checked.add(entry["offset"])
+            try:
+                data = self.frame_bytes(index, verify=True)
+                if deep and entry["hash"] is not None:
+                    with Image.open(io.BytesIO(data)) as img:
+                        if pixel_hash(img) != entry["hash"]:
+                            problems.append(f"{entry['name']}: pixel hash mismatch")
+            except Exception as e:
+                problems.append(f"{entry['name']}: {e}")
+        return problems
+
+    def _validate_atlas(self, deep):
+        problems = []
+        for index, entry in enumerate(self.pages):
+            try:
+                self.page_bytes(index, verify=True)
+            except Exception as e:
+                problems.append(f"{entry['member']}: {e}")
+        if deep and not problems:
+            for index, entry in enumerate(self.frames):
+                try:
+                    if pixel_hash(self.frame(index)) != entry["hash"]:
+                        problems.append(f"{entry['name']}: pixel hash mismatch")
+                except Exception as e:
+                    problems.append(f"{entry['name']}: {e}")
+        return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate .bfk packages.")
+    parser.add_argument("packages", nargs="+", help="Package files to check")
+    parser.add_argument(
+        "--deep",
+        action="store_true",
+        help="Also decode every frame and compare it with the index hash",
+    )
+    args = parser.parse_args()
+
+    failed = 0
+    for package in args.packages:
+        try:
+            with BfkReader(package) as reader:
+                problems = reader.validate(deep=args.deep)
+                count = len(reader)
+        except Exception as e:
+            problems, count = [str(e)], 0
+
+        if problems:
+            failed += 1
+            print(f"FAIL {package}")
+            for problem in problems:
+                print(f"    {problem}")
+        else:
+            print(f"OK   {package} ({count} frames)")
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+This module keeps a build manifest per stage, so reruns only redo the frames
+that changed.
+
+A stage's manifest records the parameters of the last run and, per frame, the
+digest of its input and a record of the output it produced. On the next run a
+frame is up to date when the parameters are the same, its input digest is the
+same, and its output is still the one recorded; any other change (a retouched
+frame, a new outline color, a deleted output) redoes just what it affects. A
+frame that fails keeps the output of the last good build until it succeeds.
+
+Input digests are SHA-256 hashes of a frame file's bytes (or of a stored
+frame's pixels, see frame_store.py). The size and modification time of each
+file are kept too, so unchanged files are not even read again.
+
+Classes:
+- BuildManifest: Loads, queries and saves a stage's manifest.
+
+Functions:
+- file_record: Returns the output record (name, size, mtime) of a written file.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from frame_store import StoredFrame
+
+BUILD_NAME = "build.json"
+BUILD_VERSION = 1
+
+
+def file_record(path):
+    """
+    Returns the record of an output file: its name, size and modification time.
+    """
+    stat = os.stat(path)
+    return {"file": Path(path).name, "bytes": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+def _file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _file_matches(record, folder):
+    try:
+        return file_record(Path(folder) / record["file"]) == record
+    except (OSError, KeyError, TypeError):
+        return False
+
+
+class BuildManifest:
+    """
+    The build manifest of a stage at path. Records from a run with different
+    params (or a different manifest version) are ignored, so everything is redone.
+
+    Usage:
+        build = BuildManifest(output_dir / BUILD_NAME, params)
+        digest = build.digest(frame)
+        if not build.is_current(frame.name, digest, output_dir):
+            ... process the frame ...
+        build.record(frame.name, digest, file_record(output_file))
+        # or, if processing failed: build.keep(frame.name)
+        build.save()
+    """
+
+    def __init__(self, path, params):
+        self.path = Path(path)
+        self.params = params
+        self.frames = {}
+        self.previous = {}
+        self.previous_frames = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.previous = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (
+            self.previous.get("version") == BUILD_VERSION
+            and self.previous.get("params") == params
+        ):
+            self.previous_frames = self.previous.get("frames", {})
+
+    def digest(self, frame):
+        """
+        Returns the input digest of a frame file Path or StoredFrame, reusing
+        the recorded one if the file's size and modification time are unchanged.
+        """
+        if isinstance(frame, StoredFrame):
+            return {"sha256": hashlib.sha256(frame.array()).hexdigest()}
+
+        stat = os.stat(frame)
+        digest = {"bytes": stat.st_size, "mtime": stat.st_mtime_ns}
+        # Hashes are kept across parameter changes; only the stat has to match
+        previous = self.previous.get("frames", {}).get(frame.name, {}).get("input")
+        if previous is not None and all(
+            previous.get(k) == v for k, v in digest.items()
+        ):
+            digest["sha256"] = previous["sha256"]
+        else:
+            digest["sha256"] = _file_sha256(frame)
+        return digest
+
+    def output(self, name, digest):
+        """
+        Returns the recorded output of frame name if it was built from an input
+        with the same content under the same params, otherwise None.
+        """
+        entry = self.previous_frames.get(name)
+        if (
+            entry is None
+            or entry["input"] is None
+            or entry["input"]["sha256"] != digest["sha256"]
+        ):
+            return None
+        return entry["output"]
+
+    def is_current(self, name, digest, output_dir):
+        """
+        Returns True if frame name is up to date: same input content and params,
+        and its output file in output_dir is the one recorded.
+        """
+        output = self.output(name, digest)
+        return output is not None and _file_matches(output, output_dir)
+
+    def record(self, name, digest, output):
+        self.frames[name] = {"input": digest, "output": output}
+
+    def keep(self, name):
+        """
+        Keeps the last run's output of frame name, which failed in this run, so
+        it is not deleted as stale. It is redone on the next run, unless it was
+        built from the same input under the same params.
+        """
+        entry = self.previous.get("frames", {}).get(name)
+        if entry is None:
+            return
+        if name not in self.previous_frames:
+            # Built under other params: never current, only kept
+            entry = {"input": None, "output": entry["output"]}
+        self.frames[name] = entry
+
+    def stale_outputs(self):
+        """
+        Returns the output records of the last run whose files this run did not
+        produce or keep (their input is gone, or the output format changed).
+        """
+        current = {entry["output"].get("file") for entry in self.frames.values()}
+        return [
+            entry["output"]
+            for entry in self.previous.get("frames", {}).values()
+            if entry["output"].get("file") not in current
+        ]
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": BUILD_VERSION,
+                    "params": self.params,
+                    "frames": self.frames,
+                },
+                f,
+                indent=1,
+            )
+            f.write("\n")
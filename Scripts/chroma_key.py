@@ -0,0 +1,465 @@
+"""
+This module provides the keying logic behind the chroma-key tool (noai_rembg.py),
+with no Tk dependency, and a headless batch mode that keys every frame in
+input/raw_frames (or of an animated GIF/APNG/WebP file, see frame_source.py)
+with a saved parameter preset across worker processes, writing PNG, lossless
+WebP or .npy frames, or a frame store (see frame_encoder.py). With --trim, frames are first cropped
+to the union of their foreground boxes (see frame_trim.py).
+A pixel is foreground when its Euclidean RGB distance to the target color exceeds
+the tolerance. The kernel compares squared integer distances against tolerance²,
+which gives exactly the same masks as the float sqrt formulation, and works in
+buffers that are reused for every frame of the same size.
+
+Classes:
+- ChromaKeyKernel: Computes squared color distances and foreground masks.
+- PreviewPipeline: Re-renders a preview frame, recomputing only the stages whose
+  parameters changed.
+
+Functions:
+- filter_mask: Applies erosion and edge smoothing to a mask.
+- apply_mask: Returns an RGBA copy of an image with the mask as its alpha channel.
+- load_preset / save_preset: Read and write keying parameter presets (JSON).
+- key_image: Removes the preset's color from an image.
+- key_file: Keys a single file (runs in worker processes).
+- main: Runs the headless batch mode.
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from frame_encoder import (
+    FrameEncoder,
+    WriteBehind,
+    add_encoder_arguments,
+    encoder_from_args,
+    first_frame_size,
+    ordered_map,
+    prepare_output,
+)
+from frame_source import FrameSource, open_frame, write_timing
+from frame_trim import (
+    DEFAULT_PADDING,
+    DEFAULT_TOLERANCE,
+    describe,
+    union_bbox,
+    write_trim,
+)
+from profiling import merge, span, traced
+
+INPUT_DIR = Path("input/raw_frames")
+OUTPUT_DIR = Path("output/no_bg_frames")
+EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".bmp"}
+
+# Keying parameters, as saved in preset files
+DEFAULT_PRESET = {
+    "target_color": [0, 255, 0],
+    "tolerance": 50,
+    "edge_smooth": 1.0,
+    "erosion_size": 0,
+}
+
+# Per-process kernel for key_file, so its buffers are reused across frames
+_worker_kernel = None
+
+
+class ChromaKeyKernel:
+    """
+    Computes chroma-key masks without per-frame temporaries.
+
+    By default each channel is subtracted and squared in place in int32. With
+    use_lut=True, squared channel differences come from three 256-entry lookup
+    tables that are rebuilt only when the target color changes; this avoids the
+    arithmetic but pays for widening the indices, so it is usually slower on
+    numpy's current take() and is kept for platforms where gathers are cheap.
+
+    Returned arrays are the kernel's own buffers: they stay valid until the
+    next call with a frame of the same size.
+    """
+
+    def __init__(self, use_lut=False):
+        self.use_lut = use_lut
+        self._shape = None
+        self._distance = None
+        self._scratch = None
+        self._foreground = None
+        self._mask = None
+        self._lut_color = None
+        self._luts = None
+
+    def _ensure_buffers(self, shape):
+        if shape == self._shape:
+            return
+        self._shape = shape
+        self._distance = np.empty(shape, dtype=np.int32)
+        self._scratch = np.empty(shape, dtype=np.int32)
+        self._foreground = np.empty(shape, dtype=bool)
+        self._mask = np.empty(shape, dtype=np.uint8)
+
+    def _lookup_tables(self, target_color):
+        color = tuple(int(c) for c in target_color[:3])
+        if color != self._lut_color:
+            values = np.arange(256, dtype=np.int32)
+            self._luts = [(values - c) ** 2 for c in color]
+            self._lut_color = color
+        return self._luts
+
+    def squared_distance(self, rgb, target_color):
+        """
+        Returns the squared RGB distance of every pixel to the target color.
+
+        Args:
+            rgb (np.ndarray): HxWx3 (or HxWx4) uint8 pixel array.
+            target_color: (R, G, B) target color.
+        """
+        self._ensure_buffers(rgb.shape[:2])
+        distance = self._distance
+        scratch = self._scratch
+
+        if self.use_lut:
+            luts = self._lookup_tables(target_color)
+            np.take(luts[0], rgb[:, :, 0], out=distance, mode="clip")
+            for channel in (1, 2):
+                np.take(luts[channel], rgb[:, :, channel], out=scratch, mode="clip")
+                distance += scratch
+            return distance
+
+        for channel in range(3):
+            out = distance if channel == 0 else scratch
+            np.subtract(rgb[:, :, channel], np.int32(target_color[channel]), out=out)
+            np.multiply(out, out, out=out)
+            if channel:
+                distance += scratch
+        return distance
+
+    def threshold(self, squared_distance, tolerance):
+        """
+        Returns a uint8 mask: 255 where the distance exceeds the tolerance, else 0.
+        """
+        self._ensure_buffers(squared_distance.shape)
+        tolerance = int(tolerance)
+        np.greater(squared_distance, tolerance * tolerance, out=self._foreground)
+        np.multiply(self._foreground, np.uint8(255), out=self._mask)
+        return self._mask
+
+    def mask(self, rgb, target_color, tolerance):
+        """
+        Returns the foreground mask for a frame (see threshold()).
+        """
+        return self.threshold(self.squared_distance(rgb, target_color), tolerance)
+
+
+def filter_mask(mask_img, erosion_size, edge_smooth):
+    """
+    Shrinks the mask by erosion_size pixels (removes color halos), then blurs it
+    with radius edge_smooth (soft edges).
+    """
+    if erosion_size > 0:
+        # MinFilter works as an erosion filter on light objects (white mask)
+        mask_img = mask_img.filter(ImageFilter.MinFilter(erosion_size * 2 + 1))
+    if edge_smooth > 0:
+        mask_img = mask_img.filter(ImageFilter.GaussianBlur(radius=edge_smooth))
+    return mask_img
+
+
+def apply_mask(img_pil, mask_img):
+    """
+    Returns an RGBA copy of the image with the mask as its alpha channel.
+    """
+    if img_pil.mode != "RGBA":
+        img_pil = img_pil.convert("RGBA")
+    result = img_pil.copy()
+    result.putalpha(mask_img)
+    return result
+
+
+class PreviewPipeline:
+    """
+    Renders chroma-key previews of one image incrementally.
+
+    The stages are cached separately: the distance map until the target color
+    (or image) changes, the thresholded mask until the tolerance changes, and
+    the filtered mask until erosion or smoothing changes. A tolerance tweak
+    therefore skips the distance pass, and an erosion/smooth tweak only
+    re-runs the filters.
+
+    Not thread-safe: use one pipeline per thread.
+    """
+
+    def __init__(self):
+        self.kernel = ChromaKeyKernel()
+        self._image = None
+        self._pixels = None
+        self._color = None
+        self._distance = None
+        self._tolerance = None
+        self._mask = None
+        self._filter_params = None
+        self._filtered = None
+
+    def render(self, image, target_color, tolerance, erosion_size, edge_smooth):
+        """
+        Returns the keyed RGBA preview of image for the given parameters.
+        """
+        if image is not self._image:
+            self._image = image
+            self._pixels = np.asarray(image)
+            self._color = None
+
+        color = tuple(int(c) for c in target_color[:3])
+        if color != self._color:
+            self._distance = self.kernel.squared_distance(self._pixels, color)
+            self._color = color
+            self._tolerance = None
+
+        tolerance = int(tolerance)
+        if tolerance != self._tolerance:
+            self._mask = Image.fromarray(
+                self.kernel.threshold(self._distance, tolerance)
+            )
+            self._tolerance = tolerance
+            self._filter_params = None
+
+        filter_params = (erosion_size, edge_smooth)
+        if filter_params != self._filter_params:
+            self._filtered = filter_mask(self._mask, erosion_size, edge_smooth)
+            self._filter_params = filter_params
+
+        return apply_mask(image, self._filtered)
+
+
+def load_preset(path):
+    """
+    Reads a preset file. Missing keys take their DEFAULT_PRESET values.
+
+    Raises:
+        ValueError: If the file contains unknown keys or invalid values.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: preset must be a JSON object")
+
+    unknown = set(data) - set(DEFAULT_PRESET)
+    if unknown:
+        raise ValueError(f"{path}: unknown preset keys {sorted(unknown)}")
+
+    preset = {**DEFAULT_PRESET, **data}
+    color = preset["target_color"]
+    if len(color) != 3 or not all(isinstance(c, int) and 0 <= c <= 255 for c in color):
+        raise ValueError(f"{path}: target_color must be three integers 0-255")
+    try:
+        preset["target_color"] = list(color)
+        preset["tolerance"] = int(preset["tolerance"])
+        preset["edge_smooth"] = float(preset["edge_smooth"])
+        preset["erosion_size"] = int(preset["erosion_size"])
+    except (TypeError, ValueError):
+        raise ValueError(
+            f"{path}: tolerance, edge_smooth and erosion_size must be numbers"
+        )
+    return preset
+
+
+def save_preset(path, preset):
+    """
+    Writes a preset file.
+    """
+    data = {key: preset[key] for key in DEFAULT_PRESET}
+    data["target_color"] = [int(c) for c in data["target_color"]]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def key_image(img_pil, preset, kernel):
+    """
+    Removes the preset's target color from an image.
+
+    Returns:
+        Image: RGBA image with the keyed mask as its alpha channel.
+    """
+    mask_array = kernel.mask(
+        np.asarray(img_pil), preset["target_color"], preset["tolerance"]
+    )
+    mask_img = filter_mask(
+        Image.fromarray(mask_array), preset["erosion_size"], preset["edge_smooth"]
+    )
+    return apply_mask(img_pil, mask_img)
+
+
+def _write(img, output_file, encoder):
+    with span("encode", frame=output_file.name):
+        encoder.save(img, output_file)
+
+
+def key_file(file_path, output_dir, preset, encoder=None, writer=None, box=None):
+    """
+    Decodes, keys and encodes a single frame, cropped to box if given.
+    Runs inside worker processes, so errors are returned instead of raised.
+    With a WriteBehind writer, the frame is encoded on the writer's threads.
+
+    Returns:
+        str | None: An error message for this frame, or None on success.
+    """
+    global _worker_kernel
+    if _worker_kernel is None:
+        _worker_kernel = ChromaKeyKernel()
+
+    try:
+        with span("decode", frame=file_path.name):
+            img = open_frame(file_path).convert("RGBA")
+            if box is not None:
+                img = img.crop(box)
+        with span("key", frame=file_path.name):
+            result = key_image(img, preset, _worker_kernel)
+        encoder = encoder or FrameEncoder()
+        output_file = encoder.path(output_dir, file_path.stem)
+        if writer is not None:
+            writer.submit(file_path.name, _write, result, output_file, encoder)
+        else:
+            _write(result, output_file, encoder)
+    except Exception as e:
+        return f"Error processing {file_path.name}: {e}"
+
+    return None
+
+
+def main():
+    # Only the headless batch needs tqdm; the GUI imports this module without it
+    from tqdm import tqdm
+
+    parser = argparse.ArgumentParser(
+        description="Remove a background color from input/raw_frames without the GUI."
+    )
+    parser.add_argument(
+        "--preset",
+        help="Preset file exported from the GUI (default: built-in green screen)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Number of worker processes (0 = one per CPU core, default: 0)",
+    )
+    parser.add_argument(
+        "--input",
+        default=str(INPUT_DIR),
+        help="Folder of frames, or an animated GIF/APNG/WebP file "
+        f"(default: {INPUT_DIR})",
+    )
+    parser.add_argument(
+        "--trim",
+        action="store_true",
+        help="Crop all frames to the union of their foreground boxes",
+    )
+    parser.add_argument(
+        "--trim-padding",
+        type=int,
+        default=DEFAULT_PADDING,
+        help="Margin kept around the union box, e.g. for the outline "
+        f"(default: {DEFAULT_PADDING})",
+    )
+    parser.add_argument(
+        "--trim-tolerance",
+        type=int,
+        default=DEFAULT_TOLERANCE,
+        help="Color difference from the corners that counts as foreground in "
+        f"opaque frames (default: {DEFAULT_TOLERANCE})",
+    )
+    add_encoder_arguments(parser)
+    args = parser.parse_args()
+
+    preset = dict(DEFAULT_PRESET)
+    if args.preset:
+        try:
+            preset = load_preset(args.preset)
+        except (OSError, ValueError) as e:
+            print(f"Error loading preset: {e}")
+            return
+
+    input_path = Path(args.input)
+    if not input_path.exists():
+        print(f"Input not found: {input_path}")
+        return
+
+    source = FrameSource(input_path, EXTENSIONS)
+    if not len(source):
+        print(f"No valid image files found in {input_path}")
+        return
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    r, g, b = preset["target_color"]
+    print(f"Found {len(source)} images in {input_path}")
+    print(
+        f"Keying R:{r} G:{g} B:{b} (tolerance {preset['tolerance']}, "
+        f"smooth {preset['edge_smooth']}, erosion {preset['erosion_size']})..."
+    )
+
+    trim = None
+    if args.trim:
+        trim = union_bbox(
+            FrameSource(input_path, EXTENSIONS),
+            max(0, args.trim_padding),
+            args.trim_tolerance,
+            workers=workers,
+        )
+        print(describe(trim) if trim else "Nothing to trim.")
+    box = trim["box"] if trim is not None else None
+
+    def frame_size():
+        if box is not None:
+            return box[2] - box[0], box[3] - box[1]
+        return first_frame_size(source, open_frame)
+
+    encoder = encoder_from_args(args)
+    prepare_output(encoder, OUTPUT_DIR, source.stems(), frame_size)
+    # With --profile, workers send their spans back with each result
+    job = traced(
+        partial(
+            key_file,
+            output_dir=OUTPUT_DIR,
+            preset=preset,
+            encoder=encoder,
+            box=box,
+        )
+    )
+    writer = None
+    if workers == 1:
+        # Encoding overlaps with keying the next frame
+        writer = WriteBehind()
+        results = map(partial(job, writer=writer), source)
+        executor = None
+    else:
+        print(f"Using {workers} worker processes")
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # Results come back in submission order, so progress and errors stay ordered
+        results = ordered_map(
+            executor, job, ((frame,) for frame in source), workers * 4
+        )
+
+    try:
+        for result in tqdm(results, total=len(source), desc="Removing background"):
+            error = merge(result)
+            if error:
+                print(f"\n{error}")
+    finally:
+        if writer is not None:
+            writer.close()
+        if executor is not None:
+            executor.shutdown()
+
+    write_timing(OUTPUT_DIR, source)
+    write_trim(OUTPUT_DIR, trim)
+
+    print(f"\nSuccess! Processed images saved to '{OUTPUT_DIR}/'")
+
+
+if __name__ == "__main__":
+    main()
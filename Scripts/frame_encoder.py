@@ -0,0 +1,276 @@
+"""
+This module provides the output encoders shared by every stage, so intermediate
+frames can be written fast and final frames small without editing the scripts.
+
+Formats:
+- png: compress level 0 (fastest, largest) to 9, optionally with optimize
+  (an extra pass that searches for the smallest encoding; slow)
+- webp: lossless WebP, usually smaller than PNG at a similar speed
+- npy: raw numpy arrays, no compression at all (intermediates only)
+- store: every frame in one memory-mapped frame store (see frame_store.py);
+  no codec work at all, and the next stage reads the pixels in place
+
+Every stage reads all of them back, and pack.py always stores PNG members,
+re-encoding frames that are not PNG files.
+
+Classes:
+- FrameEncoder: Saves or encodes frames in the configured format.
+- WriteBehind: Runs frame writes on a thread pool so they overlap with compute.
+
+Functions:
+- load_frame: Opens a frame file written in any of the formats.
+- list_frames: Returns the frame files (or stored frames) of a folder, in name order.
+- first_frame_size: Returns the size of the first readable frame of a sequence.
+- prepare_output: Creates the frame store of an output folder, or removes a stale one.
+- ordered_map: Runs calls on an executor, yielding results in order with a bounded
+  number in flight.
+- add_encoder_arguments: Adds the encoder options to an argument parser.
+- encoder_from_args: Builds a FrameEncoder from parsed arguments.
+"""
+
+import io
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+from frame_store import (
+    STORE_NAME,
+    StoredFrame,
+    create_store,
+    has_store,
+    open_store,
+    remove_store,
+)
+
+FORMATS = ("png", "webp", "npy", "store")
+SUFFIXES = {"png": ".png", "webp": ".webp", "npy": ".npy"}
+# Pillow's own default
+DEFAULT_PNG_LEVEL = 6
+
+
+class FrameEncoder:
+    """
+    Encodes frames as PNG (compress_level 0-9, optimize), lossless WebP or .npy.
+    Picklable, so it can be passed to worker processes.
+    """
+
+    def __init__(self, format="png", compress_level=DEFAULT_PNG_LEVEL, optimize=False):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown frame format: {format}")
+        self.format = format
+        self.compress_level = compress_level
+        self.optimize = optimize
+
+    @property
+    def suffix(self):
+        return SUFFIXES.get(self.format, "")
+
+    def path(self, output_dir, stem):
+        """
+        Returns the path a frame named stem is written to in output_dir
+        (for the store format, the StoredFrame it is written to).
+        """
+        if self.format == "store":
+            return StoredFrame(Path(output_dir) / STORE_NAME, stem)
+        return Path(output_dir) / f"{stem}{self.suffix}"
+
+    def save(self, img, file):
+        """
+        Writes img to a path or binary file object, or into its frame store.
+        """
+        if self.format == "store":
+            # Created beforehand by prepare_output()
+            open_store(file.path, writable=True).put(file.stem, img)
+        elif self.format == "npy":
+            np.save(file, np.asarray(img), allow_pickle=False)
+        elif self.format == "webp":
+            # exact keeps the color of transparent pixels, so decoding is bit-exact
+            img.save(file, "WEBP", lossless=True, exact=True)
+        else:
+            img.save(
+                file,
+                "PNG",
+                compress_level=self.compress_level,
+                optimize=self.optimize,
+            )
+
+    def encode(self, img):
+        """
+        Returns img encoded as bytes.
+        """
+        if self.format == "store":
+            raise ValueError("Stored frames are not encoded; use save()")
+        buffer = io.BytesIO()
+        self.save(img, buffer)
+        return buffer.getvalue()
+
+    def describe(self):
+        if self.format == "png":
+            optimize = ", optimize" if self.optimize else ""
+            return f"PNG (level {self.compress_level}{optimize})"
+        if self.format == "store":
+            return "memory-mapped frame store"
+        return "lossless WebP" if self.format == "webp" else "raw .npy"
+
+
+def load_frame(path):
+    """
+    Opens a frame written by a FrameEncoder (or any image file Pillow reads).
+    Stored frames are returned without copying their pixels.
+    """
+    if isinstance(path, StoredFrame):
+        return path.image()
+    path = Path(path)
+    if path.suffix.lower() == ".npy":
+        return Image.fromarray(np.load(path, allow_pickle=False))
+    return Image.open(path)
+
+
+def list_frames(folder):
+    """
+    Returns the frame files (.png, .webp, .npy) of a folder, sorted by name, or
+    the written frames of its frame store if it has one.
+    """
+    if has_store(folder):
+        return open_store(Path(folder) / STORE_NAME).frames()
+    return sorted(
+        f
+        for f in Path(folder).iterdir()
+        if f.is_file() and f.suffix.lower() in SUFFIXES.values()
+    )
+
+
+def first_frame_size(frames, opener=load_frame):
+    """
+    Returns the (width, height) of the first frame that opener can open, or
+    (0, 0) if none can.
+    """
+    for frame in frames:
+        try:
+            return opener(frame).size
+        except Exception:
+            # Reported by the stage when it gets to the frame
+            continue
+    return 0, 0
+
+
+def prepare_output(encoder, output_dir, stems, frame_size):
+    """
+    Readies output_dir for frames written with encoder. For the store format,
+    creates the store for the given frame stems; frame_size is a callable
+    returning the (width, height) of every frame. For the other formats, removes
+    a store left by an earlier run, which would shadow the new frame files.
+    """
+    if encoder.format == "store":
+        create_store(output_dir, stems, frame_size())
+    else:
+        remove_store(output_dir)
+
+
+class WriteBehind:
+    """
+    Runs write jobs on a thread pool while the caller computes the next frames.
+    At most max_pending writes are queued; errors are reported per frame, and
+    the names of the writes that failed are kept in `failed`.
+
+    Usage:
+        with WriteBehind() as writer:
+            writer.submit(name, encoder.save, img, path)
+        written = [name for name in names if name not in writer.failed]
+    """
+
+    def __init__(self, workers=2, max_pending=16):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.failed = {}
+
+    def submit(self, name, fn, *args):
+        self.pending.append((name, self.pool.submit(fn, *args)))
+        # Bound the number of frames held in memory waiting to be written
+        self.drain(self.max_pending)
+
+    def drain(self, limit=0):
+        """
+        Waits until at most limit writes are pending. Returns {name: error} for
+        every write that has failed so far.
+        """
+        while len(self.pending) > limit:
+            name, future = self.pending.popleft()
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error processing {name}: {e}")
+                self.failed[name] = str(e)
+        return self.failed
+
+    def close(self):
+        """
+        Waits for every pending write. Returns {name: error} for the writes
+        that failed.
+        """
+        failed = self.drain(0)
+        self.pool.shutdown()
+        return failed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def ordered_map(executor, fn, items, window):
+    """
+    Like executor.map, but each item is a tuple of arguments for fn, and at
+    most `window` calls are submitted ahead of the results, so streamed inputs
+    (e.g. frames decoded from an animation) are never buffered in full.
+    """
+    pending = deque()
+    for args in items:
+        pending.append(executor.submit(fn, *args))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def add_encoder_arguments(parser, formats=FORMATS, default_level=DEFAULT_PNG_LEVEL):
+    """
+    Adds --format (when there is a choice), --png-level and --png-optimize.
+    """
+    if len(formats) > 1:
+        parser.add_argument(
+            "--format",
+            choices=formats,
+            default=formats[0],
+            help="Frame format: png, webp (lossless), npy (raw) or store "
+            f"(one memory-mapped file, fastest) (default: {formats[0]})",
+        )
+    if default_level is None:
+        level_default = "keep PNG frames as they are"
+    else:
+        level_default = default_level
+    parser.add_argument(
+        "--png-level",
+        type=int,
+        default=default_level,
+        choices=range(0, 10),
+        metavar="0-9",
+        help=f"PNG compress level, 0 = fastest (default: {level_default})",
+    )
+    parser.add_argument(
+        "--png-optimize",
+        action="store_true",
+        help="Spend extra time making PNG frames smaller",
+    )
+
+
+def encoder_from_args(args):
+    """
+    Returns the FrameEncoder selected by add_encoder_arguments options.
+    """
+    level = DEFAULT_PNG_LEVEL if args.png_level is None else args.png_level
+    return FrameEncoder(getattr(args, "format", "png"), level, args.png_optimize)
@@ -0,0 +1,147 @@
+"""
+This module reads input frames from either a folder of stills (input/raw_frames)
+or a single animated GIF/APNG/WebP file.
+
+Animation frames are decoded one at a time as they are consumed, so a long
+animation is never held in memory at once, and are named like extracted stills
+('<file stem>_00000.png', ...). Their timing (per-frame duration and loop count)
+is recorded while iterating and can be written as a timing.json sidecar next to
+the processed frames; apply_outline.py copies it along and pack.py carries it
+into the package manifest.
+
+Classes:
+- AnimationFrame: A decoded animation frame that stands in for a still's file path.
+- FrameSource: Iterates the frames of a folder or animation file in order.
+
+Functions:
+- open_frame: Opens a still's path or returns an animation frame's image.
+- write_timing: Writes a source's timing sidecar into a frame folder.
+- read_timing: Reads the timing sidecar of a frame folder, or None.
+- copy_timing: Copies the timing sidecar from one frame folder to another.
+"""
+
+import json
+import shutil
+from pathlib import Path
+from PIL import Image
+
+# Still image extensions accepted in input folders
+EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".bmp"}
+TIMING_NAME = "timing.json"
+
+
+class AnimationFrame:
+    """
+    A decoded animation frame. Has the name and stem attributes of the Path of
+    the still it replaces, so frame loops can handle both alike.
+    """
+
+    __slots__ = ("stem", "name", "image", "duration")
+
+    def __init__(self, stem, image, duration):
+        self.stem = stem
+        self.name = f"{stem}.png"
+        self.image = image
+        self.duration = duration
+
+
+def open_frame(frame):
+    """
+    Returns the image of a frame yielded by FrameSource (opening it if it is a file).
+    """
+    if isinstance(frame, AnimationFrame):
+        return frame.image
+    return Image.open(frame)
+
+
+class FrameSource:
+    """
+    The frames of an input folder (stills in name order) or animation file.
+
+    Iterating yields Paths for stills and AnimationFrames for animations. While
+    an animation is iterated, its loop count and frame durations (ms) are
+    recorded in self.timing.
+    """
+
+    def __init__(self, path, extensions=EXTENSIONS):
+        self.path = Path(path)
+        self.is_animation = self.path.is_file()
+        self.timing = {"source": self.path.name, "loop": 0, "durations": {}}
+        if self.is_animation:
+            with Image.open(self.path) as img:
+                self._count = getattr(img, "n_frames", 1)
+            self.files = None
+        else:
+            self.files = sorted(
+                f
+                for f in self.path.iterdir()
+                if f.is_file() and f.suffix.lower() in extensions
+            )
+            self._count = len(self.files)
+
+    def __len__(self):
+        return self._count
+
+    def stems(self):
+        """
+        Returns the stems of the frames, in order, without decoding them.
+        """
+        if not self.is_animation:
+            return [f.stem for f in self.files]
+        return [self._stem(index) for index in range(self._count)]
+
+    def _stem(self, index):
+        return f"{self.path.stem}_{index:05d}"
+
+    def __iter__(self):
+        if not self.is_animation:
+            yield from self.files
+            return
+
+        durations = self.timing["durations"]
+        with Image.open(self.path) as img:
+            self.timing["loop"] = img.info.get("loop", 0)
+            for index in range(self._count):
+                img.seek(index)
+                # After seeking, the frame is fully composited (disposal and blending)
+                frame = img.convert("RGBA")
+                duration = int(img.info.get("duration", 0))
+                stem = self._stem(index)
+                durations[f"{stem}.png"] = duration
+                yield AnimationFrame(stem, frame, duration)
+
+
+def write_timing(output_dir, source):
+    """
+    Writes the timing recorded by an iterated animation FrameSource into output_dir.
+    Folder sources have no timing and write nothing.
+    """
+    if not source.is_animation or not source.timing["durations"]:
+        return
+    with open(Path(output_dir) / TIMING_NAME, "w", encoding="utf-8") as f:
+        json.dump(source.timing, f, indent=2)
+        f.write("\n")
+
+
+def read_timing(frame_dir):
+    """
+    Returns the timing sidecar of a frame folder as
+    {"source": ..., "loop": ..., "durations": {frame name: ms}}, or None.
+    """
+    path = Path(frame_dir) / TIMING_NAME
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def copy_timing(source_dir, destination_dir):
+    """
+    Copies the timing sidecar between frame folders, or removes a stale one from
+    destination_dir if source_dir has none.
+    """
+    path = Path(source_dir) / TIMING_NAME
+    if path.exists():
+        shutil.copyfile(path, Path(destination_dir) / TIMING_NAME)
+    else:
+        (Path(destination_dir) / TIMING_NAME).unlink(missing_ok=True)
@@ -0,0 +1,235 @@
+"""
+This module implements the frame store: a single memory-mapped file of raw RGBA
+frames that stages can hand to each other instead of one PNG per frame, so a
+frame moves from remove-bg to apply-outline to pack with no encoding or decoding
+at all, and the OS pages pixels in and out as they are touched.
+
+Layout of 'frames.bfs' (little-endian):
+- header: magic b"BFS1", frame count, width, height (uint32 each)
+- one index entry per frame: pixel offset (uint64), written flag (uint8) and
+  UTF-8 frame stem (119 bytes, zero-padded)
+- the frames, width * height * 4 bytes each, starting at a page boundary
+
+Every frame of a store has the same size. The store and its index are created
+up front with the stems of every frame, so frames can be written in any order,
+by several threads or worker processes at once; a frame becomes visible to
+readers once its written flag is set.
+
+Classes:
+- FrameStore: Opens a store and reads or writes its frames.
+- StoredFrame: A frame of a store; passed around like the Path of a frame file.
+
+Functions:
+- create_store: Creates an empty store for the given frame stems and size.
+- open_store: Returns an open FrameStore, kept open for the rest of the process.
+- has_store / remove_store: Check for or delete the store of a frame folder.
+"""
+
+import mmap
+import os
+import struct
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+STORE_NAME = "frames.bfs"
+MAGIC = b"BFS1"
+
+_HEADER = struct.Struct("<4sIII")
+_ENTRY = struct.Struct("<QB119s")
+_PAGE = mmap.ALLOCATIONGRANULARITY
+
+
+class StoredFrame:
+    """
+    A frame of a store. Has the name and stem attributes of the Path of the frame
+    file it replaces, and pickles as a (path, stem) pair, so worker processes
+    open the store themselves.
+    """
+
+    __slots__ = ("path", "stem", "name")
+
+    def __init__(self, path, stem):
+        self.path = Path(path)
+        self.stem = stem
+        self.name = f"{stem}.png"
+
+    def __reduce__(self):
+        return StoredFrame, (self.path, self.stem)
+
+    def __repr__(self):
+        return f"StoredFrame({str(self.path)!r}, {self.stem!r})"
+
+    def exists(self):
+        store = open_store(self.path)
+        return store.written(store.slot(self.stem))
+
+    def array(self):
+        """
+        Returns the frame as a read-only (height, width, 4) view of the store.
+        """
+        store = open_store(self.path)
+        return store.array(store.slot(self.stem))
+
+    def image(self):
+        """
+        Returns the frame as a read-only RGBA image sharing the store's memory.
+        """
+        store = open_store(self.path)
+        return store.image(store.slot(self.stem))
+
+
+class FrameStore:
+    """
+    A memory-mapped frame store. Opened read-only unless writable is True.
+
+    Usage:
+        with FrameStore("output/no_bg_frames/frames.bfs") as store:
+            pixels = store.array(0)
+    """
+
+    def __init__(self, path, writable=False):
+        self.path = Path(path)
+        self.writable = writable
+        with open(self.path, "r+b" if writable else "rb") as f:
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            self._map = mmap.mmap(f.fileno(), 0, access=access)
+        try:
+            magic, count, width, height = _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a frame store")
+            self.size = (width, height)
+            self.stride = width * height * 4
+            self.offsets = []
+            self.stems = []
+            for slot in range(count):
+                offset, _, stem = _ENTRY.unpack_from(self._map, _entry_offset(slot))
+                self.offsets.append(offset)
+                self.stems.append(stem.rstrip(b"\0").decode("utf-8"))
+            self._slots = {stem: slot for slot, stem in enumerate(self.stems)}
+        except Exception:
+            self._map.close()
+            raise
+
+    def __len__(self):
+        return len(self.stems)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+
+    def slot(self, stem):
+        try:
+            return self._slots[stem]
+        except KeyError:
+            raise KeyError(f"{self.path} has no frame {stem}") from None
+
+    def written(self, slot):
+        # The flag byte follows the 8-byte offset
+        return self._map[_entry_offset(slot) + 8] == 1
+
+    def array(self, slot):
+        """
+        Returns a frame as a (height, width, 4) uint8 view of the mapped file.
+        The view is read-only unless the store was opened writable.
+        """
+        width, height = self.size
+        pixels = np.frombuffer(
+            self._map, np.uint8, count=self.stride, offset=self.offsets[slot]
+        )
+        return pixels.reshape(height, width, 4)
+
+    def image(self, slot):
+        """
+        Returns a frame as an RGBA image backed by the mapped file (no copy).
+        """
+        return Image.frombuffer(
+            "RGBA", self.size, self.array(slot), "raw", "RGBA", 0, 1
+        )
+
+    def put(self, stem, img):
+        """
+        Writes the frame named stem and marks it as written.
+        """
+        if img.size != self.size:
+            raise ValueError(
+                f"Frame is {img.width}x{img.height}, but the store holds "
+                f"{self.size[0]}x{self.size[1]} frames"
+            )
+        slot = self.slot(stem)
+        self.array(slot)[:] = np.asarray(img.convert("RGBA"))
+        self._map[_entry_offset(slot) + 8] = 1
+
+    def frames(self):
+        """
+        Returns a StoredFrame for every written frame, in store order.
+        """
+        return [
+            StoredFrame(self.path, stem)
+            for slot, stem in enumerate(self.stems)
+            if self.written(slot)
+        ]
+
+
+def _entry_offset(slot):
+    return _HEADER.size + slot * _ENTRY.size
+
+
+def create_store(folder, stems, size):
+    """
+    Creates an empty store in folder for frames of the given stems and
+    (width, height), replacing any previous one. Returns its path.
+    """
+    width, height = size
+    path = Path(folder) / STORE_NAME
+    stride = width * height * 4
+    data_start = -(-_entry_offset(len(stems)) // _PAGE) * _PAGE
+
+    # A new file, so readers that still map the old one are unaffected
+    path.unlink(missing_ok=True)
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(stems), width, height))
+        for slot, stem in enumerate(stems):
+            name = stem.encode("utf-8")
+            if len(name) > 119:
+                raise ValueError(f"Frame name too long for a frame store: {stem}")
+            f.write(_ENTRY.pack(data_start + slot * stride, 0, name))
+        # Sparse on most file systems: pages are only allocated when written
+        f.truncate(data_start + len(stems) * stride)
+    return path
+
+
+_open_stores = {}
+
+
+def open_store(path, writable=False):
+    """
+    Returns an open FrameStore for path, reusing the one already opened by this
+    process unless the file has been replaced since.
+    """
+    path = Path(path)
+    key = (str(path.resolve()), writable)
+    inode = os.stat(path).st_ino
+    cached = _open_stores.get(key)
+    if cached is not None and cached[0] == inode:
+        return cached[1]
+    store = FrameStore(path, writable)
+    # The replaced store's map stays valid for images still using it
+    _open_stores[key] = (inode, store)
+    return store
+
+
+def has_store(folder):
+    return (Path(folder) / STORE_NAME).is_file()
+
+
+def remove_store(folder):
+    """
+    Deletes the store of a frame folder, so it does not shadow new frame files.
+    """
+    (Path(folder) / STORE_NAME).unlink(missing_ok=True)
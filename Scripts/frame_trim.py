@@ -0,0 +1,177 @@
+"""
+This module trims a frame sequence to the union of its foreground bounding boxes,
+so every later stage (background removal, outlining, packing) works on fewer pixels.
+
+The union box is found in one streaming pass over the frames, padded (by default
+by the outline width, so the outline still fits), and every frame is then cropped
+to it as it is decoded. The crop is recorded in a trim.json sidecar next to the
+processed frames; apply_outline.py copies it along and pack.py writes it into
+the package manifest, so readers can put frames back at their original place.
+
+The foreground of frames with transparency is their non-transparent area. For
+opaque frames it is every pixel that differs from the background color (the
+median of the four corner pixels) by more than a tolerance, which suits green
+screens and flat backdrops; busy backgrounds simply leave the frame untrimmed.
+
+Functions:
+- foreground_bbox: Returns the bounding box of a frame's foreground, or None.
+- union_bbox: Returns the trim (padded union box) of a sequence, or None.
+- describe: Summarises a trim for the console.
+- write_trim / read_trim / copy_trim: Handle the trim.json sidecar.
+"""
+
+import json
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+
+from frame_source import open_frame
+
+TRIM_NAME = "trim.json"
+# apply_outline.DEFAULT_OUTLINE_WIDTH, so the outline still fits
+DEFAULT_PADDING = 10
+# Largest channel difference from the background color still counted as background
+DEFAULT_TOLERANCE = 24
+
+
+def foreground_bbox(img, tolerance=DEFAULT_TOLERANCE):
+    """
+    Returns the (left, top, right, bottom) box of a frame's foreground, or None
+    if the frame is empty.
+    """
+    if img.mode in ("RGBA", "LA") or "transparency" in img.info:
+        alpha = img.convert("RGBA").getchannel("A")
+        if alpha.getextrema()[0] < 255:
+            return alpha.getbbox()
+
+    pixels = np.asarray(img.convert("RGB"), dtype=np.int16)
+    corners = pixels[[0, 0, -1, -1], [0, -1, 0, -1]]
+    background = np.median(corners, axis=0)
+    foreground = np.abs(pixels - background).max(axis=2) > tolerance
+    rows = np.flatnonzero(foreground.any(axis=1))
+    cols = np.flatnonzero(foreground.any(axis=0))
+    if not len(rows):
+        return None
+    return (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+
+
+def union_bbox(
+    frames,
+    padding=DEFAULT_PADDING,
+    tolerance=DEFAULT_TOLERANCE,
+    opener=open_frame,
+    workers=2,
+):
+    """
+    Returns the trim for the union of the frames' foreground boxes, padded and
+    clipped to the canvas, as {"box": [l, t, r, b], "offset": [x, y],
+    "canvas": [w, h]}; or None if the frames cannot be trimmed (they differ in
+    size, are empty, or the box covers the whole canvas).
+
+    Frames are opened with opener (e.g. to apply EXIF orientation) on a small
+    thread pool, a few at a time.
+    """
+
+    def measure(frame):
+        try:
+            img = opener(frame)
+        except Exception:
+            # Unreadable frames are reported by the stage that processes them
+            return None, None
+        return img.size, foreground_bbox(img, tolerance)
+
+    size = None
+    union = None
+    pending = deque()
+
+    def collect(result):
+        nonlocal size, union
+        frame_size, bbox = result
+        if frame_size is None:
+            return
+        if size is None:
+            size = frame_size
+        elif frame_size != size:
+            raise ValueError("Frames differ in size")
+        if bbox is not None:
+            if union is None:
+                union = list(bbox)
+            else:
+                union[0] = min(union[0], bbox[0])
+                union[1] = min(union[1], bbox[1])
+                union[2] = max(union[2], bbox[2])
+                union[3] = max(union[3], bbox[3])
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for frame in frames:
+                pending.append(pool.submit(measure, frame))
+                if len(pending) >= workers * 2:
+                    collect(pending.popleft().result())
+            while pending:
+                collect(pending.popleft().result())
+    except ValueError as e:
+        print(f"Not trimming: {e}")
+        return None
+
+    if union is None:
+        return None
+    width, height = size
+    box = (
+        max(0, union[0] - padding),
+        max(0, union[1] - padding),
+        min(width, union[2] + padding),
+        min(height, union[3] + padding),
+    )
+    if box == (0, 0, width, height):
+        return None
+    return {"box": list(box), "offset": list(box[:2]), "canvas": [width, height]}
+
+
+def describe(trim):
+    left, top, right, bottom = trim["box"]
+    width, height = trim["canvas"]
+    share = (right - left) * (bottom - top) / (width * height) * 100
+    return (
+        f"Trimming {width}x{height} frames to {right - left}x{bottom - top} "
+        f"at ({left}, {top}), {share:.0f}% of the pixels"
+    )
+
+
+def write_trim(output_dir, trim):
+    """
+    Writes the trim sidecar into output_dir, or removes a stale one if trim is None.
+    """
+    path = Path(output_dir) / TRIM_NAME
+    if trim is None:
+        path.unlink(missing_ok=True)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(trim, f, indent=2)
+        f.write("\n")
+
+
+def read_trim(frame_dir):
+    """
+    Returns the trim sidecar of a frame folder as
+    {"box": [l, t, r, b], "offset": [x, y], "canvas": [w, h]}, or None.
+    """
+    path = Path(frame_dir) / TRIM_NAME
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def copy_trim(source_dir, destination_dir):
+    """
+    Copies the trim sidecar between frame folders, or removes a stale one from
+    destination_dir if source_dir has none.
+    """
+    path = Path(source_dir) / TRIM_NAME
+    if path.exists():
+        shutil.copyfile(path, Path(destination_dir) / TRIM_NAME)
+    else:
+        (Path(destination_dir) / TRIM_NAME).unlink(missing_ok=True)
@@ -0,0 +1,149 @@
+"""
+This module provides a persistent, content-addressed cache of background-removal masks.
+Masks are keyed by a hash of the decoded input pixels plus the model name and
+inference parameters, so renamed or duplicated frames and re-runs after
+`main.py clean` reuse earlier inference results.
+
+Entries are stored as PNG files under the cache directory. Least recently used
+entries are evicted once the cache grows beyond its size limit.
+
+Classes:
+- MaskCache: Looks up, stores and evicts cached masks and keeps hit/miss statistics.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from PIL import Image
+
+DEFAULT_CACHE_DIR = Path("cache/masks")
+DEFAULT_MAX_MB = 1024
+
+# Masks kept in memory so duplicates within a run hit before their PNG is written
+RECENT_ENTRIES = 64
+
+
+class MaskCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024**2):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(image, model_name, params=None):
+        """
+        Returns the cache key for an image's pixels under a model and its parameters.
+        """
+        digest = hashlib.sha256()
+        header = {
+            "model": model_name,
+            "params": params or {},
+            "mode": image.mode,
+            "size": image.size,
+        }
+        digest.update(json.dumps(header, sort_keys=True).encode("utf-8"))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.png"
+
+    def get(self, key):
+        """
+        Returns the cached mask for a key, or None on a miss.
+        """
+        with self._lock:
+            mask = self._recent.get(key)
+            if mask is not None:
+                self._recent.move_to_end(key)
+                self.hits += 1
+                return mask
+
+        path = self._path(key)
+        try:
+            mask = Image.open(path)
+            mask.load()
+            # Refresh the modification time, which drives LRU eviction
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return mask
+
+    def put(self, key, mask):
+        """
+        Stores a mask in memory and on disk.
+        """
+        self.remember(key, mask)
+        self.write(key, mask)
+
+    def remember(self, key, mask):
+        """
+        Makes a mask visible to get() immediately, before its PNG is written.
+        """
+        with self._lock:
+            self._recent[key] = mask
+            self._recent.move_to_end(key)
+            while len(self._recent) > RECENT_ENTRIES:
+                self._recent.popitem(last=False)
+
+    def write(self, key, mask):
+        """
+        Persists a mask to disk. Safe to call from encoder threads.
+        """
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary name first so readers never see a partial file;
+        # the name is unique across the processes of a batch run sharing the cache
+        tmp_path = path.with_name(
+            f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        mask.save(tmp_path, "PNG")
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """
+        Deletes least recently used entries until the cache fits its size limit.
+        """
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob("*/*.png"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        for _, size, path in sorted(entries):
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+            if total <= self.max_bytes:
+                break
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        rate = (self.hits / lookups * 100) if lookups else 0.0
+        return (
+            f"Mask cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate), "
+            f"{self.evictions} evicted"
+        )
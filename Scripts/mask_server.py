@@ -0,0 +1,426 @@
+"""
+This script runs a long-lived background-removal daemon (main.py serve) and
+provides the client that remove-bg and run-all use to talk to it.
+
+Starting Python, importing rembg/onnxruntime and building the ONNX session takes
+several seconds, which dominates small jobs. The daemon pays that cost once and
+keeps the session warm. Clients connect over a Unix socket and send decoded
+frames; requests arriving from several clients at once are gathered into a
+single inference batch (up to --batch-size frames, waiting at most
+--batch-wait-ms for more to arrive).
+
+When no daemon is listening, connect() returns None and the caller builds its
+own session in-process, as before.
+
+Wire format: every message is a 4-byte big-endian header length, a JSON header,
+then the number of payload bytes given in the header. Frames are sent as raw
+RGB pixels and masks come back as raw 8-bit pixels of the same size.
+
+Classes:
+- MaskClient: Sends frames to the daemon; a stand-in for a rembg session.
+- MaskServer: Accepts client connections on a Unix socket.
+
+Functions:
+- connect: Returns a MaskClient for a running daemon, or None.
+- serve: Builds the session and serves requests until stopped.
+- stop: Asks a running daemon to shut down.
+- main: Parses arguments and starts or stops the daemon.
+"""
+
+import argparse
+import json
+import queue
+import signal
+import socket
+import socketserver
+import struct
+import threading
+import time
+from pathlib import Path
+from PIL import Image
+
+DEFAULT_SOCKET = Path("cache/remove-bg.sock")
+DEFAULT_MAX_BATCH = 8
+DEFAULT_BATCH_WAIT_MS = 5
+
+_HEADER = struct.Struct("!I")
+
+
+def _send(sock, header, payload=b""):
+    data = json.dumps({**header, "payload": len(payload)}).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+    if payload:
+        sock.sendall(payload)
+
+
+def _recv(stream):
+    """
+    Reads one message from a socket file. Returns (header, payload), or None
+    when the peer closed the connection.
+    """
+    prefix = stream.read(_HEADER.size)
+    if len(prefix) < _HEADER.size:
+        return None
+    header = json.loads(stream.read(_HEADER.unpack(prefix)[0]))
+    payload = stream.read(header["payload"])
+    if len(payload) < header["payload"]:
+        raise ConnectionError("Connection closed in the middle of a message")
+    return header, payload
+
+
+class MaskClient:
+    """
+    A connection to the daemon. Has the model_name of a rembg session, and
+    predict_masks() sends a whole batch of frames in one request.
+    """
+
+    def __init__(self, sock, model_name):
+        self.sock = sock
+        self.stream = sock.makefile("rb")
+        self.model_name = model_name
+
+    def _request(self, header, payload=b""):
+        _send(self.sock, header, payload)
+        reply = _recv(self.stream)
+        if reply is None:
+            raise ConnectionError("The background-removal daemon closed the connection")
+        header, payload = reply
+        if not header["ok"]:
+            raise RuntimeError(header["error"])
+        return header, payload
+
+    def predict_masks(self, images):
+        """
+        Returns one mask per image, inferred by the daemon.
+        """
+        frames = [img.convert("RGB") for img in images]
+        _, payload = self._request(
+            {"op": "predict", "sizes": [img.size for img in frames]},
+            b"".join(img.tobytes() for img in frames),
+        )
+        masks = []
+        offset = 0
+        for img in frames:
+            end = offset + img.width * img.height
+            masks.append(Image.frombytes("L", img.size, payload[offset:end]))
+            offset = end
+        return masks
+
+    def predict(self, img):
+        # Same shape as rembg's session.predict()
+        return self.predict_masks([img])
+
+    def close(self):
+        self.stream.close()
+        self.sock.close()
+
+
+def _open_socket(socket_path):
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(socket_path))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def _served_model(socket_path):
+    """
+    Returns the model of the daemon listening on socket_path, or None if none
+    answers there.
+    """
+    sock = _open_socket(socket_path)
+    if sock is None:
+        return None
+    client = MaskClient(sock, None)
+    try:
+        header, _ = client._request({"op": "ping"})
+    except (OSError, RuntimeError, ValueError):
+        return None
+    finally:
+        client.close()
+    return header["model"]
+
+
+def connect(socket_path=DEFAULT_SOCKET, model_name="u2net"):
+    """
+    Returns a MaskClient if a daemon serving model_name is listening on
+    socket_path, otherwise None.
+    """
+    sock = _open_socket(socket_path)
+    if sock is None:
+        return None
+    client = MaskClient(sock, model_name)
+    try:
+        header, _ = client._request({"op": "ping"})
+    except (OSError, RuntimeError, ValueError):
+        client.close()
+        return None
+    if header["model"] != model_name:
+        print(
+            f"Daemon at {socket_path} serves {header['model']}, not {model_name}; "
+            "running in-process."
+        )
+        client.close()
+        return None
+    return client
+
+
+def stop(socket_path=DEFAULT_SOCKET):
+    """
+    Asks the daemon on socket_path to shut down. Returns False if none is running.
+    """
+    sock = _open_socket(socket_path)
+    if sock is None:
+        return False
+    with sock:
+        _send(sock, {"op": "shutdown"})
+        _recv(sock.makefile("rb"))
+    return True
+
+
+class _Job:
+    __slots__ = ("image", "done", "mask", "error")
+
+    def __init__(self, image):
+        self.image = image
+        self.done = threading.Event()
+        self.mask = None
+        self.error = None
+
+
+class _Batcher:
+    """
+    Runs queued frames through the session, gathering frames from all
+    connections into batches.
+    """
+
+    def __init__(self, session, max_batch, wait):
+        from light_remove_bg import supports_batching
+
+        self.session = session
+        self.max_batch = max_batch
+        self.wait = wait
+        self.batched = max_batch > 1 and supports_batching(session)
+        self.jobs = queue.Queue()
+        self.frames = 0
+        self.runs = 0
+
+    def submit(self, image):
+        job = _Job(image)
+        self.jobs.put(job)
+        return job
+
+    def _gather(self):
+        batch = [self.jobs.get()]
+        deadline = time.monotonic() + self.wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.jobs.get(timeout=remaining))
+                else:
+                    # Past the deadline, still take frames that are already queued
+                    batch.append(self.jobs.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        from light_remove_bg import predict_masks
+
+        while True:
+            batch = self._gather()
+            try:
+                masks = predict_masks(
+                    self.session, [job.image for job in batch], self.batched
+                )
+            except Exception as e:
+                masks = None
+                for job in batch:
+                    job.error = str(e)
+            for i, job in enumerate(batch):
+                if masks is not None:
+                    job.mask = masks[i]
+                job.done.set()
+            self.frames += len(batch)
+            self.runs += 1
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                message = _recv(self.rfile)
+            except (OSError, ValueError):
+                return
+            if message is None:
+                return
+            header, payload = message
+            op = header.get("op")
+            if op == "ping":
+                _send(self.request, {"ok": True, "model": self.server.model_name})
+            elif op == "predict":
+                self._predict(header["sizes"], payload)
+            elif op == "shutdown":
+                _send(self.request, {"ok": True})
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            else:
+                _send(self.request, {"ok": False, "error": f"Unknown request: {op}"})
+
+    def _predict(self, sizes, payload):
+        jobs = []
+        offset = 0
+        for width, height in sizes:
+            end = offset + width * height * 3
+            image = Image.frombytes("RGB", (width, height), payload[offset:end])
+            jobs.append(self.server.batcher.submit(image))
+            offset = end
+
+        masks = []
+        for job in jobs:
+            job.done.wait()
+            if job.error is not None:
+                _send(self.request, {"ok": False, "error": job.error})
+                return
+            masks.append(job.mask.tobytes())
+        _send(self.request, {"ok": True}, b"".join(masks))
+
+
+class MaskServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    One thread per client connection; inference happens on the batcher thread.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, batcher, model_name):
+        self.batcher = batcher
+        self.model_name = model_name
+        super().__init__(str(socket_path), _Handler)
+
+
+def serve(
+    socket_path=DEFAULT_SOCKET,
+    model_name="u2net",
+    max_batch=DEFAULT_MAX_BATCH,
+    batch_wait_ms=DEFAULT_BATCH_WAIT_MS,
+    intra_op_threads=0,
+    inter_op_threads=0,
+):
+    """
+    Builds the session and serves requests on socket_path until stopped.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        print("Unix sockets are not available on this platform.")
+        return
+    socket_path = Path(socket_path)
+    if socket_path.exists():
+        running = _served_model(socket_path)
+        if running is not None:
+            # Whatever its model, the socket belongs to a live daemon
+            print(f"A daemon serving {running} is already listening on {socket_path}")
+            if running != model_name:
+                print("Stop it first, or start this one with another --socket.")
+            return
+        # Left behind by a daemon that did not shut down cleanly
+        socket_path.unlink()
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+
+    from light_remove_bg import create_session
+
+    print(f"Loading {model_name}...")
+    session = create_session(model_name, intra_op_threads, inter_op_threads)
+    batcher = _Batcher(session, max(1, max_batch), max(0, batch_wait_ms) / 1000)
+    threading.Thread(target=batcher.run, daemon=True).start()
+
+    server = MaskServer(socket_path, batcher, model_name)
+    signal.signal(
+        signal.SIGTERM,
+        lambda *_: threading.Thread(target=server.shutdown).start(),
+    )
+    print(f"Serving {model_name} on {socket_path} (Ctrl+C or `serve --stop` to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        socket_path.unlink(missing_ok=True)
+
+    average = batcher.frames / batcher.runs if batcher.runs else 0
+    print(
+        f"Served {batcher.frames} frames in {batcher.runs} inference runs "
+        f"({average:.1f} frames per run)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep a background-removal session warm for remove-bg and run-all."
+    )
+    parser.add_argument(
+        "--socket",
+        default=str(DEFAULT_SOCKET),
+        help=f"Unix socket to listen on (default: {DEFAULT_SOCKET})",
+    )
+    parser.add_argument(
+        "--model",
+        default="u2net",
+        help="rembg model to serve; clients asking for another run in-process "
+        "(default: u2net)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_MAX_BATCH,
+        help="Most frames per inference run, gathered across clients "
+        f"(default: {DEFAULT_MAX_BATCH})",
+    )
+    parser.add_argument(
+        "--batch-wait-ms",
+        type=float,
+        default=DEFAULT_BATCH_WAIT_MS,
+        help="How long a run waits for more frames to arrive "
+        f"(default: {DEFAULT_BATCH_WAIT_MS})",
+    )
+    parser.add_argument(
+        "--intra-op-threads",
+        type=int,
+        default=0,
+        help="ONNX Runtime threads used inside an operator (0 = runtime default)",
+    )
+    parser.add_argument(
+        "--inter-op-threads",
+        type=int,
+        default=0,
+        help="ONNX Runtime threads used across independent operators (0 = runtime default)",
+    )
+    parser.add_argument(
+        "--stop", action="store_true", help="Stop the daemon listening on --socket"
+    )
+    args = parser.parse_args()
+
+    if args.stop:
+        if stop(args.socket):
+            print("Daemon stopped.")
+        else:
+            print(f"No daemon is listening on {args.socket}")
+        return
+
+    serve(
+        args.socket,
+        model_name=args.model,
+        max_batch=args.batch_size,
+        batch_wait_ms=args.batch_wait_ms,
+        intra_op_threads=args.intra_op_threads,
+        inter_op_threads=args.inter_op_threads,
+    )
+
+
+if __name__ == "__main__":
+    main()
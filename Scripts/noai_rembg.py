@@ -1,7 +1,10 @@
 """
 This script provides a GUI for color-based background removal (Chroma Key).
 It allows the user to select a color from a sample frame, adjust smoothing parameters,
-and batch process all images in the input directory.
+and batch process all images in the input directory (or every frame of an
+animated GIF/APNG/WebP file given with --input). Parameters can be saved as a
+preset and applied without the GUI (main.py remove-bg-simple --headless --preset ...).
+Frames are written in the format chosen with --format (see frame_encoder.py).
 
 Functions:
 - ChromaKeyApp: Main GUI class handling user interaction.
@@ -10,20 +13,43 @@ Functions:
 """
 
 import tkinter as tk
-from tkinter import ttk, messagebox
-from PIL import Image, ImageTk, ImageFilter
+from tkinter import filedialog, ttk, messagebox
+from PIL import Image, ImageTk
+import argparse
 import numpy as np
 from pathlib import Path
 import threading
 
+from chroma_key import (
+    ChromaKeyKernel,
+    PreviewPipeline,
+    key_image,
+    load_preset,
+    save_preset,
+)
+from frame_encoder import (
+    FrameEncoder,
+    WriteBehind,
+    add_encoder_arguments,
+    encoder_from_args,
+    first_frame_size,
+    prepare_output,
+)
+from frame_source import FrameSource, open_frame, write_timing
+from frame_trim import write_trim
+
 # Configuration
 INPUT_DIR = Path("input/raw_frames")
 OUTPUT_DIR = Path("output/no_bg_frames")
+# Slider events closer together than this are coalesced into one preview render
+PREVIEW_DEBOUNCE_MS = 15
 
 
 class ChromaKeyApp:
-    def __init__(self, root):
+    def __init__(self, root, preset=None, input_path=INPUT_DIR, encoder=None):
         self.root = root
+        self.input_path = Path(input_path)
+        self.encoder = encoder or FrameEncoder()
         self.root.title("Color Key Background Removal")
         self.root.geometry("1000x650")
 
@@ -31,6 +57,7 @@ class ChromaKeyApp:
         self.tolerance = 50
         self.edge_smooth = 1.0
         self.erosion_size = 0
+        self.kernel = ChromaKeyKernel()
 
         self.current_image = None
         self.display_image = None
@@ -38,7 +65,18 @@ class ChromaKeyApp:
         self.tk_image = None
         self.preview_mode = False
 
+        # Previews render on a background thread; only the latest request is kept
+        self.preview_pipeline = PreviewPipeline()
+        self._preview_request = None
+        self._preview_after_id = None
+        self._preview_cond = threading.Condition()
+        threading.Thread(
+            target=self._preview_worker, name="PreviewThread", daemon=True
+        ).start()
+
         self.setup_ui()
+        if preset is not None:
+            self.apply_preset(preset)
         self.load_first_image()
 
     def setup_ui(self):
@@ -74,15 +112,17 @@ class ChromaKeyApp:
         ttk.Separator(control_frame, orient=tk.HORIZONTAL).pack(fill=tk.X, pady=10)
 
         # Tolerance Slider
-        self._create_slider(
+        self.tolerance_var, self.tolerance_label = self._create_slider(
             control_frame, "Tolerance:", 0, 150, self.update_tolerance, 50
         )
 
         # Edge Smoothing Slider
-        self._create_slider(control_frame, "Edge Smooth:", 0, 10, self.update_smooth, 1)
+        self.smooth_var, self.smooth_label = self._create_slider(
+            control_frame, "Edge Smooth:", 0, 10, self.update_smooth, 1
+        )
 
         # Erosion Slider
-        self._create_slider(
+        self.erosion_var, self.erosion_label = self._create_slider(
             control_frame, "Edge Erosion:", 0, 5, self.update_erosion, 0
         )
 
@@ -99,6 +139,16 @@ class ChromaKeyApp:
         )
         self.btn_reset.pack(fill=tk.X, pady=5)
 
+        self.btn_save_preset = ttk.Button(
+            control_frame, text="Save Preset...", command=self.export_preset
+        )
+        self.btn_save_preset.pack(fill=tk.X, pady=5)
+
+        self.btn_load_preset = ttk.Button(
+            control_frame, text="Load Preset...", command=self.import_preset
+        )
+        self.btn_load_preset.pack(fill=tk.X, pady=5)
+
         ttk.Separator(control_frame, orient=tk.HORIZONTAL).pack(fill=tk.X, pady=10)
 
         self.progress_var = tk.DoubleVar()
@@ -144,32 +194,25 @@ class ChromaKeyApp:
 
         val_label = ttk.Label(frame, text=str(default))
         val_label.pack()
-        return var
+        return var, val_label
 
     def load_first_image(self):
-        extensions = {".png", ".jpg", ".jpeg", ".webp", ".bmp"}
-        if not INPUT_DIR.exists():
-            messagebox.showerror("Error", f"Input directory not found: {INPUT_DIR}")
+        if not self.input_path.exists():
+            messagebox.showerror("Error", f"Input not found: {self.input_path}")
             return
 
-        files = sorted(
-            [
-                f
-                for f in INPUT_DIR.iterdir()
-                if f.is_file() and f.suffix.lower() in extensions
-            ]
-        )
-
-        if not files:
-            messagebox.showwarning("Warning", f"No images found in {INPUT_DIR}")
+        # Only the first frame is decoded, even for animations
+        first = next(iter(FrameSource(self.input_path)), None)
+        if first is None:
+            messagebox.showwarning("Warning", f"No images found in {self.input_path}")
             return
 
-        self.image_path = files[0]
+        self.image_path = first
         self.load_image_to_canvas()
 
     def load_image_to_canvas(self):
         try:
-            img = Image.open(self.image_path)
+            img = open_frame(self.image_path)
             display_size = (800, 600)
             img.thumbnail(display_size, Image.Resampling.LANCZOS)
 
@@ -207,12 +250,64 @@ class ChromaKeyApp:
 
         if 0 <= x < img_w and 0 <= y < img_h:
             r, g, b, _ = self.current_image.getpixel((x, y))
-            self.target_color = np.array([r, g, b], dtype=np.uint8)
-            hex_color = f"#{r:02x}{g:02x}{b:02x}"
-            self.color_swatch.config(bg=hex_color)
-            self.color_label.config(text=f"R:{r} G:{g} B:{b}")
+            self.set_target_color(r, g, b)
             self.status_label.config(text="Color selected.")
 
+    def set_target_color(self, r, g, b):
+        self.target_color = np.array([r, g, b], dtype=np.uint8)
+        self.color_swatch.config(bg=f"#{r:02x}{g:02x}{b:02x}")
+        self.color_label.config(text=f"R:{r} G:{g} B:{b}")
+
+    def current_preset(self):
+        return {
+            "target_color": [int(c) for c in self.target_color],
+            "tolerance": self.tolerance,
+            "edge_smooth": self.edge_smooth,
+            "erosion_size": self.erosion_size,
+        }
+
+    def apply_preset(self, preset):
+        self.set_target_color(*preset["target_color"])
+        self.tolerance = preset["tolerance"]
+        self.edge_smooth = preset["edge_smooth"]
+        self.erosion_size = preset["erosion_size"]
+
+        # Setting the variables does not fire the slider callbacks
+        self.tolerance_var.set(self.tolerance)
+        self.tolerance_label.config(text=str(self.tolerance))
+        self.smooth_var.set(self.edge_smooth)
+        self.smooth_label.config(text=f"{self.edge_smooth:.1f}")
+        self.erosion_var.set(self.erosion_size)
+        self.erosion_label.config(text=str(self.erosion_size))
+        if self.preview_mode:
+            self.refresh_preview()
+
+    def export_preset(self):
+        path = filedialog.asksaveasfilename(
+            title="Save Preset",
+            defaultextension=".json",
+            filetypes=[("Preset", "*.json")],
+        )
+        if not path:
+            return
+        try:
+            save_preset(path, self.current_preset())
+            self.status_label.config(text=f"Preset saved: {Path(path).name}")
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to save preset: {e}")
+
+    def import_preset(self):
+        path = filedialog.askopenfilename(
+            title="Load Preset", filetypes=[("Preset", "*.json")]
+        )
+        if not path:
+            return
+        try:
+            self.apply_preset(load_preset(path))
+            self.status_label.config(text=f"Preset loaded: {Path(path).name}")
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Failed to load preset: {e}")
+
     def update_tolerance(self, value, label):
         self.tolerance = int(float(value))
         label.config(text=str(self.tolerance))
@@ -232,48 +327,63 @@ class ChromaKeyApp:
             self.refresh_preview()
 
     def refresh_preview(self):
-        if self.current_image:
-            preview_img = self.remove_background(self.current_image)
-            self.update_canvas(preview_img)
-            self.status_label.config(text="Preview updated")
-
-    def remove_background(self, img_pil):
-        # 1. Create a binary mask based on color difference
-        img_array = np.array(img_pil)
-        # Cast to float to avoid uint8 overflow
-        rgb = img_array[:, :, :3].astype(np.float32)
-        target = self.target_color.astype(np.float32)
-
-        # Calculate Euclidean distance
-        diff = np.sqrt(np.sum((rgb - target) ** 2, axis=2))
-
-        # Create mask (True where pixel is foreground/NOT target color)
-        # We want the foreground, so distance > tolerance
-        mask_array = (diff > self.tolerance).astype(np.uint8) * 255
-
-        # Convert mask to PIL Image for filtering
-        mask_img = Image.fromarray(mask_array, mode="L")
-
-        # 2. Apply Erosion (Shrink the mask to remove green halo)
-        if self.erosion_size > 0:
-            # MinFilter works as an erosion filter on light objects (white mask)
-            mask_img = mask_img.filter(ImageFilter.MinFilter(self.erosion_size * 2 + 1))
-
-        # 3. Apply Gaussian Blur (Soft Edges)
-        if self.edge_smooth > 0:
-            mask_img = mask_img.filter(
-                ImageFilter.GaussianBlur(radius=self.edge_smooth)
-            )
+        """
+        Schedules a preview render. Requests made within PREVIEW_DEBOUNCE_MS of
+        each other (e.g. while dragging a slider) collapse into one.
+        """
+        if self.current_image is None:
+            return
+        if self._preview_after_id is not None:
+            self.root.after_cancel(self._preview_after_id)
+        self._preview_after_id = self.root.after(
+            PREVIEW_DEBOUNCE_MS, self._submit_preview
+        )
 
-        # 4. Apply the modified mask to the original image's alpha channel
-        if img_pil.mode != "RGBA":
-            img_pil = img_pil.convert("RGBA")
+    def _submit_preview(self):
+        self._preview_after_id = None
+        request = (
+            self.current_image,
+            self.target_color.copy(),
+            self.tolerance,
+            self.erosion_size,
+            self.edge_smooth,
+        )
+        with self._preview_cond:
+            # Replaces any request the worker has not picked up yet
+            self._preview_request = request
+            self._preview_cond.notify()
+
+    def _preview_worker(self):
+        while True:
+            with self._preview_cond:
+                while self._preview_request is None:
+                    self._preview_cond.wait()
+                request = self._preview_request
+                self._preview_request = None
+
+            try:
+                preview = self.preview_pipeline.render(*request)
+            except Exception as e:
+                self.root.after(
+                    0,
+                    lambda msg=str(e): self.status_label.config(
+                        text=f"Preview failed: {msg}"
+                    ),
+                )
+                continue
+            self.root.after(0, self._show_preview, preview)
 
-        # Get processed PIL image
-        result = img_pil.copy()
-        result.putalpha(mask_img)
+    def _show_preview(self, preview):
+        # A render can finish after the preview was switched off
+        if not self.preview_mode:
+            return
+        self.update_canvas(preview)
+        self.status_label.config(text="Preview updated")
 
-        return result
+    def remove_background(self, img_pil, kernel=None):
+        # The batch thread passes its own kernel so it never shares buffers
+        # with the preview.
+        return key_image(img_pil, self.current_preset(), kernel or self.kernel)
 
     def toggle_preview(self):
         if self.current_image is None:
@@ -282,9 +392,8 @@ class ChromaKeyApp:
             self.reset_view()
         else:
             self.status_label.config(text="Generating preview...")
-            self.root.update()
-            self.refresh_preview()
             self.preview_mode = True
+            self.refresh_preview()
 
     def reset_view(self):
         if self.current_image:
@@ -293,8 +402,8 @@ class ChromaKeyApp:
             self.status_label.config(text="View reset")
 
     def start_batch_processing(self):
-        if not INPUT_DIR.exists():
-            messagebox.showerror("Error", "Input directory not found.")
+        if not self.input_path.exists():
+            messagebox.showerror("Error", "Input not found.")
             return
         if threading.active_count() > 1 and "BatchThread" in [
             t.name for t in threading.enumerate()
@@ -308,18 +417,12 @@ class ChromaKeyApp:
         ).start()
 
     def process_batch(self):
-        extensions = {".png", ".jpg", ".jpeg", ".webp", ".bmp"}
         try:
             OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-            files = sorted(
-                [
-                    f
-                    for f in INPUT_DIR.iterdir()
-                    if f.is_file() and f.suffix.lower() in extensions
-                ]
-            )
+            # Animation frames are decoded one at a time as the loop advances
+            source = FrameSource(self.input_path)
 
-            total = len(files)
+            total = len(source)
             if total == 0:
                 self.root.after(
                     0,
@@ -328,12 +431,25 @@ class ChromaKeyApp:
                 self.root.after(0, self.reset_ui_state)
                 return
 
-            for i, file_path in enumerate(files):
+            prepare_output(
+                self.encoder,
+                OUTPUT_DIR,
+                source.stems(),
+                lambda: first_frame_size(source, open_frame),
+            )
+            # The GUI never trims, so drop a crop left by an earlier --trim run
+            write_trim(OUTPUT_DIR, None)
+            kernel = ChromaKeyKernel()
+            # Frames are encoded in the background while the next ones are keyed
+            writer = WriteBehind()
+            for i, file_path in enumerate(source):
                 try:
-                    img = Image.open(file_path).convert("RGBA")
-                    result = self.remove_background(img)
-                    output_path = OUTPUT_DIR / f"{file_path.stem}.png"
-                    result.save(output_path, "PNG")
+                    img = open_frame(file_path).convert("RGBA")
+                    result = self.remove_background(img, kernel)
+                    output_path = self.encoder.path(OUTPUT_DIR, file_path.stem)
+                    writer.submit(
+                        file_path.name, self.encoder.save, result, output_path
+                    )
 
                     progress = ((i + 1) / total) * 100
                     self.root.after(0, lambda p=progress: self.progress_var.set(p))
@@ -345,7 +461,9 @@ class ChromaKeyApp:
                     )
                 except Exception as e:
                     print(f"Error processing {file_path.name}: {e}")
+            writer.close()
 
+            write_timing(OUTPUT_DIR, source)
             self.root.after(
                 0, lambda: self.status_label.config(text="Batch processing complete!")
             )
@@ -371,8 +489,27 @@ class ChromaKeyApp:
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Color key background removal GUI.")
+    parser.add_argument("--preset", help="Preset file to start with")
+    parser.add_argument(
+        "--input",
+        default=str(INPUT_DIR),
+        help="Folder of frames, or an animated GIF/APNG/WebP file "
+        f"(default: {INPUT_DIR})",
+    )
+    add_encoder_arguments(parser)
+    args = parser.parse_args()
+
+    preset = None
+    if args.preset:
+        try:
+            preset = load_preset(args.preset)
+        except (OSError, ValueError) as e:
+            print(f"Error loading preset: {e}")
+            return
+
     root = tk.Tk()
-    ChromaKeyApp(root)
+    ChromaKeyApp(root, preset, args.input, encoder_from_args(args))
     root.mainloop()
 
 
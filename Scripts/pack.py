@@ -4,62 +4,751 @@ It takes an output filename as an argument, creates a directory structure
 inside the archive based on that name, and compresses the contents of
 the 'output/outlined_frames' directory into 'output/package'.
 
+Frames are already deflate-compressed PNGs, so recompressing them rarely pays off.
+The compression policy is selectable:
+- store: no compression (fastest)
+- deflate: zlib deflate at a given level (the historical default)
+- lzma: LZMA members (smallest, but not every zip reader supports it)
+- auto: deflates a sample of frames first; if they do not shrink by more than a
+  threshold, everything is stored, otherwise each member is stored unless it shrinks
+Members are compressed in parallel and written to the archive in order.
+Members are always PNG files: PNG frames are stored as they are unless
+--png-level/--png-optimize ask for re-encoding, and WebP or .npy frames
+(see frame_encoder.py) and frames of a frame store (see frame_store.py) are
+encoded to PNG.
+
+Every package gets a '<name>/manifest.json' index listing, per frame, its
+dimensions, alpha bounding box, pixel hash, and the local-header offset and
+compressed size of the member holding it, so readers (see bfk_reader.py) can
+seek to any frame directly. With --dedup, frames with identical decoded pixels
+are stored once and share a member in the index. Frames extracted from an
+animation also get their duration (ms), and the manifest the loop count, from
+the timing.json sidecar (see frame_source.py). Frames cropped with --trim record
+the crop (offset and original canvas size) from the trim.json sidecar (see
+frame_trim.py), so readers can put them back in place.
+
+Reruns are incremental: a build manifest next to the package (see
+build_manifest.py) records each frame's input digest and the member it became,
+so frames that did not change since the last run are copied from the previous
+package as they are, without being read, inspected or compressed again. Atlas
+packages are always rebuilt, as a changed frame can move every sprite.
+
+With --atlas, frames are trimmed to their alpha bounding box and packed into a
+few atlas pages (see atlas.py) instead of one full-canvas PNG each; the manifest
+then lists, per frame, its page, rect on the page, trim offset and original size.
+
 Functions:
+- package_path: Resolves the archive path and internal folder name for an output filename.
+- compress_member: Compresses a single member according to a policy.
+- ReusedMember: A member of the previous package copied over unchanged.
+- inspect_frame: Returns the index fields (size, alpha bbox, pixel hash) of a frame.
+- write_package: Writes (name, data) frames into a .bfk archive; used by pack and run-all.
+- write_atlas_package: Writes (name, data) frames into a .bfk archive as atlas pages.
+- compare_policies: Reports time and compression ratio of every policy for a set of frames.
 - pack_frames: Compresses valid image files from the source directory into the target archive.
 - main: Handles command-line arguments and script execution flow.
 """
 
 import argparse
+import io
+import itertools
+import json
+import os
+import time
 import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from PIL import Image
 from tqdm import tqdm
 
+from atlas import DEFAULT_PADDING, DEFAULT_PAGE_SIZE, build_atlas
+from bfk_reader import (
+    ATLAS_MANIFEST_VERSION,
+    MANIFEST_NAME,
+    MANIFEST_VERSION,
+    BfkReader,
+    pixel_hash,
+)
+from build_manifest import BuildManifest
+from frame_encoder import (
+    FrameEncoder,
+    add_encoder_arguments,
+    encoder_from_args,
+    list_frames,
+    load_frame,
+    ordered_map,
+)
+from frame_source import read_timing
+from frame_store import StoredFrame
+from frame_trim import read_trim
+from profiling import span
 
-def pack_frames(output_filename: str):
+SOURCE_DIR = Path("output/outlined_frames")
+# Define output directory for packages
+DESTINATION_DIR = Path("output/package")
+
+POLICIES = ("store", "deflate", "lzma", "auto")
+DEFAULT_POLICY = "deflate"
+DEFAULT_LEVEL = 6
+# "auto" only keeps a compressed member if it saves more than this fraction
+DEFAULT_THRESHOLD = 0.05
+AUTO_SAMPLE_SIZE = 8
+# Build manifest of a package: output/package/<name>.build.json
+BUILD_SUFFIX = ".build.json"
+# Member fields that identify a frame's member in the build manifest
+MEMBER_FIELDS = ("crc", "compressed_size", "compress_type")
+
+
+def package_path(output_filename: str, destination_dir: Path = DESTINATION_DIR):
     """
-    Packs frames from the output directory into a .bfk zip archive.
+    Returns the archive path and the internal folder name for an output filename.
+    If the user provides "character.bfk", the internal folder is "character".
+    """
+    destination_dir.mkdir(parents=True, exist_ok=True)
+    return destination_dir / output_filename, Path(output_filename).stem
+
+
+def compress_member(
+    data: bytes, policy: str, level=DEFAULT_LEVEL, threshold=DEFAULT_THRESHOLD
+):
+    """
+    Compresses member data the way zipfile would for the chosen policy.
+
+    Returns:
+        tuple: (zip compress_type, payload bytes)
+    """
+    if policy == "store":
+        return zipfile.ZIP_STORED, data
+
+    if policy == "lzma":
+        compressor = zipfile.LZMACompressor()
+        return zipfile.ZIP_LZMA, compressor.compress(data) + compressor.flush()
+
+    # Raw deflate stream (no zlib header), as stored inside zip members
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    payload = compressor.compress(data) + compressor.flush()
+    if policy == "auto" and len(payload) > len(data) * (1 - threshold):
+        return zipfile.ZIP_STORED, data
+    return zipfile.ZIP_DEFLATED, payload
+
+
+def _auto_worth_compressing(samples, level, threshold):
+    """
+    Returns True if deflating the sample saves more than the threshold overall.
+    """
+    raw = sum(len(data) for data in samples)
+    if raw == 0:
+        return False
+    packed = sum(len(compress_member(data, "deflate", level)[1]) for data in samples)
+    return packed < raw * (1 - threshold)
+
+
+class ReusedMember:
+    """
+    A frame's member in the previous package (index into reader's frames),
+    written into the new package as it is. source is the frame's file, for the
+    member's timestamp.
+    """
+
+    __slots__ = ("reader", "index", "source")
+
+    def __init__(self, reader, index, source):
+        self.reader = reader
+        self.index = index
+        self.source = source
+
+
+def inspect_frame(data: bytes):
+    """
+    Decodes a frame and returns its index fields: dimensions, alpha bounding box
+    and a hash of the decoded pixels (frames that only differ in how they were
+    encoded hash equal).
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        digest = pixel_hash(img)
+        if img.mode in ("RGBA", "LA"):
+            bbox = img.getchannel("A").getbbox()
+        elif img.mode == "P" and "transparency" in img.info:
+            bbox = img.convert("RGBA").getchannel("A").getbbox()
+        else:
+            bbox = (0, 0, img.width, img.height)
+        return {
+            "width": img.width,
+            "height": img.height,
+            "bbox": list(bbox) if bbox else None,
+            "hash": digest,
+        }
+
+
+def _frame_bytes(data, encoder=None):
+    """
+    Returns the PNG bytes of a frame given as bytes, a file Path or a StoredFrame.
+    Files are re-encoded with encoder if one is given, or if they are not PNG files.
+    """
+    if isinstance(data, StoredFrame):
+        return (encoder or FrameEncoder()).encode(data.image())
+    if not isinstance(data, Path):
+        return data
+    if encoder is None and data.suffix.lower() == ".png":
+        return data.read_bytes()
+    with load_frame(data) as img:
+        return (encoder or FrameEncoder()).encode(img)
+
+
+def _load_member(name, data, policy, level, threshold, encoder=None):
+    """
+    Reads (if needed), inspects and compresses one member. Runs on the compression pool.
+    """
+    if isinstance(data, ReusedMember):
+        entry = data.reader.frames[data.index]
+        with span("reuse", frame=name):
+            payload = data.reader.member_payload(data.index)
+        if isinstance(data.source, StoredFrame):
+            date_time = time.localtime(data.source.path.stat().st_mtime)[:6]
+            external_attr = 0o644 << 16
+        else:
+            stat = data.source.stat()
+            date_time = time.localtime(stat.st_mtime)[:6]
+            external_attr = (stat.st_mode & 0xFFFF) << 16
+        return {
+            "name": name,
+            "file_size": entry["file_size"],
+            "crc": entry["crc"],
+            "compress_type": entry["compress_type"],
+            "payload": payload,
+            "date_time": date_time,
+            "external_attr": external_attr,
+            "info": {key: entry[key] for key in ("width", "height", "bbox", "hash")},
+        }
+    if isinstance(data, StoredFrame):
+        with span("read", frame=name):
+            date_time = time.localtime(data.path.stat().st_mtime)[:6]
+            external_attr = 0o644 << 16
+            data = _frame_bytes(data, encoder)
+    elif isinstance(data, Path):
+        with span("read", frame=name):
+            stat = data.stat()
+            date_time = time.localtime(stat.st_mtime)[:6]
+            external_attr = (stat.st_mode & 0xFFFF) << 16
+            data = _frame_bytes(data, encoder)
+    else:
+        date_time = time.localtime(time.time())[:6]
+        external_attr = 0o600 << 16
+    with span("compress", frame=name, policy=policy):
+        compress_type, payload = compress_member(data, policy, level, threshold)
+    with span("inspect", frame=name):
+        info = inspect_frame(data)
+    return {
+        "name": name,
+        "file_size": len(data),
+        "crc": zlib.crc32(data),
+        "compress_type": compress_type,
+        "payload": payload,
+        "date_time": date_time,
+        "external_attr": external_attr,
+        "info": info,
+    }
+
+
+def _write_compressed(
+    zf, arcname, file_size, crc, compress_type, payload, date_time, external_attr
+):
+    """
+    Appends an already-compressed member (of uncompressed size file_size and
+    CRC-32 crc) to an open ZipFile.
+    zipfile has no public API for this, so the member is written by _append_raw.
+
+    Returns:
+        ZipInfo: The written member, including its local-header offset.
+    """
+    zinfo = zipfile.ZipInfo(arcname, date_time)
+    zinfo.compress_type = compress_type
+    zinfo.external_attr = external_attr
+    zinfo.file_size = file_size
+    zinfo.compress_size = len(payload)
+    zinfo.CRC = crc
+    if compress_type == zipfile.ZIP_LZMA:
+        # The LZMA stream includes an end-of-stream marker
+        zinfo.flag_bits |= 0x02
+
+    _append_raw(zf, zinfo, payload)
+    return zinfo
+
+
+def _append_raw(zf, zinfo, payload):
+    """
+    Writes the local header of zinfo and its payload (already compressed) at the
+    end of a ZipFile opened with mode "w", and adds zinfo to its central directory.
+
+    This relies on zipfile internals that have no public equivalent: the open
+    file (zf.fp), the member lists (zf.filelist, zf.NameToInfo), where the central
+    directory starts (zf.start_dir) and ZipInfo.FileHeader(). They are not
+    documented, so any Python release may change them; tests/test_pack.py
+    re-opens packages with zipfile to catch that.
+    """
+    zip64 = max(zinfo.file_size, zinfo.compress_size) > zipfile.ZIP64_LIMIT
+    zinfo.header_offset = zf.fp.tell()
+    zf.fp.write(zinfo.FileHeader(zip64))
+    zf.fp.write(payload)
+    zf.filelist.append(zinfo)
+    zf.NameToInfo[zinfo.filename] = zinfo
+    zf.start_dir = zf.fp.tell()
+
+
+def write_package(
+    output_path: Path,
+    internal_folder_name: str,
+    frames,
+    policy=DEFAULT_POLICY,
+    level=DEFAULT_LEVEL,
+    threshold=DEFAULT_THRESHOLD,
+    workers=1,
+    dedup=False,
+    timing=None,
+    encoder=None,
+    trim=None,
+):
+    """
+    Writes frames into a .bfk zip archive.
 
     Args:
-        output_filename (str): The name of the output archive file (e.g., 'character.bfk').
+        output_path (Path): Path of the archive to create.
+        internal_folder_name (str): Folder the frames are stored under inside the archive.
+        frames: Iterable of (filename, data) pairs, where data is a file Path,
+            a StoredFrame, bytes, or a ReusedMember to copy unchanged.
+        policy (str): One of POLICIES.
+        level (int): Deflate level (0-9) for the "deflate" and "auto" policies.
+        threshold (float): Minimum saving for "auto" to keep a member compressed.
+        workers (int): Number of compression threads.
+        dedup (bool): Store pixel-identical frames once; their index entries then
+            point at the same member.
+        timing (dict): Animation timing ({"loop": ..., "durations": {name: ms}}).
+            Only read once all frames are written, so it may fill up while they
+            are produced.
+        encoder (FrameEncoder): Re-encodes frames given as file Paths (PNG only).
+        trim (dict): The crop applied to the frames ({"box", "offset", "canvas"}).
+
+    Returns:
+        tuple: (uncompressed bytes, stored bytes, effective policy)
     """
-    source_dir = Path("output/outlined_frames")
-    # Define output directory for packages
-    destination_dir = Path("output/package")
-    destination_dir.mkdir(parents=True, exist_ok=True)
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown compression policy: {policy}")
+
+    frames = iter(frames)
+    if policy == "auto":
+        # Test a sample first; if it barely shrinks, skip compression altogether
+        # Reused members keep the compression they were stored with
+        sample = list(itertools.islice(frames, AUTO_SAMPLE_SIZE))
+        sample_data = [
+            _frame_bytes(data, encoder)
+            for _, data in sample
+            if not isinstance(data, ReusedMember)
+        ]
+        if sample_data:
+            worth = _auto_worth_compressing(sample_data, level, threshold)
+        else:
+            # Only reused members (or none): follow how they were stored
+            worth = any(
+                data.reader.frames[data.index]["compress_type"] != zipfile.ZIP_STORED
+                for _, data in sample
+            )
+        if not worth:
+            policy = "store"
+        frames = itertools.chain(sample, frames)
+
+    raw_bytes = 0
+    stored_bytes = 0
+    # Index entry per frame, and the stored member for each pixel hash (dedup mode)
+    sequence = []
+    stored_by_hash = {}
+    items = ((name, data, policy, level, threshold, encoder) for name, data in frames)
+    with (
+        ThreadPoolExecutor(max_workers=workers) as pool,
+        zipfile.ZipFile(output_path, "w") as zf,
+    ):
+        for member in ordered_map(pool, _load_member, items, workers * 4):
+            info = member["info"]
+            raw_bytes += member["file_size"]
+
+            stored = stored_by_hash.get(info["hash"]) if dedup else None
+            if stored is None:
+                # Define path inside zip
+                arcname = f"{internal_folder_name}/{member['name']}"
+                with span("zip-write", frame=member["name"]):
+                    zinfo = _write_compressed(
+                        zf,
+                        arcname,
+                        member["file_size"],
+                        member["crc"],
+                        member["compress_type"],
+                        member["payload"],
+                        member["date_time"],
+                        member["external_attr"],
+                    )
+                stored = {
+                    "member": arcname,
+                    "offset": zinfo.header_offset,
+                    "compressed_size": zinfo.compress_size,
+                    "file_size": zinfo.file_size,
+                    "compress_type": zinfo.compress_type,
+                    "crc": zinfo.CRC,
+                }
+                stored_by_hash.setdefault(info["hash"], stored)
+                stored_bytes += zinfo.compress_size
+
+            sequence.append({"name": member["name"], **info, **stored})
 
-    output_path = destination_dir / output_filename
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "frames": sequence,
+            "unique_frames": len({frame["member"] for frame in sequence}),
+        }
+        _write_manifest(zf, internal_folder_name, manifest, timing, trim)
+        if dedup and manifest["unique_frames"] < len(sequence):
+            print(
+                f"Deduplicated {len(sequence)} frames into "
+                f"{manifest['unique_frames']} unique members"
+            )
 
-    # Determine internal folder name (strip extension)
-    # If the user provides "character.bfk", the internal folder is "character"
-    internal_folder_name = Path(output_filename).stem
+    return raw_bytes, stored_bytes, policy
+
+
+def _write_manifest(zf, internal_folder_name, manifest, timing, trim=None):
+    if timing is not None:
+        durations = timing["durations"]
+        for frame in manifest["frames"]:
+            if frame["name"] in durations:
+                frame["duration"] = durations[frame["name"]]
+        manifest["loop"] = timing["loop"]
+    if trim is not None:
+        manifest["trim"] = trim
+    zf.writestr(
+        f"{internal_folder_name}/{MANIFEST_NAME}",
+        json.dumps(manifest, separators=(",", ":")),
+        compress_type=zipfile.ZIP_DEFLATED,
+    )
+
+
+def write_atlas_package(
+    output_path: Path,
+    internal_folder_name: str,
+    frames,
+    policy=DEFAULT_POLICY,
+    level=DEFAULT_LEVEL,
+    threshold=DEFAULT_THRESHOLD,
+    workers=1,
+    timing=None,
+    encoder=None,
+    trim=None,
+    page_size=DEFAULT_PAGE_SIZE,
+    padding=DEFAULT_PADDING,
+):
+    """
+    Writes frames into a .bfk zip archive as sprite-atlas pages (see atlas.py).
+    Identical trimmed sprites are always stored once.
+
+    Args are the same as write_package's (frames may also hold decoded images
+    instead of file Paths or PNG bytes), plus:
+        page_size (int): Maximum width and height of a page.
+        padding (int): Transparent pixels between sprites.
+
+    Returns:
+        tuple: (uncompressed bytes of the frames, stored bytes, effective policy)
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown compression policy: {policy}")
+
+    raw_bytes = 0
+
+    def images():
+        nonlocal raw_bytes
+        for name, data in frames:
+            if isinstance(data, Image.Image):
+                raw_bytes += len(data.tobytes())
+                yield name, data
+                continue
+            if isinstance(data, StoredFrame):
+                # Straight from the mapped store, no PNG round-trip
+                img = data.image()
+                raw_bytes += img.width * img.height * 4
+                yield name, img
+                continue
+            data = _frame_bytes(data)
+            raw_bytes += len(data)
+            with span("decode", frame=name):
+                img = Image.open(io.BytesIO(data))
+                img.load()
+            yield name, img
+
+    # Every frame has to be known before packing, so the frames are consumed here
+    pages, table = build_atlas(images(), page_size, padding)
+    encoder = encoder or FrameEncoder()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        with span("encode", pages=len(pages)):
+            page_data = list(pool.map(encoder.encode, pages))
+        if policy == "auto" and not _auto_worth_compressing(
+            page_data[:AUTO_SAMPLE_SIZE], level, threshold
+        ):
+            policy = "store"
+
+        stored_bytes = 0
+        page_entries = []
+        items = (
+            (f"atlas_{index:03d}.png", data, policy, level, threshold)
+            for index, data in enumerate(page_data)
+        )
+        with zipfile.ZipFile(output_path, "w") as zf:
+            for member in ordered_map(pool, _load_member, items, workers * 4):
+                arcname = f"{internal_folder_name}/{member['name']}"
+                with span("zip-write", frame=member["name"]):
+                    zinfo = _write_compressed(
+                        zf,
+                        arcname,
+                        member["file_size"],
+                        member["crc"],
+                        member["compress_type"],
+                        member["payload"],
+                        member["date_time"],
+                        member["external_attr"],
+                    )
+                stored_bytes += zinfo.compress_size
+                page_entries.append(
+                    {
+                        "member": arcname,
+                        "width": member["info"]["width"],
+                        "height": member["info"]["height"],
+                        "offset": zinfo.header_offset,
+                        "compressed_size": zinfo.compress_size,
+                        "file_size": zinfo.file_size,
+                        "compress_type": zinfo.compress_type,
+                        "crc": zinfo.CRC,
+                    }
+                )
+
+            manifest = {
+                "version": ATLAS_MANIFEST_VERSION,
+                "frames": table,
+                "unique_frames": len(
+                    {(f["page"], *f["rect"]) for f in table if f["rect"] is not None}
+                ),
+                "atlas": {"padding": padding, "pages": page_entries},
+            }
+            _write_manifest(zf, internal_folder_name, manifest, timing, trim)
+
+    print(
+        f"Packed {len(table)} frames into {len(pages)} atlas page(s): "
+        + ", ".join(f"{page.width}x{page.height}" for page in pages)
+    )
+    return raw_bytes, stored_bytes, policy
+
+
+def _format_stats(policy, raw_bytes, stored_bytes, seconds):
+    ratio = (stored_bytes / raw_bytes * 100) if raw_bytes else 100.0
+    return (
+        f"{policy:<8} {seconds:>8.2f}s  {raw_bytes / 1024**2:>9.1f} MB -> "
+        f"{stored_bytes / 1024**2:>9.1f} MB  ({ratio:.1f}%)"
+    )
+
+
+def compare_policies(
+    files, level=DEFAULT_LEVEL, threshold=DEFAULT_THRESHOLD, workers=1
+):
+    """
+    Compresses the frames in memory with every policy and prints time and ratio.
+    """
+    datas = [_frame_bytes(f) for f in files]
+    raw_bytes = sum(len(data) for data in datas)
+    print(
+        f"Comparing policies on {len(files)} frames (level {level}, {workers} threads)"
+    )
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for policy in POLICIES:
+            start = time.perf_counter()
+            effective = policy
+            if policy == "auto" and not _auto_worth_compressing(
+                datas[:AUTO_SAMPLE_SIZE], level, threshold
+            ):
+                effective = "store"
+            results = pool.map(
+                lambda data: compress_member(data, effective, level, threshold), datas
+            )
+            stored_bytes = sum(len(payload) for _, payload in results)
+            elapsed = time.perf_counter() - start
+            print(_format_stats(policy, raw_bytes, stored_bytes, elapsed))
+
+
+def _open_previous(output_path):
+    """
+    Returns a BfkReader over the previous package at output_path if its members
+    can be reused (it exists and has a full frame index), otherwise None.
+    """
+    try:
+        reader = BfkReader(output_path)
+    except Exception:
+        return None
+    if reader.is_atlas or reader.manifest is None:
+        reader.close()
+        return None
+    return reader
+
+
+def _reusable(build, reader, files, digests):
+    """
+    Returns {file: ReusedMember} for the frames whose input is unchanged since
+    the previous package was built and whose member is still in it.
+    """
+    previous = {entry["name"]: index for index, entry in enumerate(reader.frames)}
+    reused = {}
+    for f in files:
+        name = f"{f.stem}.png"
+        output = build.output(name, digests[name])
+        index = previous.get(name)
+        if output is None or index is None:
+            continue
+        entry = reader.frames[index]
+        if entry["hash"] is not None and all(
+            entry.get(key) == output.get(key) for key in MEMBER_FIELDS
+        ):
+            reused[f] = ReusedMember(reader, index, f)
+    return reused
+
+
+def pack_frames(
+    output_filename: str,
+    source_dir: Path = SOURCE_DIR,
+    policy=DEFAULT_POLICY,
+    level=DEFAULT_LEVEL,
+    threshold=DEFAULT_THRESHOLD,
+    workers=1,
+    dedup=False,
+    encoder=None,
+    atlas=False,
+    page_size=DEFAULT_PAGE_SIZE,
+    padding=DEFAULT_PADDING,
+    force=False,
+):
+    """
+    Packs frames from the output directory into a .bfk zip archive.
+
+    Args:
+        output_filename (str): The name of the output archive file (e.g., 'character.bfk').
+        source_dir (Path): Directory containing the frames to pack.
+        policy (str): Compression policy, one of POLICIES.
+        level (int): Deflate level for the "deflate" and "auto" policies.
+        threshold (float): Minimum saving for "auto" to keep a member compressed.
+        workers (int): Number of compression threads.
+        dedup (bool): Store pixel-identical frames only once.
+        encoder (FrameEncoder): Re-encodes every frame (PNG only); by default
+            PNG frames are stored as they are.
+        atlas (bool): Store trimmed frames on atlas pages (see write_atlas_package).
+        page_size (int): Maximum atlas page width and height.
+        padding (int): Transparent pixels between sprites on atlas pages.
+        force (bool): Compress every frame again instead of reusing the members
+            of unchanged frames from the previous package.
+    """
+    output_path, internal_folder_name = package_path(output_filename)
 
     if not source_dir.exists():
         print(f"Error: Source directory '{source_dir}' does not exist.")
         return
 
-    # Get all PNG files
-    files = sorted(
-        [f for f in source_dir.iterdir() if f.is_file() and f.suffix.lower() == ".png"]
-    )
+    # PNG, WebP and .npy frames
+    files = list_frames(source_dir)
 
     if not files:
-        print(f"No PNG files found in '{source_dir}'.")
+        print(f"No frames found in '{source_dir}'.")
         return
 
     print(f"Packing {len(files)} frames into '{output_path}'...")
     print(f"Internal directory structure: '{internal_folder_name}/'")
 
+    start = time.perf_counter()
+    build = None
+    reader = None
+    reused = {}
+    if not atlas:
+        build = BuildManifest(
+            output_path.with_name(internal_folder_name + BUILD_SUFFIX),
+            {
+                "policy": policy,
+                "level": level,
+                "threshold": threshold,
+                "encoder": (
+                    None
+                    if encoder is None
+                    else [encoder.format, encoder.compress_level, encoder.optimize]
+                ),
+            },
+        )
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            digests = dict(
+                zip((f"{f.stem}.png" for f in files), pool.map(build.digest, files))
+            )
+        reader = None if force else _open_previous(output_path)
+        if reader is not None:
+            reused = _reusable(build, reader, files, digests)
+            if reused:
+                print(f"Reusing {len(reused)} unchanged members")
+
+    # Written next to the previous package, whose members may be copied from
+    partial_path = output_path.with_name(output_path.name + ".tmp")
     try:
-        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zf:
-            for file_path in tqdm(files, desc="Archiving"):
-                # Define path inside zip
-                arcname = f"{internal_folder_name}/{file_path.name}"
-                zf.write(file_path, arcname=arcname)
+        frames = (
+            (f"{f.stem}.png", reused.get(f, f)) for f in tqdm(files, desc="Archiving")
+        )
+        if atlas:
+            raw_bytes, stored_bytes, effective = write_atlas_package(
+                partial_path,
+                internal_folder_name,
+                frames,
+                policy=policy,
+                level=level,
+                threshold=threshold,
+                workers=workers,
+                timing=read_timing(source_dir),
+                encoder=encoder,
+                trim=read_trim(source_dir),
+                page_size=page_size,
+                padding=padding,
+            )
+        else:
+            raw_bytes, stored_bytes, effective = write_package(
+                partial_path,
+                internal_folder_name,
+                frames,
+                policy=policy,
+                level=level,
+                threshold=threshold,
+                workers=workers,
+                dedup=dedup,
+                timing=read_timing(source_dir),
+                encoder=encoder,
+                trim=read_trim(source_dir),
+            )
+        if reader is not None:
+            reader.close()
+            reader = None
+        os.replace(partial_path, output_path)
+        elapsed = time.perf_counter() - start
+
+        if build is not None:
+            with BfkReader(output_path) as written:
+                for entry in written.frames:
+                    member = {key: entry[key] for key in MEMBER_FIELDS}
+                    build.record(entry["name"], digests[entry["name"]], member)
+            build.save()
 
-        print(f"\nSuccess! Archive created at: {output_path.absolute()}")
+        label = policy if effective == policy else f"{policy} ({effective})"
+        print(f"\n{_format_stats(label, raw_bytes, stored_bytes, elapsed)}")
+        print(f"Success! Archive created at: {output_path.absolute()}")
 
     except Exception as e:
         print(f"\nError creating archive: {e}")
+    finally:
+        if reader is not None:
+            reader.close()
+        partial_path.unlink(missing_ok=True)
 
 
 def main():
@@ -67,9 +756,104 @@ def main():
         description="Pack outlined frames into a .bfk archive in output/package."
     )
     parser.add_argument("output", help="Output filename (e.g., character.bfk)")
+    parser.add_argument(
+        "--compression",
+        choices=POLICIES,
+        default=DEFAULT_POLICY,
+        help=f"Compression policy (default: {DEFAULT_POLICY})",
+    )
+    parser.add_argument(
+        "--level",
+        type=int,
+        default=DEFAULT_LEVEL,
+        choices=range(0, 10),
+        metavar="0-9",
+        help=f"Deflate level (default: {DEFAULT_LEVEL})",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Minimum saving (fraction) for 'auto' to keep a member compressed "
+        f"(default: {DEFAULT_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Compression threads (0 = one per CPU core, default: 0)",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Store pixel-identical frames only once",
+    )
+    parser.add_argument(
+        "--atlas",
+        action="store_true",
+        help="Trim frames and pack them into sprite-atlas pages",
+    )
+    parser.add_argument(
+        "--atlas-size",
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help=f"Maximum atlas page width and height (default: {DEFAULT_PAGE_SIZE})",
+    )
+    parser.add_argument(
+        "--atlas-padding",
+        type=int,
+        default=DEFAULT_PADDING,
+        help=f"Transparent pixels between sprites (default: {DEFAULT_PADDING})",
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Report time and ratio of every policy instead of writing an archive",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Compress every frame again instead of reusing unchanged members",
+    )
+    parser.add_argument(
+        "--source",
+        default=str(SOURCE_DIR),
+        help="Folder of frames to pack, e.g. an outline variant's "
+        f"(default: {SOURCE_DIR})",
+    )
 
+    add_encoder_arguments(parser, formats=("png",), default_level=None)
     args = parser.parse_args()
-    pack_frames(args.output)
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+
+    source_dir = Path(args.source)
+    if args.compare:
+        files = list_frames(source_dir)
+        if not files:
+            print(f"No frames found in '{source_dir}'.")
+            return
+        compare_policies(files, args.level, args.threshold, workers)
+        return
+
+    pack_frames(
+        args.output,
+        source_dir=source_dir,
+        policy=args.compression,
+        level=args.level,
+        threshold=args.threshold,
+        workers=workers,
+        dedup=args.dedup,
+        atlas=args.atlas,
+        page_size=max(1, args.atlas_size),
+        padding=max(0, args.atlas_padding),
+        force=args.force,
+        # PNG frames are only re-encoded when asked to
+        encoder=(
+            encoder_from_args(args)
+            if args.png_level is not None or args.png_optimize
+            else None
+        ),
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,270 @@
+"""
+This module instruments the pipeline's hot paths (decode, inference, outline,
+encode, zip writes) when profiling is enabled with main.py --profile.
+
+Profiling is switched on through environment variables, so it reaches every
+script main.py launches and their worker processes:
+- BOCCHO_PROFILE: directory the reports are written to
+- BOCCHO_PROFILE_CPROFILE: if set, the script's main thread also runs under cProfile
+
+When the profiled script exits it writes '<script>-<timestamp>.trace.json'
+(Chrome trace format, open it in Perfetto or chrome://tracing), prints a table
+of time per stage and one of the slowest frames (time per stage for each), writes
+the per-frame table for every frame to '<script>-<timestamp>.frames.csv', and
+with cProfile writes '<script>-<timestamp>.prof'.
+When profiling is off, span() costs a single function call.
+
+Functions:
+- enabled: Returns True if profiling is on in this process.
+- span: Context manager that records a named stage as a trace event.
+- traced: Wraps a worker-process job so it returns its spans along with its result.
+- merge: Unwraps a traced job's result and keeps its spans.
+- summary: Returns the stage table for the spans recorded so far.
+- frame_times: Returns the time per stage of every frame.
+- frame_summary: Returns the per-frame table of the slowest frames.
+- write_report: Writes the trace (and cProfile dump) and prints the summary.
+"""
+
+import atexit
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+PROFILE_ENV = "BOCCHO_PROFILE"
+CPROFILE_ENV = "BOCCHO_PROFILE_CPROFILE"
+
+_output_dir = os.environ.get(PROFILE_ENV)
+_events = []
+_null_span = contextlib.nullcontext()
+_profiler = None
+# Frames listed in the printed per-frame table (the CSV has all of them)
+FRAME_ROWS = 10
+
+
+def enabled():
+    return _output_dir is not None
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        event = {
+            "name": self.name,
+            "ph": "X",
+            "ts": self.start / 1000,
+            "dur": (end - self.start) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_native_id(),
+        }
+        if self.args:
+            event["args"] = self.args
+        # list.append is atomic, so threads can record without a lock
+        _events.append(event)
+
+
+def span(name, **args):
+    """
+    Records the enclosed block as a trace event named after the stage
+    (e.g. "decode", "inference", "outline", "encode", "zip-write").
+    Keyword arguments (e.g. frame="f001.png") are shown with the event.
+    """
+    if _output_dir is None:
+        return _null_span
+    return _Span(name, args)
+
+
+def _drain():
+    # A forked worker inherits the parent's events; only return its own
+    pid = os.getpid()
+    events = [event for event in _events if event["pid"] == pid]
+    _events.clear()
+    return events
+
+
+class _Traced:
+    """
+    Picklable wrapper returning (result, spans) from a worker-process job.
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __call__(self, *args, **kwargs):
+        result = self.fn(*args, **kwargs)
+        return result, _drain()
+
+
+def traced(fn):
+    """
+    Wraps a job submitted to a process pool so that its spans travel back with
+    its result. Pass every result through merge(). Returns fn itself when
+    profiling is off.
+    """
+    return _Traced(fn) if _output_dir is not None else fn
+
+
+def merge(result):
+    """
+    Returns the job result of a traced() call and keeps the worker's spans.
+    """
+    if _output_dir is None:
+        return result
+    result, events = result
+    _events.extend(events)
+    return result
+
+
+def summary(events=None):
+    """
+    Returns a table of the recorded stages: calls, total time, share of the
+    run's wall time, and mean and max time per call (usually per frame).
+    """
+    events = _events if events is None else events
+    spans = [event for event in events if event["ph"] == "X"]
+    if not spans:
+        return "No profiled stages were recorded."
+
+    wall = max(e["ts"] + e["dur"] for e in spans) - min(e["ts"] for e in spans)
+    stages = {}
+    for event in spans:
+        stages.setdefault(event["name"], []).append(event["dur"])
+
+    lines = [
+        f"{'stage':<16}{'calls':>8}{'total ms':>12}{'% wall':>8}"
+        f"{'mean ms':>10}{'max ms':>10}"
+    ]
+    for name, durations in sorted(stages.items(), key=lambda item: -sum(item[1])):
+        total = sum(durations)
+        lines.append(
+            f"{name:<16}{len(durations):>8}{total / 1000:>12.1f}"
+            f"{total / wall * 100 if wall else 0:>7.0f}%"
+            f"{total / len(durations) / 1000:>10.2f}{max(durations) / 1000:>10.2f}"
+        )
+    lines.append(f"Wall time {wall / 1000:.1f} ms; stages overlap across threads.")
+    return "\n".join(lines)
+
+
+def frame_times(events=None):
+    """
+    Returns the stages that ran per frame (spans recorded with frame=...), by
+    total time, and {frame: {stage: ms}} in the order frames were first seen.
+    """
+    events = _events if events is None else events
+    frames = {}
+    totals = {}
+    for event in events:
+        frame = event.get("args", {}).get("frame")
+        if event["ph"] != "X" or frame is None:
+            continue
+        stages = frames.setdefault(frame, {})
+        stages[event["name"]] = stages.get(event["name"], 0) + event["dur"] / 1000
+        totals[event["name"]] = totals.get(event["name"], 0) + event["dur"]
+    stages = sorted(totals, key=lambda name: -totals[name])
+    return stages, frames
+
+
+def frame_summary(events=None, limit=FRAME_ROWS):
+    """
+    Returns a table of the `limit` slowest frames with their time per stage
+    (ms), or None if no stage was recorded per frame.
+    """
+    stages, frames = frame_times(events)
+    if not frames:
+        return None
+    slowest = sorted(frames.items(), key=lambda item: -sum(item[1].values()))
+    width = max(len("frame"), *(len(frame) for frame, _ in slowest[:limit])) + 2
+    lines = [f"{'frame':<{width}}" + "".join(f"{name:>12}" for name in stages)]
+    for frame, times in slowest[:limit]:
+        lines.append(
+            f"{frame:<{width}}"
+            + "".join(f"{times.get(name, 0):>12.2f}" for name in stages)
+        )
+    lines.append(
+        f"Slowest {min(limit, len(frames))} of {len(frames)} frames, ms per stage "
+        "(stages may nest, e.g. encode inside read)."
+    )
+    return "\n".join(lines)
+
+
+def _write_frame_csv(path, events=None):
+    stages, frames = frame_times(events)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["frame", *stages])
+        for frame, times in frames.items():
+            writer.writerow([frame, *(f"{times.get(name, 0):.3f}" for name in stages)])
+
+
+def write_report():
+    """
+    Writes the trace file (and cProfile dump) and prints the stage summary.
+    """
+    if _output_dir is None:
+        return
+    if _profiler is not None:
+        _profiler.disable()
+
+    output_dir = Path(_output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    script = Path(sys.argv[0]).stem or "python"
+    stem = f"{script}-{time.strftime('%Y%m%d-%H%M%S')}"
+
+    pids = sorted({event["pid"] for event in _events})
+    metadata = [
+        {
+            "name": "process_name",
+            "ph": "M",
+            "pid": pid,
+            "args": {"name": script if pid == os.getpid() else f"{script} worker"},
+        }
+        for pid in pids
+    ]
+    trace_path = output_dir / f"{stem}.trace.json"
+    with open(trace_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"traceEvents": metadata + _events, "displayTimeUnit": "ms"},
+            f,
+            separators=(",", ":"),
+        )
+
+    print(f"\nProfile ({script}):")
+    print(summary())
+    per_frame = frame_summary()
+    if per_frame is not None:
+        print(f"\n{per_frame}")
+        frames_path = output_dir / f"{stem}.frames.csv"
+        _write_frame_csv(frames_path)
+        print(f"Per-frame times written to {frames_path}")
+    print(f"Trace written to {trace_path}")
+
+    if _profiler is not None:
+        prof_path = output_dir / f"{stem}.prof"
+        _profiler.dump_stats(prof_path)
+        print(f"cProfile stats written to {prof_path}")
+
+
+# The profiled script's own process reports at exit; worker processes hand
+# their spans back through traced()/merge() instead.
+if _output_dir is not None and multiprocessing.parent_process() is None:
+    if os.environ.get(CPROFILE_ENV):
+        import cProfile
+
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    atexit.register(write_report)
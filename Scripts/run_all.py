@@ -0,0 +1,463 @@
+"""
+This script runs the whole pipeline in one process: background removal,
+outlining and packing. Frames stream from input/raw_frames (or an animated
+GIF/APNG/WebP file, whose frame timing goes into the manifest) through rembg,
+add_outline and the .bfk zip writer without intermediate PNG files, which
+saves two encode/decode round-trips per frame compared to running
+remove-bg, apply-outline and pack separately. With --trim, frames are cropped to
+the union of their foreground boxes before inference (see frame_trim.py).
+The model and inference size are chosen as in remove-bg (--model, --max-size).
+Frames that already have transparency can skip background removal
+(--no-remove-bg), and an outline width of 0 packs them without an outline;
+batch.py runs many such pipelines at once.
+
+Functions:
+- finish_frame: Cuts out, outlines and PNG-encodes a single frame in memory.
+  In atlas mode (--atlas) frames are packed into atlas pages instead (see atlas.py).
+- run_all: Streams every raw frame through the pipeline into a .bfk archive.
+  Returns the archive's path, or None if it could not be written.
+- main: Handles command-line arguments and script execution flow.
+"""
+
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from apply_outline import (
+    DEFAULT_OUTLINE_COLOR,
+    DEFAULT_OUTLINE_WIDTH,
+    ENGINES,
+    add_outline,
+)
+from atlas import DEFAULT_PADDING, DEFAULT_PAGE_SIZE
+from frame_encoder import FrameEncoder, add_encoder_arguments, encoder_from_args
+from frame_source import FrameSource
+from frame_trim import (
+    DEFAULT_TOLERANCE,
+    describe,
+    union_bbox,
+    write_trim,
+)
+from light_remove_bg import (
+    DEFAULT_MODEL,
+    EXTENSIONS,
+    MODELS,
+    QUANTIZED_DIR,
+    cutout,
+    decode_frame,
+    iter_masks,
+    open_session,
+    select_model,
+)
+from mask_cache import DEFAULT_CACHE_DIR, MaskCache
+from mask_server import DEFAULT_SOCKET
+from profiling import span
+from pack import (
+    DEFAULT_POLICY,
+    POLICIES,
+    package_path,
+    write_atlas_package,
+    write_package,
+)
+
+INPUT_DIR = Path("input/raw_frames")
+NO_BG_DIR = Path("output/no_bg_frames")
+OUTLINED_DIR = Path("output/outlined_frames")
+
+
+def finish_frame(
+    file_path,
+    img,
+    mask,
+    outline_width,
+    outline_color,
+    engine,
+    dump_intermediates,
+    encoder,
+    atlas=False,
+):
+    """
+    Returns the outlined frame as (filename, png_bytes), or None if it failed.
+    With atlas, the outlined image is returned instead of PNG bytes.
+    With dump_intermediates, the cutout and outlined frames are also written
+    to the usual output directories for debugging.
+    """
+    name = f"{file_path.stem}.png"
+    try:
+        if mask is None:
+            # Background removal was skipped
+            no_bg = img if img.mode == "RGBA" else img.convert("RGBA")
+        else:
+            with span("cutout", frame=name):
+                no_bg = cutout(img, mask)
+        if dump_intermediates:
+            encoder.save(no_bg, NO_BG_DIR / name)
+
+        if outline_width > 0:
+            with span("outline", frame=name):
+                outlined = add_outline(no_bg, outline_width, outline_color, engine)
+        else:
+            outlined = no_bg
+        if atlas and not dump_intermediates:
+            return name, outlined
+        with span("encode", frame=name):
+            data = encoder.encode(outlined)
+        if dump_intermediates:
+            (OUTLINED_DIR / name).write_bytes(data)
+
+    except Exception as e:
+        print(f"Error processing {file_path.name}: {e}")
+        return None
+
+    return name, outlined if atlas else data
+
+
+def _iter_frames(items, box=None, prefetch=8, decode_workers=2):
+    """
+    Decodes (index, file_path) items without inferring masks, yielding
+    (index, file_path, image, None) in input order like iter_masks.
+    Frames that fail are reported and skipped.
+    """
+
+    def collect(entry):
+        (i, file_path), future = entry
+        try:
+            img, _ = future.result()
+        except Exception as e:
+            print(f"Error processing {file_path.name}: {e}")
+            return None
+        return i, file_path, img, None
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=decode_workers) as decoder:
+        for item in items:
+            pending.append((item, decoder.submit(decode_frame, item[1], None, box)))
+            if len(pending) > prefetch:
+                frame = collect(pending.popleft())
+                if frame is not None:
+                    yield frame
+        while pending:
+            frame = collect(pending.popleft())
+            if frame is not None:
+                yield frame
+
+
+def run_all(
+    output_filename,
+    input_path=INPUT_DIR,
+    outline_width=DEFAULT_OUTLINE_WIDTH,
+    outline_color=DEFAULT_OUTLINE_COLOR,
+    engine="filter",
+    workers=1,
+    batch_size=4,
+    cache=None,
+    dump_intermediates=False,
+    compression=DEFAULT_POLICY,
+    dedup=False,
+    socket_path=DEFAULT_SOCKET,
+    encoder=None,
+    atlas=False,
+    atlas_size=DEFAULT_PAGE_SIZE,
+    atlas_padding=DEFAULT_PADDING,
+    model_name=DEFAULT_MODEL,
+    model_path=None,
+    max_size=None,
+    trim=False,
+    trim_padding=None,
+    trim_tolerance=DEFAULT_TOLERANCE,
+    remove_bg=True,
+):
+    source = FrameSource(input_path, EXTENSIONS)
+    if not len(source):
+        print(f"No valid image files found in {input_path}")
+        return None
+
+    if dump_intermediates:
+        NO_BG_DIR.mkdir(parents=True, exist_ok=True)
+        OUTLINED_DIR.mkdir(parents=True, exist_ok=True)
+
+    output_path, internal_folder_name = package_path(output_filename)
+    # Package members are always PNG
+    if encoder is None:
+        encoder = FrameEncoder()
+    print(f"Processing {len(source)} frames into '{output_path}'...")
+
+    crop = None
+    if trim:
+        # A streaming pre-pass over the frames, before any inference
+        # The outline is drawn after the crop, so by default leave room for it
+        padding = outline_width if trim_padding is None else max(0, trim_padding)
+        crop = union_bbox(
+            source,
+            padding,
+            trim_tolerance,
+            opener=lambda frame: decode_frame(frame)[0],
+            workers=min(4, workers),
+        )
+        print(describe(crop) if crop else "Nothing to trim.")
+    if dump_intermediates:
+        write_trim(NO_BG_DIR, crop)
+        write_trim(OUTLINED_DIR, crop)
+
+    items = enumerate(source, 1)
+    if remove_bg:
+        # Uses the `main.py serve` daemon when one is running
+        session = open_session(socket_path, model_name, model_path=model_path)
+        masks = iter_masks(
+            items,
+            session,
+            len(source),
+            batch_size=batch_size,
+            cache=cache,
+            box=crop["box"] if crop else None,
+            max_size=max_size,
+        )
+    else:
+        masks = _iter_frames(items, box=crop["box"] if crop else None)
+
+    # Outlining and encoding overlap with inference on a thread pool; results are
+    # consumed in submission order so the archive keeps the frame order.
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+
+        def frames():
+            for _, file_path, img, mask in masks:
+                pending.append(
+                    pool.submit(
+                        finish_frame,
+                        file_path,
+                        img,
+                        mask,
+                        outline_width,
+                        outline_color,
+                        engine,
+                        dump_intermediates,
+                        encoder,
+                        atlas,
+                    )
+                )
+                while len(pending) > workers * 2:
+                    frame = pending.popleft().result()
+                    if frame is not None:
+                        yield frame
+            while pending:
+                frame = pending.popleft().result()
+                if frame is not None:
+                    yield frame
+
+        # Filled in while the animation is read, before the manifest is written
+        timing = source.timing if source.is_animation else None
+        # Written beside the package and moved into place once complete, so a
+        # failed run never leaves a truncated package under the output name
+        partial_path = output_path.with_name(output_path.name + ".tmp")
+        try:
+            if atlas:
+                write_atlas_package(
+                    partial_path,
+                    internal_folder_name,
+                    frames(),
+                    policy=compression,
+                    workers=workers,
+                    timing=timing,
+                    encoder=encoder,
+                    trim=crop,
+                    page_size=atlas_size,
+                    padding=atlas_padding,
+                )
+            else:
+                write_package(
+                    partial_path,
+                    internal_folder_name,
+                    frames(),
+                    policy=compression,
+                    workers=workers,
+                    dedup=dedup,
+                    timing=timing,
+                    trim=crop,
+                )
+            os.replace(partial_path, output_path)
+        except Exception as e:
+            print(f"\nError creating archive: {e}")
+            return None
+        finally:
+            partial_path.unlink(missing_ok=True)
+
+    if cache is not None and remove_bg:
+        cache.evict()
+        print(cache.summary())
+    print(f"\nSuccess! Archive created at: {output_path.absolute()}")
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Remove backgrounds, outline and pack input/raw_frames in one pass."
+    )
+    parser.add_argument("output", help="Output filename (e.g., character.bfk)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Threads for outlining and encoding (0 = one per CPU core, default: 0)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="filter",
+        help="Outline engine (default: filter)",
+    )
+    parser.add_argument(
+        "--outline-width",
+        type=int,
+        default=DEFAULT_OUTLINE_WIDTH,
+        help=f"Outline width in pixels, 0 for none (default: {DEFAULT_OUTLINE_WIDTH})",
+    )
+    parser.add_argument(
+        "--no-remove-bg",
+        action="store_true",
+        help="Use the frames' own transparency instead of removing the background",
+    )
+    parser.add_argument(
+        "--model",
+        choices=MODELS,
+        default=DEFAULT_MODEL,
+        help=f"rembg model; u2netp and silueta are much faster (default: {DEFAULT_MODEL})",
+    )
+    parser.add_argument(
+        "--model-path",
+        help="Local ONNX file to load instead of the downloaded model, "
+        "with --model's processing",
+    )
+    parser.add_argument(
+        "--no-int8",
+        action="store_true",
+        help=f"Ignore int8-quantized exports in {QUANTIZED_DIR}/ ('<model>.int8.onnx')",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=int,
+        default=0,
+        help="Shrink frames whose longest side is larger for inference and refine "
+        "the masks back to full size (0 = full resolution, default: 0)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=4,
+        help="Frames per inference run, when the model supports batching (default: 4)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=str(DEFAULT_CACHE_DIR),
+        help=f"Directory of the persistent mask cache (default: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Disable the persistent mask cache"
+    )
+    parser.add_argument(
+        "--compression",
+        choices=POLICIES,
+        default=DEFAULT_POLICY,
+        help=f"Compression policy for archive members (default: {DEFAULT_POLICY})",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Store pixel-identical frames only once",
+    )
+    parser.add_argument(
+        "--input",
+        default=str(INPUT_DIR),
+        help="Folder of frames, or an animated GIF/APNG/WebP file "
+        f"(default: {INPUT_DIR})",
+    )
+    parser.add_argument(
+        "--dump-intermediates",
+        action="store_true",
+        help="Also write frames to output/no_bg_frames and output/outlined_frames",
+    )
+    parser.add_argument(
+        "--atlas",
+        action="store_true",
+        help="Trim frames and pack them into sprite-atlas pages",
+    )
+    parser.add_argument(
+        "--atlas-size",
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help=f"Maximum atlas page width and height (default: {DEFAULT_PAGE_SIZE})",
+    )
+    parser.add_argument(
+        "--atlas-padding",
+        type=int,
+        default=DEFAULT_PADDING,
+        help=f"Transparent pixels between sprites (default: {DEFAULT_PADDING})",
+    )
+    parser.add_argument(
+        "--socket",
+        default=str(DEFAULT_SOCKET),
+        help=f"Socket of the `main.py serve` daemon (default: {DEFAULT_SOCKET})",
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Always run inference in-process, even if a daemon is running",
+    )
+    parser.add_argument(
+        "--trim",
+        action="store_true",
+        help="Crop all frames to the union of their foreground boxes",
+    )
+    parser.add_argument(
+        "--trim-padding",
+        type=int,
+        default=None,
+        help="Margin kept around the union box; keep it at least the outline width "
+        "(default: the outline width)",
+    )
+    parser.add_argument(
+        "--trim-tolerance",
+        type=int,
+        default=DEFAULT_TOLERANCE,
+        help="Color difference from the corners that counts as foreground in "
+        f"opaque frames (default: {DEFAULT_TOLERANCE})",
+    )
+    add_encoder_arguments(parser, formats=("png",))
+    args = parser.parse_args()
+
+    input_path = Path(args.input)
+    if not input_path.exists():
+        print(f"Input not found: {input_path}")
+        return
+
+    cache = None if args.no_cache else MaskCache(args.cache_dir)
+    run_all(
+        args.output,
+        input_path=input_path,
+        outline_width=max(0, args.outline_width),
+        engine=args.engine,
+        workers=args.workers if args.workers > 0 else (os.cpu_count() or 1),
+        batch_size=max(1, args.batch_size),
+        cache=cache,
+        dump_intermediates=args.dump_intermediates,
+        compression=args.compression,
+        dedup=args.dedup,
+        socket_path=None if args.no_daemon else args.socket,
+        encoder=encoder_from_args(args),
+        atlas=args.atlas,
+        atlas_size=max(1, args.atlas_size),
+        atlas_padding=max(0, args.atlas_padding),
+        model_name=args.model,
+        model_path=select_model(args.model, args.model_path, not args.no_int8),
+        max_size=max(0, args.max_size) or None,
+        trim=args.trim,
+        trim_padding=args.trim_padding,
+        trim_tolerance=args.trim_tolerance,
+        remove_bg=not args.no_remove_bg,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+This module decides when a frame of a video-derived sequence can reuse the mask
+of an earlier frame instead of running background-removal inference.
+
+Each frame is compared tile by tile with the last inferred frame (the keyframe).
+Comparing with the keyframe rather than the immediately previous frame keeps
+slow drifts from accumulating across a run of reused masks. A frame reuses the
+keyframe's mask when no tile changed, or when every changed tile lies inside
+the subject (the keyframe mask is opaque there and in all neighbouring tiles),
+e.g. a talking head whose mouth moves while its silhouette stays put.
+
+Classes:
+- TemporalGate: Tracks the keyframe and classifies incoming frames.
+"""
+
+import numpy as np
+
+DEFAULT_TILE_SIZE = 32
+# Mean absolute difference (0-255, largest channel) above which a tile has changed
+DEFAULT_THRESHOLD = 3.0
+# Mask values at or above this count as opaque when looking for interior tiles
+OPAQUE_LEVEL = 250
+
+# Verdicts of TemporalGate.check()
+INFER = "infer"
+REUSE = "reuse"
+NEEDS_MASK = "needs-mask"
+
+
+def _tile_reduce(ufunc, array, tile_size):
+    """
+    Reduces a 2D array over square tiles (edge tiles may be smaller).
+    """
+    rows = np.arange(0, array.shape[0], tile_size)
+    cols = np.arange(0, array.shape[1], tile_size)
+    return ufunc.reduceat(ufunc.reduceat(array, rows, axis=0), cols, axis=1)
+
+
+class TemporalGate:
+    """
+    Classifies frames as needing inference or reusing the keyframe's mask.
+
+    Usage:
+        verdict = gate.check(img)
+        if verdict == INFER:
+            gate.set_keyframe(img)           # then, once inferred:
+            gate.set_mask(mask)
+    """
+
+    def __init__(self, tile_size=DEFAULT_TILE_SIZE, threshold=DEFAULT_THRESHOLD):
+        self.tile_size = tile_size
+        self.threshold = threshold
+        self.reused_unchanged = 0
+        self.reused_interior = 0
+        self.inferred = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the keyframe, so the next frame is inferred.
+        """
+        self._pixels = None
+        self._interior = None
+        self._last = None
+        self.mask = None
+
+    def _changed_tiles(self, pixels):
+        diff = np.abs(pixels - self._pixels).max(axis=2).astype(np.uint32)
+        sums = _tile_reduce(np.add, diff, self.tile_size)
+        h, w = diff.shape
+        tile_h = np.minimum(self.tile_size, h - np.arange(0, h, self.tile_size))
+        tile_w = np.minimum(self.tile_size, w - np.arange(0, w, self.tile_size))
+        return sums > self.threshold * np.outer(tile_h, tile_w)
+
+    def check(self, img):
+        """
+        Returns REUSE when the frame can use the keyframe's mask, INFER when it
+        needs inference, or NEEDS_MASK when the frame changed and the keyframe's
+        mask is not known yet (call again after set_mask()).
+        """
+        if self._pixels is None or img.size != (
+            self._pixels.shape[1],
+            self._pixels.shape[0],
+        ):
+            return INFER
+
+        changed = self._changed_tiles(self._frame_pixels(img))
+        if not changed.any():
+            self.reused_unchanged += 1
+            return REUSE
+        if self.mask is None:
+            return NEEDS_MASK
+        if not (changed & ~self._interior).any():
+            self.reused_interior += 1
+            return REUSE
+        return INFER
+
+    def _frame_pixels(self, img):
+        # check() and set_keyframe() are usually called with the same frame
+        if self._last is None or self._last[0] is not img:
+            self._last = (img, np.asarray(img.convert("RGB"), dtype=np.int16))
+        return self._last[1]
+
+    def set_keyframe(self, img, mask=None):
+        """
+        Makes img the frame later frames are compared with. Its mask can be
+        given now or later through set_mask().
+        """
+        self.inferred += mask is None
+        self._pixels = self._frame_pixels(img)
+        self.set_mask(mask)
+
+    def set_mask(self, mask):
+        """
+        Records the keyframe's mask and the tiles that are safely inside the subject.
+        """
+        self.mask = mask
+        if mask is None:
+            self._interior = None
+            return
+
+        opaque = _tile_reduce(np.minimum, np.asarray(mask), self.tile_size)
+        opaque = opaque >= OPAQUE_LEVEL
+        # A tile is interior only if its 8 neighbours are opaque too, so an edge
+        # cannot move into it from a changed tile next door
+        padded = np.pad(opaque, 1, constant_values=False)
+        h, w = opaque.shape
+        interior = np.ones_like(opaque)
+        for dy in range(3):
+            for dx in range(3):
+                interior &= padded[dy : dy + h, dx : dx + w]
+        self._interior = interior
+
+    @property
+    def skipped(self):
+        return self.reused_unchanged + self.reused_interior
+
+    def summary(self):
+        total = self.skipped + self.inferred
+        return (
+            f"Temporal mode: skipped {self.skipped} of {total} inferences "
+            f"({self.reused_unchanged} unchanged, {self.reused_interior} interior motion)"
+        )
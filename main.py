@@ -3,13 +3,41 @@ Main orchestrator script for Boccho ToolkitX.
 Provides a CLI to run various tools (background removal, outlining, packing, cleaning).
 
 Usage:
-    python main.py remove-bg
-    python main.py apply-outline
-    python main.py pack <filename>
+    python main.py [--profile [DIR] [--cprofile]] <command> ...
+    python main.py remove-bg [--input PATH] [--batch-size N] [--intra-op-threads N]
+                             [--inter-op-threads N] [--temporal [--temporal-threshold T]]
+                             [--no-daemon] [--trim [--trim-padding N]]
+                             [--model NAME] [--max-size PX] [--model-path FILE.onnx]
+                             [--compare [--compare-sample N] [--compare-models M,...]
+                                        [--compare-sizes PX,...]]
+    python main.py remove-bg-simple [--input PATH] [--headless] [--preset params.json]
+                                    [--workers N] [--trim [--trim-padding N]]
+    python main.py apply-outline [--workers N] [--engine filter|distance] [--force]
+                                 [--variant WIDTH:COLOR[:NAME] ...]
+    python main.py pack <filename> [--compression store|deflate|lzma|auto] [--threshold F]
+                                   [--atlas [--atlas-size PX] [--atlas-padding PX]]
+                                   [--compare] [--force] [--source DIR]
+    python main.py run-all <filename> [--input PATH] [--workers N] [--dump-intermediates]
+                                      [--outline-width PX] [--no-remove-bg]
+                                      [--batch-size N] [--cache-dir DIR]
+                                      [--trim [--trim-padding N]] [--model NAME]
+                                      [--max-size PX]
+                                      [--atlas [--atlas-size PX] [--atlas-padding PX]]
+    python main.py batch <jobs.toml> [--jobs N] [--workers N] [--no-daemon]
+    python main.py serve [--model NAME] [--batch-size N] [--batch-wait-ms MS] [--stop]
+    python main.py bench [--stages outline,chroma,rembg,pack] [--baseline results.json]
+                         [--tolerance F] [--ratios R,...] [--widths W,...]
     python main.py clean
+
+PATH is a folder of frames (default: input/raw_frames) or an animated GIF/APNG/WebP file.
+remove-bg and run-all use a running `serve` daemon when there is one.
+Commands that write frames take --format png|webp|npy|store, --png-level 0-9 and
+--png-optimize.
+--profile writes a Chrome trace of every stage to DIR (default: output/profile).
 """
 
 import argparse
+import os
 import sys
 import subprocess
 import shutil
@@ -41,6 +69,129 @@ def run_script(script_name, script_args=None):
         print(f"An unexpected error occurred: {e}")
 
 
+def add_encoder_arguments(subparser, formats=("png", "webp", "npy", "store")):
+    """
+    Adds the frame encoder options (see Scripts/frame_encoder.py) to a command.
+    """
+    if len(formats) > 1:
+        subparser.add_argument(
+            "--format",
+            choices=formats,
+            help="Frame format: png, webp (lossless), npy (raw) or store "
+            "(one memory-mapped file, fastest)",
+        )
+    subparser.add_argument(
+        "--png-level",
+        type=int,
+        choices=range(0, 10),
+        metavar="0-9",
+        help="PNG compress level, 0 = fastest",
+    )
+    subparser.add_argument(
+        "--png-optimize",
+        action="store_true",
+        help="Spend extra time making PNG frames smaller",
+    )
+
+
+def encoder_args(args):
+    """
+    Returns the encoder options given on the command line, to pass to a script.
+    """
+    script_args = []
+    if getattr(args, "format", None):
+        script_args += ["--format", args.format]
+    if args.png_level is not None:
+        script_args += ["--png-level", str(args.png_level)]
+    if args.png_optimize:
+        script_args.append("--png-optimize")
+    return script_args
+
+
+def add_model_arguments(subparser):
+    """
+    Adds the model options of remove-bg and run-all (see Scripts/light_remove_bg.py).
+    """
+    subparser.add_argument(
+        "--model",
+        choices=[
+            "u2net",
+            "u2netp",
+            "u2net_human_seg",
+            "silueta",
+            "isnet-general-use",
+            "isnet-anime",
+        ],
+        default="u2net",
+        help="rembg model; u2netp and silueta are much faster (default: u2net)",
+    )
+    subparser.add_argument(
+        "--model-path",
+        help="Local ONNX file to load instead of the downloaded model",
+    )
+    subparser.add_argument(
+        "--no-int8",
+        action="store_true",
+        help="Ignore int8-quantized exports in models/ ('<model>.int8.onnx')",
+    )
+    subparser.add_argument(
+        "--max-size",
+        type=int,
+        default=0,
+        help="Shrink frames whose longest side is larger for inference "
+        "(0 = full resolution, default: 0)",
+    )
+
+
+def model_args(args):
+    """
+    Returns the model options given on the command line, to pass to a script.
+    """
+    script_args = ["--model", args.model, "--max-size", str(args.max_size)]
+    if args.model_path:
+        script_args += ["--model-path", args.model_path]
+    if args.no_int8:
+        script_args.append("--no-int8")
+    return script_args
+
+
+def add_trim_arguments(subparser):
+    """
+    Adds --trim, --trim-padding and --trim-tolerance (see Scripts/frame_trim.py).
+    """
+    subparser.add_argument(
+        "--trim",
+        action="store_true",
+        help="Crop all frames to the union of their foreground boxes",
+    )
+    subparser.add_argument(
+        "--trim-padding",
+        type=int,
+        default=None,
+        help="Margin kept around the union box; keep it at least the outline "
+        "width (default: the outline width on run-all, 10 elsewhere)",
+    )
+    subparser.add_argument(
+        "--trim-tolerance",
+        type=int,
+        default=24,
+        help="Color difference from the corners that counts as foreground in "
+        "opaque frames (default: 24)",
+    )
+
+
+def trim_args(args):
+    """
+    Returns the trim options given on the command line, to pass to a script.
+    """
+    if not args.trim:
+        return []
+    script_args = ["--trim", "--trim-tolerance", str(args.trim_tolerance)]
+    if args.trim_padding is not None:
+        script_args += ["--trim-padding", str(args.trim_padding)]
+    return script_args
+
+
 def clean_directory(path: Path):
     """
     Removes all contents of a directory without removing the directory itself.
@@ -69,6 +220,10 @@ def handle_clean():
         "output/no_bg_frames",
         "input/raw_frames",
     ]
+    # Outline variants (apply-outline --variant) each have their own folder
+    dirs_to_clean += sorted(
+        str(d) for d in Path("output").glob("outlined_frames_*") if d.is_dir()
+    )
 
     print("Starting clean operation...")
     for d in dirs_to_clean:
@@ -78,29 +233,463 @@ def handle_clean():
 
 def main():
     parser = argparse.ArgumentParser(description="Boccho ToolkitX CLI Tool")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="output/profile",
+        metavar="DIR",
+        help="Trace every stage and write the trace to DIR (default: output/profile)",
+    )
+    parser.add_argument(
+        "--cprofile",
+        action="store_true",
+        help="With --profile, also dump cProfile stats of each script",
+    )
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
+    input_help = (
+        "Folder of frames, or an animated GIF/APNG/WebP file "
+        "(default: input/raw_frames)"
+    )
+
     # Command: remove-bg
-    subparsers.add_parser(
+    remove_bg_parser = subparsers.add_parser(
         "remove-bg", help="Remove backgrounds from images in input/raw_frames"
     )
+    remove_bg_parser.add_argument(
+        "--input", default="input/raw_frames", help=input_help
+    )
+    remove_bg_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=4,
+        help="Frames per inference run, when the model supports batching (default: 4)",
+    )
+    remove_bg_parser.add_argument(
+        "--intra-op-threads",
+        type=int,
+        default=0,
+        help="ONNX Runtime intra-op threads (0 = runtime default)",
+    )
+    remove_bg_parser.add_argument(
+        "--inter-op-threads",
+        type=int,
+        default=0,
+        help="ONNX Runtime inter-op threads (0 = runtime default)",
+    )
+    remove_bg_parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=8,
+        help="Frames decoded ahead of inference (default: 8)",
+    )
+    remove_bg_parser.add_argument(
+        "--cache-dir",
+        default="cache/masks",
+        help="Directory of the persistent mask cache (default: cache/masks)",
+    )
+    remove_bg_parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=1024,
+        help="Size limit of the mask cache in MB (default: 1024)",
+    )
+    remove_bg_parser.add_argument(
+        "--no-cache", action="store_true", help="Disable the persistent mask cache"
+    )
+    remove_bg_parser.add_argument(
+        "--temporal",
+        action="store_true",
+        help="Reuse the previous mask for frames that barely changed (video sources)",
+    )
+    remove_bg_parser.add_argument(
+        "--temporal-threshold",
+        type=float,
+        default=3.0,
+        help="Mean per-tile pixel difference (0-255) that counts as a change (default: 3.0)",
+    )
+    remove_bg_parser.add_argument(
+        "--temporal-tile",
+        type=int,
+        default=32,
+        help="Tile size in pixels for the temporal comparison (default: 32)",
+    )
+    remove_bg_parser.add_argument(
+        "--socket",
+        default="cache/remove-bg.sock",
+        help="Socket of a running `serve` daemon (default: cache/remove-bg.sock)",
+    )
+    remove_bg_parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Run inference in-process even if a `serve` daemon is running",
+    )
+
+    remove_bg_parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Report speed and mask IoU of models and size caps against the default",
+    )
+    remove_bg_parser.add_argument(
+        "--compare-sample",
+        type=int,
+        default=8,
+        help="Frames sampled for --compare (default: 8)",
+    )
+    remove_bg_parser.add_argument(
+        "--compare-models",
+        default="u2netp,silueta",
+        help="Comma-separated models tried by --compare (default: u2netp,silueta)",
+    )
+    remove_bg_parser.add_argument(
+        "--compare-sizes",
+        default="1024,512",
+        help="Comma-separated size caps tried by --compare (default: 1024,512)",
+    )
+    add_model_arguments(remove_bg_parser)
+    add_trim_arguments(remove_bg_parser)
+    add_encoder_arguments(remove_bg_parser)
 
     # Command: remove-bg-simple
-    subparsers.add_parser(
+    simple_parser = subparsers.add_parser(
         "remove-bg-simple", help="Open GUI for color-based background removal"
     )
+    simple_parser.add_argument("--input", default="input/raw_frames", help=input_help)
+    simple_parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Process input/raw_frames without the GUI",
+    )
+    simple_parser.add_argument(
+        "--preset", help="Preset file saved from the GUI (target color, tolerance...)"
+    )
+    simple_parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Worker processes in headless mode (0 = one per CPU core, default: 0)",
+    )
+    add_trim_arguments(simple_parser)
+    add_encoder_arguments(simple_parser)
 
     # Command: apply-outline
-    subparsers.add_parser(
+    outline_parser = subparsers.add_parser(
         "apply-outline",
         help="Apply outline to transparent images in output/no_bg_frames",
     )
+    outline_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes (0 = one per CPU core, default: 1)",
+    )
+    outline_parser.add_argument(
+        "--engine",
+        choices=["filter", "distance"],
+        default="filter",
+        help="Outline engine: 'filter' (square corners) or 'distance' (round corners)",
+    )
+    outline_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Outline every frame, even those that are up to date",
+    )
+    outline_parser.add_argument(
+        "--variant",
+        action="append",
+        metavar="WIDTH:COLOR[:NAME]",
+        help="Outline width and color (e.g. 10:white); repeat for several variants "
+        "in one pass, each in output/outlined_frames_NAME",
+    )
+    add_encoder_arguments(outline_parser)
 
     # Command: pack
     pack_parser = subparsers.add_parser(
         "pack", help="Pack outlined frames into a .bfk archive"
     )
     pack_parser.add_argument("output_name", help="Output filename (e.g. character.bfk)")
+    pack_parser.add_argument(
+        "--compression",
+        choices=["store", "deflate", "lzma", "auto"],
+        default="deflate",
+        help="Compression policy for archive members (default: deflate)",
+    )
+    pack_parser.add_argument(
+        "--level", type=int, default=6, help="Deflate level 0-9 (default: 6)"
+    )
+    pack_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.05,
+        help="Minimum saving (fraction) for 'auto' to keep a member compressed "
+        "(default: 0.05)",
+    )
+    pack_parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Compression threads (0 = one per CPU core, default: 0)",
+    )
+    pack_parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Store pixel-identical frames only once",
+    )
+    pack_parser.add_argument(
+        "--atlas",
+        action="store_true",
+        help="Trim frames and pack them into sprite-atlas pages",
+    )
+    pack_parser.add_argument(
+        "--atlas-size",
+        type=int,
+        default=2048,
+        help="Maximum atlas page width and height (default: 2048)",
+    )
+    pack_parser.add_argument(
+        "--atlas-padding",
+        type=int,
+        default=1,
+        help="Transparent pixels between sprites (default: 1)",
+    )
+    pack_parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Report time and ratio of every compression policy without packing",
+    )
+    pack_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Compress every frame again instead of reusing unchanged members",
+    )
+    pack_parser.add_argument(
+        "--source",
+        default="output/outlined_frames",
+        help="Folder of frames to pack (default: output/outlined_frames)",
+    )
+
+    add_encoder_arguments(pack_parser, formats=("png",))
+
+    # Command: run-all
+    run_all_parser = subparsers.add_parser(
+        "run-all",
+        help="Remove backgrounds, outline and pack in one pass without intermediate files",
+    )
+    run_all_parser.add_argument(
+        "output_name", help="Output filename (e.g. character.bfk)"
+    )
+    run_all_parser.add_argument("--input", default="input/raw_frames", help=input_help)
+    run_all_parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Threads for outlining and encoding (0 = one per CPU core, default: 0)",
+    )
+    run_all_parser.add_argument(
+        "--engine",
+        choices=["filter", "distance"],
+        default="filter",
+        help="Outline engine (default: filter)",
+    )
+    run_all_parser.add_argument(
+        "--outline-width",
+        type=int,
+        default=10,
+        help="Outline width in pixels, 0 for none (default: 10)",
+    )
+    run_all_parser.add_argument(
+        "--no-remove-bg",
+        action="store_true",
+        help="Use the frames' own transparency instead of removing the background",
+    )
+    run_all_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=4,
+        help="Frames per inference run, when the model supports batching (default: 4)",
+    )
+    run_all_parser.add_argument(
+        "--cache-dir",
+        default="cache/masks",
+        help="Directory of the persistent mask cache (default: cache/masks)",
+    )
+    run_all_parser.add_argument(
+        "--no-cache", action="store_true", help="Disable the persistent mask cache"
+    )
+    run_all_parser.add_argument(
+        "--compression",
+        choices=["store", "deflate", "lzma", "auto"],
+        default="deflate",
+        help="Compression policy for archive members (default: deflate)",
+    )
+    run_all_parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Store pixel-identical frames only once",
+    )
+    run_all_parser.add_argument(
+        "--atlas",
+        action="store_true",
+        help="Trim frames and pack them into sprite-atlas pages",
+    )
+    run_all_parser.add_argument(
+        "--atlas-size",
+        type=int,
+        default=2048,
+        help="Maximum atlas page width and height (default: 2048)",
+    )
+    run_all_parser.add_argument(
+        "--atlas-padding",
+        type=int,
+        default=1,
+        help="Transparent pixels between sprites (default: 1)",
+    )
+    run_all_parser.add_argument(
+        "--dump-intermediates",
+        action="store_true",
+        help="Also write frames to output/no_bg_frames and output/outlined_frames",
+    )
+    run_all_parser.add_argument(
+        "--socket",
+        default="cache/remove-bg.sock",
+        help="Socket of a running `serve` daemon (default: cache/remove-bg.sock)",
+    )
+    run_all_parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Run inference in-process even if a `serve` daemon is running",
+    )
+
+    add_model_arguments(run_all_parser)
+    add_trim_arguments(run_all_parser)
+    add_encoder_arguments(run_all_parser, formats=("png",))
+
+    # Command: batch
+    batch_parser = subparsers.add_parser(
+        "batch",
+        help="Run the pipeline for several characters listed in a TOML jobs file",
+    )
+    batch_parser.add_argument(
+        "jobs_file", help="TOML file with a [[job]] table per character"
+    )
+    batch_parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Jobs running at the same time (0 = one per 4 CPU cores, default: 0)",
+    )
+    batch_parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Threads per job (0 = the CPU cores divided among the running jobs)",
+    )
+    batch_parser.add_argument(
+        "--socket",
+        default="cache/remove-bg.sock",
+        help="Socket of a running `serve` daemon (default: cache/remove-bg.sock)",
+    )
+    batch_parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Let every job load its own model instead of sharing a daemon",
+    )
+
+    # Command: serve
+    serve_parser = subparsers.add_parser(
+        "serve", help="Keep a background-removal session warm for remove-bg and run-all"
+    )
+    serve_parser.add_argument(
+        "--socket",
+        default="cache/remove-bg.sock",
+        help="Unix socket to listen on (default: cache/remove-bg.sock)",
+    )
+    serve_parser.add_argument(
+        "--model",
+        default="u2net",
+        help="rembg model to serve, as given to remove-bg --model (default: u2net)",
+    )
+    serve_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=8,
+        help="Most frames per inference run, gathered across clients (default: 8)",
+    )
+    serve_parser.add_argument(
+        "--batch-wait-ms",
+        type=float,
+        default=5,
+        help="How long a run waits for more frames to arrive (default: 5)",
+    )
+    serve_parser.add_argument(
+        "--intra-op-threads",
+        type=int,
+        default=0,
+        help="ONNX Runtime intra-op threads (0 = runtime default)",
+    )
+    serve_parser.add_argument(
+        "--inter-op-threads",
+        type=int,
+        default=0,
+        help="ONNX Runtime inter-op threads (0 = runtime default)",
+    )
+    serve_parser.add_argument(
+        "--stop", action="store_true", help="Stop the running daemon"
+    )
+
+    # Command: bench
+    bench_parser = subparsers.add_parser(
+        "bench", help="Benchmark every pipeline stage on synthetic frames"
+    )
+    bench_parser.add_argument(
+        "--stages",
+        default="outline,chroma,rembg,pack",
+        help="Comma-separated stages to run (default: outline,chroma,rembg,pack)",
+    )
+    bench_parser.add_argument(
+        "--sizes",
+        default="512x512,1920x1080",
+        help="Comma-separated frame sizes (default: 512x512,1920x1080)",
+    )
+    bench_parser.add_argument(
+        "--ratios",
+        default="0.5,0.9",
+        help="Comma-separated sprite-to-canvas height ratios (default: 0.5,0.9)",
+    )
+    bench_parser.add_argument(
+        "--widths",
+        default="5,20",
+        help="Comma-separated outline widths (default: 5,20)",
+    )
+    bench_parser.add_argument(
+        "--engines",
+        default="filter,distance",
+        help="Comma-separated outline engines (default: filter,distance)",
+    )
+    bench_parser.add_argument(
+        "--frames", type=int, default=8, help="Frames timed per case (default: 8)"
+    )
+    bench_parser.add_argument(
+        "--repeats",
+        type=int,
+        default=3,
+        help="Archives written per pack case (default: 3)",
+    )
+    bench_parser.add_argument(
+        "--skip-rembg", action="store_true", help="Do not benchmark rembg inference"
+    )
+    bench_parser.add_argument(
+        "--output",
+        default="output/bench/latest.json",
+        help="Where to write the JSON results (default: output/bench/latest.json)",
+    )
+    bench_parser.add_argument("--baseline", help="Results file to compare against")
+    bench_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.10,
+        help="Allowed fps drop against the baseline before failing (default: 0.10)",
+    )
 
     # Command: clean
     subparsers.add_parser(
@@ -109,14 +698,200 @@ def main():
 
     args = parser.parse_args()
 
+    if args.profile:
+        # Scripts (and their worker processes) inherit the environment
+        os.environ["BOCCHO_PROFILE"] = str(Path(args.profile).resolve())
+        if args.cprofile:
+            os.environ["BOCCHO_PROFILE_CPROFILE"] = "1"
+
     if args.command == "remove-bg":
-        run_script("light_remove_bg.py")
+        script_args = [
+            "--input",
+            args.input,
+            "--batch-size",
+            str(args.batch_size),
+            "--intra-op-threads",
+            str(args.intra_op_threads),
+            "--inter-op-threads",
+            str(args.inter_op_threads),
+            "--prefetch",
+            str(args.prefetch),
+            "--cache-dir",
+            args.cache_dir,
+            "--cache-max-mb",
+            str(args.cache_max_mb),
+            "--socket",
+            args.socket,
+        ]
+        if args.no_cache:
+            script_args.append("--no-cache")
+        if args.no_daemon:
+            script_args.append("--no-daemon")
+        if args.temporal:
+            script_args += [
+                "--temporal",
+                "--temporal-threshold",
+                str(args.temporal_threshold),
+                "--temporal-tile",
+                str(args.temporal_tile),
+            ]
+        if args.compare:
+            script_args += [
+                "--compare",
+                "--compare-sample",
+                str(args.compare_sample),
+                "--compare-models",
+                args.compare_models,
+                "--compare-sizes",
+                args.compare_sizes,
+            ]
+        script_args += model_args(args) + trim_args(args)
+        run_script("light_remove_bg.py", script_args + encoder_args(args))
     elif args.command == "remove-bg-simple":
-        run_script("noai_rembg.py")
+        script_args = ["--input", args.input] + encoder_args(args)
+        if args.preset:
+            script_args += ["--preset", args.preset]
+        if args.headless:
+            script_args += ["--workers", str(args.workers)] + trim_args(args)
+            run_script("chroma_key.py", script_args)
+        else:
+            run_script("noai_rembg.py", script_args)
     elif args.command == "apply-outline":
-        run_script("apply_outline.py")
+        script_args = ["--workers", str(args.workers), "--engine", args.engine]
+        if args.force:
+            script_args.append("--force")
+        for variant in args.variant or []:
+            script_args += ["--variant", variant]
+        run_script("apply_outline.py", script_args + encoder_args(args))
     elif args.command == "pack":
-        run_script("pack.py", [args.output_name])
+        script_args = [
+            args.output_name,
+            "--compression",
+            args.compression,
+            "--level",
+            str(args.level),
+            "--threshold",
+            str(args.threshold),
+            "--workers",
+            str(args.workers),
+            "--source",
+            args.source,
+        ]
+        if args.dedup:
+            script_args.append("--dedup")
+        if args.atlas:
+            script_args += [
+                "--atlas",
+                "--atlas-size",
+                str(args.atlas_size),
+                "--atlas-padding",
+                str(args.atlas_padding),
+            ]
+        if args.compare:
+            script_args.append("--compare")
+        if args.force:
+            script_args.append("--force")
+        run_script("pack.py", script_args + encoder_args(args))
+    elif args.command == "run-all":
+        script_args = [
+            args.output_name,
+            "--input",
+            args.input,
+            "--workers",
+            str(args.workers),
+            "--engine",
+            args.engine,
+            "--outline-width",
+            str(args.outline_width),
+            "--batch-size",
+            str(args.batch_size),
+            "--cache-dir",
+            args.cache_dir,
+            "--compression",
+            args.compression,
+            "--socket",
+            args.socket,
+        ]
+        if args.no_cache:
+            script_args.append("--no-cache")
+        if args.no_daemon:
+            script_args.append("--no-daemon")
+        if args.dedup:
+            script_args.append("--dedup")
+        if args.atlas:
+            script_args += [
+                "--atlas",
+                "--atlas-size",
+                str(args.atlas_size),
+                "--atlas-padding",
+                str(args.atlas_padding),
+            ]
+        if args.dump_intermediates:
+            script_args.append("--dump-intermediates")
+        if args.no_remove_bg:
+            script_args.append("--no-remove-bg")
+        script_args += model_args(args) + trim_args(args)
+        run_script("run_all.py", script_args + encoder_args(args))
+    elif args.command == "batch":
+        script_args = [
+            args.jobs_file,
+            "--jobs",
+            str(args.jobs),
+            "--workers",
+            str(args.workers),
+            "--socket",
+            args.socket,
+        ]
+        if args.no_daemon:
+            script_args.append("--no-daemon")
+        run_script("batch.py", script_args)
+    elif args.command == "serve":
+        script_args = [
+            "--socket",
+            args.socket,
+            "--model",
+            args.model,
+            "--batch-size",
+            str(args.batch_size),
+            "--batch-wait-ms",
+            str(args.batch_wait_ms),
+            "--intra-op-threads",
+            str(args.intra_op_threads),
+            "--inter-op-threads",
+            str(args.inter_op_threads),
+        ]
+        if args.stop:
+            script_args.append("--stop")
+        run_script("mask_server.py", script_args)
+    elif args.command == "bench":
+        script_args = [
+            "--stages",
+            args.stages,
+            "--sizes",
+            args.sizes,
+            "--ratios",
+            args.ratios,
+            "--widths",
+            args.widths,
+            "--engines",
+            args.engines,
+            "--frames",
+            str(args.frames),
+            "--repeats",
+            str(args.repeats),
+            "--output",
+            args.output,
+        ]
+        if args.skip_rembg:
+            script_args.append("--skip-rembg")
+        if args.baseline:
+            script_args += [
+                "--baseline",
+                args.baseline,
+                "--tolerance",
+                str(args.tolerance),
+            ]
+        run_script("bench.py", script_args)
     elif args.command == "clean":
         handle_clean()
     else:
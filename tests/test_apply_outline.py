@@ -0,0 +1,191 @@
+"""
+Checks the NumPy fallback of the distance engine against a brute-force
+Euclidean distance transform, and that the shortcuts of the outline engines
+(the bounding-box crop, shared work between variants, worker processes) give
+the same pixels as the plain computation.
+
+Run with: python -m unittest discover tests
+"""
+
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Scripts"))
+
+import apply_outline  # noqa: E402
+from frame_encoder import FrameEncoder, WriteBehind  # noqa: E402
+
+WHITE = (255, 255, 255, 255)
+CRIMSON = (220, 20, 60, 255)
+
+
+def brute_force_edt(mask):
+    """
+    Distance from every pixel to the nearest True pixel of mask.
+    """
+    sprite = np.argwhere(mask)
+    grid = np.indices(mask.shape).reshape(2, -1).T
+    squared = ((grid[:, None, :] - sprite[None, :, :]) ** 2).sum(axis=2)
+    return np.sqrt(squared.min(axis=1)).reshape(mask.shape)
+
+
+class DistanceFallbackTest(unittest.TestCase):
+    def check(self, shape, seed):
+        rng = np.random.default_rng(seed)
+        mask = rng.random(shape) < 0.03
+        mask[rng.integers(shape[0]), rng.integers(shape[1])] = True
+        with mock.patch.object(apply_outline, "distance_transform_edt", None):
+            distance = apply_outline._distance_to_sprite(mask)
+        np.testing.assert_allclose(distance, brute_force_edt(mask), atol=1e-9)
+
+    def test_square(self):
+        self.check((100, 100), 0)
+
+    def test_tall(self):
+        self.check((40, 23), 1)
+
+    def test_wide(self):
+        self.check((23, 40), 2)
+
+    def test_single_row_and_column(self):
+        self.check((7, 1), 3)
+        self.check((1, 7), 4)
+
+    def test_single_pixel(self):
+        mask = np.zeros((30, 50), dtype=bool)
+        mask[29, 0] = True
+        with mock.patch.object(apply_outline, "distance_transform_edt", None):
+            distance = apply_outline._distance_to_sprite(mask)
+        np.testing.assert_allclose(distance, brute_force_edt(mask), atol=1e-9)
+
+
+def sprite(size, box, seed=0):
+    """
+    A transparent frame with a noisy, soft-edged blob inside box.
+    """
+    rng = np.random.default_rng(seed)
+    img = Image.new("RGBA", size, (0, 0, 0, 0))
+    ImageDraw.Draw(img).ellipse(box, fill=(90, 160, 40, 255))
+    alpha = img.getchannel("A").filter(ImageFilter.GaussianBlur(1.5))
+    pixels = np.asarray(img).copy()
+    pixels[..., :3] = rng.integers(0, 256, pixels[..., :3].shape)
+    pixels[..., 3] = np.asarray(alpha)
+    return Image.fromarray(pixels, "RGBA")
+
+
+def full_canvas_outline(image, width, color, engine):
+    """
+    add_outline without the bounding-box crop: dilates the whole canvas.
+    """
+    alpha = image.getchannel("A")
+    if engine == "distance":
+        outline = apply_outline._distance_outlines(alpha, {width})[width]
+    else:
+        outline = alpha
+        for _ in range(width):
+            outline = outline.filter(ImageFilter.MaxFilter(3))
+    outline_img = Image.new("RGBA", image.size, color)
+    outline_img.putalpha(ImageChops.subtract(outline, alpha))
+    result = Image.new("RGBA", image.size, (0, 0, 0, 0))
+    result = Image.alpha_composite(result, outline_img)
+    return Image.alpha_composite(result, image)
+
+
+class OutlineTest(unittest.TestCase):
+    # (canvas size, blob box): centered, touching an edge, filling the canvas
+    CASES = [
+        ((64, 48), (20, 14, 40, 32)),
+        ((64, 48), (-6, 20, 18, 52)),
+        ((40, 40), (-4, -4, 44, 44)),
+    ]
+
+    def assert_same_pixels(self, a, b):
+        self.assertEqual(a.size, b.size)
+        np.testing.assert_array_equal(np.asarray(a), np.asarray(b))
+
+    def test_bbox_crop_matches_full_canvas(self):
+        for engine in apply_outline.ENGINES:
+            for size, box in self.CASES:
+                image = sprite(size, box)
+                for width in (1, 4, 12):
+                    with self.subTest(engine=engine, size=size, box=box, width=width):
+                        self.assert_same_pixels(
+                            apply_outline.add_outline(image, width, CRIMSON, engine),
+                            full_canvas_outline(image, width, CRIMSON, engine),
+                        )
+
+    def test_empty_frame(self):
+        image = Image.new("RGBA", (16, 16), (0, 0, 0, 0))
+        for engine in apply_outline.ENGINES:
+            self.assert_same_pixels(
+                apply_outline.add_outline(image, 5, WHITE, engine), image
+            )
+
+    def test_variants_match_single_outlines(self):
+        variants = [(6, WHITE), (2, CRIMSON), (11, (0, 0, 0, 128)), (6, CRIMSON)]
+        for engine in apply_outline.ENGINES:
+            for size, box in self.CASES:
+                image = sprite(size, box)
+                results = apply_outline.add_outlines(image, variants, engine)
+                self.assertEqual(len(results), len(variants))
+                for (width, color), result in zip(variants, results):
+                    with self.subTest(engine=engine, box=box, width=width):
+                        self.assert_same_pixels(
+                            result,
+                            apply_outline.add_outline(image, width, color, engine),
+                        )
+
+    def test_workers_match_serial(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            frames = []
+            for i, (size, box) in enumerate(self.CASES):
+                frames.append(tmp / f"f{i}.png")
+                sprite(size, box, seed=i).save(frames[-1])
+
+            runs = {}
+            for run in ("serial", "pool"):
+                variants = []
+                for width, color, name in [(3, WHITE, "a"), (9, CRIMSON, "b")]:
+                    (tmp / run / name).mkdir(parents=True)
+                    variants.append((tmp / run / name, width, color))
+                runs[run] = variants
+
+            for engine in apply_outline.ENGINES:
+                encoder = FrameEncoder()
+                with WriteBehind() as writer:
+                    for frame in frames:
+                        error = apply_outline.outline_file(
+                            frame, runs["serial"], engine, encoder, writer
+                        )
+                        self.assertIsNone(error)
+                with ProcessPoolExecutor(max_workers=2) as executor:
+                    errors = executor.map(
+                        apply_outline.outline_file,
+                        frames,
+                        [runs["pool"]] * len(frames),
+                        [engine] * len(frames),
+                        [encoder] * len(frames),
+                    )
+                    self.assertEqual(list(errors), [None] * len(frames))
+
+                for (serial_dir, _, _), (pool_dir, _, _) in zip(
+                    runs["serial"], runs["pool"]
+                ):
+                    for frame in frames:
+                        with self.subTest(engine=engine, frame=frame.name):
+                            self.assertEqual(
+                                (serial_dir / frame.name).read_bytes(),
+                                (pool_dir / frame.name).read_bytes(),
+                            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Checks that apply_outline's build manifest skips unchanged frames and keeps the
+last good output of a frame that fails.
+
+Run with: python -m unittest discover tests
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Scripts"))
+
+import apply_outline  # noqa: E402
+
+INPUT_DIR = Path("output/no_bg_frames")
+OUTPUT_DIR = Path("output/outlined_frames")
+
+
+def write_frame(path, left):
+    img = Image.new("RGBA", (48, 32), (0, 0, 0, 0))
+    img.paste((200, 40, 40, 255), (left, 8, left + 12, 24))
+    img.save(path)
+
+
+class BuildManifestTest(unittest.TestCase):
+    def setUp(self):
+        cwd = os.getcwd()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        INPUT_DIR.mkdir(parents=True)
+        for i in range(3):
+            write_frame(INPUT_DIR / f"f{i}.png", 8 + i * 4)
+
+    def outline(self, fail=()):
+        """
+        Runs apply_outline.main(); frames named in fail raise while outlining.
+        Returns the names of the frames that were outlined.
+        """
+        outlined = []
+        add_outlines = apply_outline.add_outlines
+
+        def outline_or_fail(img, *args):
+            name = Path(img.filename).name
+            outlined.append(name)
+            if name in fail:
+                raise ValueError("broken frame")
+            return add_outlines(img, *args)
+
+        with (
+            mock.patch.object(sys, "argv", ["apply_outline.py"]),
+            mock.patch.object(apply_outline, "add_outlines", outline_or_fail),
+            contextlib.redirect_stdout(io.StringIO()),
+            contextlib.redirect_stderr(io.StringIO()),
+        ):
+            apply_outline.main()
+        return sorted(outlined)
+
+    def recorded(self):
+        with open(OUTPUT_DIR / "build.json", encoding="utf-8") as f:
+            return json.load(f)["frames"]
+
+    def test_unchanged_frames_are_skipped(self):
+        self.assertEqual(self.outline(), ["f0.png", "f1.png", "f2.png"])
+        self.assertEqual(self.outline(), [])
+
+        write_frame(INPUT_DIR / "f1.png", 20)
+        self.assertEqual(self.outline(), ["f1.png"])
+        self.assertEqual(self.outline(), [])
+
+    def test_failed_frame_keeps_its_old_output(self):
+        self.outline()
+        before = (OUTPUT_DIR / "f1.png").read_bytes()
+        record = self.recorded()["f1.png"]
+
+        write_frame(INPUT_DIR / "f1.png", 20)
+        self.assertEqual(self.outline(fail={"f1.png"}), ["f1.png"])
+        self.assertEqual((OUTPUT_DIR / "f1.png").read_bytes(), before)
+        self.assertEqual(self.recorded()["f1.png"], record)
+
+        # Redone once it succeeds
+        self.assertEqual(self.outline(), ["f1.png"])
+        self.assertNotEqual((OUTPUT_DIR / "f1.png").read_bytes(), before)
+        self.assertEqual(self.outline(), [])
+
+    def test_removed_frame_output_is_deleted(self):
+        self.outline()
+        (INPUT_DIR / "f2.png").unlink()
+        self.assertEqual(self.outline(), [])
+        self.assertFalse((OUTPUT_DIR / "f2.png").exists())
+        self.assertTrue((OUTPUT_DIR / "f1.png").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+"""
+Packs synthetic frames (with duplicates and fully transparent frames) in every
+package layout and reads them back with BfkReader, and checks that zipfile
+still reads the members pack.py writes through zipfile internals.
+
+Run with: python -m unittest discover tests
+"""
+
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Scripts"))
+
+import pack  # noqa: E402
+from bfk_reader import (  # noqa: E402
+    ATLAS_MANIFEST_VERSION,
+    MANIFEST_NAME,
+    MANIFEST_VERSION,
+    BfkReader,
+)
+
+
+def synthetic_frames(count=6, size=(40, 30)):
+    """
+    Returns [(name, RGBA image)]: sprites of random color and alpha moving across the
+    canvas, an exact duplicate and two fully transparent frames.
+    """
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(count):
+        pixels = np.zeros((size[1], size[0], 4), dtype=np.uint8)
+        left = 2 + i * 3
+        sprite = pixels[5:20, left : left + 12]
+        sprite[..., :3] = rng.integers(0, 256, sprite[..., :3].shape)
+        sprite[..., 3] = rng.integers(1, 256, sprite.shape[:2])
+        frames.append((f"f{i:02d}.png", Image.fromarray(pixels, "RGBA")))
+    empty = Image.new("RGBA", size, (0, 0, 0, 0))
+    frames.insert(2, ("empty_a.png", empty))
+    frames.append(("dup.png", frames[1][1].copy()))
+    frames.append(("empty_b.png", empty.copy()))
+    return frames
+
+
+def png_bytes(img):
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class PackRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.frames = synthetic_frames()
+
+    def pack(self, name, atlas=False, **options):
+        path = self.tmp / name
+        frames = [(frame, png_bytes(img)) for frame, img in self.frames]
+        with contextlib.redirect_stdout(io.StringIO()):
+            if atlas:
+                pack.write_atlas_package(path, "sprite", frames, **options)
+            else:
+                pack.write_package(path, "sprite", frames, **options)
+        return path
+
+    def assert_round_trip(self, path, version):
+        with BfkReader(path) as reader:
+            self.assertEqual(reader.manifest["version"], version)
+            self.assertEqual(
+                [entry["name"] for entry in reader.frames],
+                [name for name, _ in self.frames],
+            )
+            for index, (name, img) in enumerate(self.frames):
+                with self.subTest(frame=name):
+                    np.testing.assert_array_equal(
+                        np.asarray(reader.frame(index)), np.asarray(img)
+                    )
+            self.assertEqual(reader.validate(deep=True), [])
+            return reader.manifest
+
+    def test_index(self):
+        for policy in pack.POLICIES:
+            with self.subTest(policy=policy):
+                path = self.pack(f"{policy}.bfk", policy=policy, workers=2)
+                manifest = self.assert_round_trip(path, MANIFEST_VERSION)
+                self.assertEqual(manifest["unique_frames"], len(self.frames))
+
+    def test_dedup(self):
+        path = self.pack("dedup.bfk", dedup=True, workers=2)
+        manifest = self.assert_round_trip(path, MANIFEST_VERSION)
+        # The duplicate and the second empty frame share earlier members
+        self.assertEqual(manifest["unique_frames"], len(self.frames) - 2)
+        members = {entry["name"]: entry["member"] for entry in manifest["frames"]}
+        self.assertEqual(members["dup.png"], members["f01.png"])
+        self.assertEqual(members["empty_b.png"], members["empty_a.png"])
+
+    def test_atlas(self):
+        for policy in pack.POLICIES:
+            with self.subTest(policy=policy):
+                path = self.pack(
+                    f"atlas_{policy}.bfk", atlas=True, policy=policy, page_size=32
+                )
+                manifest = self.assert_round_trip(path, ATLAS_MANIFEST_VERSION)
+                self.assertGreater(len(manifest["atlas"]["pages"]), 1)
+                # 6 sprites; the duplicate shares one and empty frames have none
+                self.assertEqual(manifest["unique_frames"], 6)
+
+    def test_zipfile_reads_every_member(self):
+        compress_types = {
+            "store": {zipfile.ZIP_STORED},
+            "deflate": {zipfile.ZIP_DEFLATED},
+            "lzma": {zipfile.ZIP_LZMA},
+            "auto": {zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED},
+        }
+        for policy in pack.POLICIES:
+            with self.subTest(policy=policy):
+                path = self.pack(f"zip_{policy}.bfk", policy=policy, workers=2)
+                with zipfile.ZipFile(path) as zf:
+                    self.assertIsNone(zf.testzip())
+                    self.assertEqual(
+                        zf.namelist(),
+                        [f"sprite/{name}" for name, _ in self.frames]
+                        + [f"sprite/{MANIFEST_NAME}"],
+                    )
+                    for name, img in self.frames:
+                        zinfo = zf.getinfo(f"sprite/{name}")
+                        self.assertIn(zinfo.compress_type, compress_types[policy])
+                        self.assertEqual(zf.read(zinfo), png_bytes(img))
+                    manifest = json.loads(zf.read(f"sprite/{MANIFEST_NAME}"))
+                    for entry in manifest["frames"]:
+                        zinfo = zf.getinfo(entry["member"])
+                        self.assertEqual(entry["offset"], zinfo.header_offset)
+                        self.assertEqual(entry["crc"], zinfo.CRC)
+
+    def test_trim_offset(self):
+        trim = {"box": [5, 4, 45, 34], "offset": [5, 4], "canvas": [60, 50]}
+        path = self.pack("trim.bfk", trim=trim)
+        with BfkReader(path) as reader:
+            self.assertEqual(reader.trim, trim)
+            full = reader.frame(0, full_canvas=True)
+        self.assertEqual(full.size, (60, 50))
+        np.testing.assert_array_equal(
+            np.asarray(full.crop(trim["box"])), np.asarray(self.frames[0][1])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()